@@ -0,0 +1,224 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+ACCOUNT_SECTION_PREFIX = "netsuite:"
+# staging and datamart column telling the accounts' rows apart, NetSuite internal IDs collide
+ACCOUNT_COLUMN = "NETSUITE_ACCOUNT"
+
+
+def get_accounts(config, names=None):
+    """
+    List the NetSuite accounts configured in the connection properties.
+
+    Accounts are [netsuite:NAME] sections; keys they leave out (host, port, ...) are
+    taken from [netsuite]. Without any, the single [netsuite] section is returned as
+    the unnamed account, which keeps the original landing schema and control table rows.
+
+    Args:
+        config (ConfigParser): The connection properties.
+        names (list, optional): Only return these account names.
+
+    Returns:
+        list: A list of (account name or None, section) tuples.
+
+    Raises:
+        SystemExit: If names are given but no [netsuite:NAME] section is configured,
+            or a name has no section.
+    """
+    shared = dict(config["netsuite"]) if config.has_section("netsuite") else {}
+    accounts = [
+        (
+            re.sub(r"\W", "_", section[len(ACCOUNT_SECTION_PREFIX):]).upper(),
+            {**shared, **config[section]},
+        )
+        for section in config.sections()
+        if section.lower().startswith(ACCOUNT_SECTION_PREFIX)
+    ]
+    if not accounts:
+        if names:
+            raise SystemExit(
+                f"NetSuite account(s) {', '.join(names)} requested, but only [netsuite] is configured; "
+                "add [netsuite:ACCOUNT] sections or leave out --accounts"
+            )
+        return [(None, config["netsuite"])]
+    if names:
+        selected = [name.upper() for name in names]
+        unknown = [name for name in selected if name not in dict(accounts)]
+        if unknown:
+            raise SystemExit(f"Unknown NetSuite account(s): {', '.join(unknown)}")
+        accounts = [(name, section) for name, section in accounts if name in selected]
+    return accounts
+
+
+def get_account_schema_props(props, account, netsuite):
+    """
+    Point a phase's props at a NetSuite account's landing schema.
+
+    The schema is landing_schema in the account's section, default <LANDING_SCHEMA>_<ACCOUNT>.
+    The shared LANDING_SCHEMA is kept as BASE_LANDING_SCHEMA.
+
+    Args:
+        props (dict): The phase props.
+        account (str): The account name, or None for the single [netsuite] account.
+        netsuite (dict): The account's NetSuite connection parameters.
+
+    Returns:
+        dict: The account's props.
+    """
+    props = dict(props)
+    if account is None:
+        return props
+    props["ACCOUNT"] = account
+    props["BASE_LANDING_SCHEMA"] = props["LANDING_SCHEMA"]
+    props["LANDING_SCHEMA"] = netsuite.get("landing_schema", f"{props['LANDING_SCHEMA']}_{account}").upper()
+    return props
+
+
+def get_account_props(props, account, netsuite):
+    """
+    Tag a NetSuite-to-Landing phase's props with a NetSuite account.
+
+    The account gets its own control table ENV rows and lands in its own schema
+    (see get_account_schema_props), so accounts never MERGE into the same tables.
+
+    Args:
+        props (dict): The phase props.
+        account (str): The account name, or None for the single [netsuite] account.
+        netsuite (dict): The account's NetSuite connection parameters.
+
+    Returns:
+        dict: The account's props.
+    """
+    props = get_account_schema_props(props, account, netsuite)
+    if account is None:
+        return props
+    props["ENV"] = f"{props['ENV']}_{account}"
+    if props.get("CACHE_DIR"):
+        props["CACHE_DIR"] = f"{props['CACHE_DIR']}/{account}"
+    return props
+
+
+def ensure_account_schema(sf_cnxn, tables, props):
+    """
+    Create the account's landing schema and tables, shaped like the shared landing tables.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        tables (list): The NetSuite tables to create.
+        props (dict): The account's props from get_account_props.
+
+    Returns:
+        None
+    """
+    if "BASE_LANDING_SCHEMA" not in props:
+        return
+    LANDING_DB = props["LANDING_DB"]
+    with sf_cnxn.cursor() as sf_cur:
+        sf_cur.execute(f"CREATE SCHEMA IF NOT EXISTS {LANDING_DB}.{props['LANDING_SCHEMA']}")
+        for table in tables:
+            sf_cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {LANDING_DB}.{props['LANDING_SCHEMA']}.{table} "
+                f"LIKE {LANDING_DB}.{props['BASE_LANDING_SCHEMA']}.{table}"
+            )
+    print(f"{props['ACCOUNT']}: Landing schema {LANDING_DB}.{props['LANDING_SCHEMA']} ready")
+
+
+def ensure_account_views(sf_cnxn, views, props):
+    """
+    Create the landing views of the shared schema in the account's landing schema.
+
+    Each view is copied from its GET_DDL in the shared schema, with references to the
+    shared schema pointed at the account's, so staging reads the account's tables.
+    Existing views are left alone.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        views (list): The landing view names.
+        props (dict): The account's props from get_account_schema_props.
+
+    Returns:
+        None
+    """
+    if "BASE_LANDING_SCHEMA" not in props:
+        return
+    LANDING_DB = props["LANDING_DB"]
+    base = f"{LANDING_DB}.{props['BASE_LANDING_SCHEMA']}"
+    schema = f"{LANDING_DB}.{props['LANDING_SCHEMA']}"
+    with sf_cnxn.cursor() as sf_cur:
+        sf_cur.execute(f"SHOW VIEWS IN SCHEMA {schema}")
+        columns = [column[0] for column in sf_cur.description]
+        existing = {row[columns.index("name")].upper() for row in sf_cur.fetchall()}
+        for view in views:
+            if view.upper() in existing:
+                continue
+            sf_cur.execute(f"SELECT GET_DDL('VIEW', '{base}.{view}', TRUE)")
+            ddl = re.sub(re.escape(base) + r"\.", schema + ".", sf_cur.fetchone()[0], flags=re.IGNORECASE)
+            sf_cur.execute(ddl)
+            print(f"{props['ACCOUNT']}: Landing view {schema}.{view} created")
+
+
+def ensure_account_column(sf_cnxn, tables):
+    """
+    Add the ACCOUNT_COLUMN to tables loaded with rows of several accounts.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        tables (list): The fully qualified table names.
+
+    Returns:
+        None
+    """
+    with sf_cnxn.cursor() as sf_cur:
+        for table in tables:
+            sf_cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {ACCOUNT_COLUMN} VARCHAR")
+
+
+def get_account_value(props):
+    """
+    Build the SELECT list entry filling the ACCOUNT_COLUMN for an account's rows.
+
+    Args:
+        props (dict): The phase props, see get_account_schema_props.
+
+    Returns:
+        str: ", '<ACCOUNT>' AS NETSUITE_ACCOUNT", or "" for the single [netsuite] account.
+    """
+    return f", '{props['ACCOUNT']}' AS {ACCOUNT_COLUMN}" if props.get("ACCOUNT") else ""
+
+
+def run_accounts(accounts, run_account, max_workers=None):
+    """
+    Run one callable per NetSuite account, concurrently.
+
+    Each account runs on its own thread, which opens its own connections.
+    A failing account does not stop the others.
+
+    Args:
+        accounts (list): The (name, section) tuples from get_accounts.
+        run_account (callable): Called with (name, section).
+        max_workers (int, optional): The number of accounts loaded at once. Defaults to all.
+
+    Returns:
+        dict: A dictionary mapping each account name to its error message, or None on success.
+    """
+    if len(accounts) == 1:
+        name, section = accounts[0]
+        run_account(name, section)
+        return {name: None}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(accounts)) as executor:
+        futures = {
+            name: executor.submit(run_account, name, section) for name, section in accounts
+        }
+        for name, future in futures.items():
+            try:
+                future.result()
+                results[name] = None
+            except Exception as e:
+                print(f"{name}: Account load failed - {e}")
+                results[name] = str(e)
+
+    failed = [name for name, error in results.items() if error]
+    print(f"{len(accounts) - len(failed)} of {len(accounts)} account(s) loaded" + (f", failed: {', '.join(failed)}" if failed else ""))
+    return results
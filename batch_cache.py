@@ -0,0 +1,268 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "manifest.lock"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+@contextmanager
+def manifest_lock(cache_dir):
+    """
+    Hold the cache directory's lock file, so read-modify-write cycles of the manifest
+    (and evictions) by concurrent processes and threads sharing CACHE_DIR do not interleave.
+
+    Args:
+        cache_dir (str): The cache directory.
+
+    Yields:
+        None
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, LOCK_FILE), "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def replace_file(path, content, mode="wb"):
+    """
+    Atomically write a file through a uniquely named temporary file in the same directory.
+
+    Args:
+        path (str): The path of the file.
+        content (bytes or str): The file's content.
+        mode (str): "wb" for bytes, "w" for text.
+
+    Returns:
+        None
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def read_manifest(cache_dir):
+    """
+    Read the cache manifest.
+
+    Args:
+        cache_dir (str): The cache directory.
+
+    Returns:
+        dict: A dictionary mapping batch keys to their cache entries.
+    """
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(cache_dir, manifest):
+    """
+    Atomically replace the cache manifest. Callers hold manifest_lock.
+
+    Args:
+        cache_dir (str): The cache directory.
+        manifest (dict): A dictionary mapping batch keys to their cache entries.
+
+    Returns:
+        None
+    """
+    replace_file(os.path.join(cache_dir, MANIFEST_FILE), json.dumps(manifest, indent=2), "w")
+
+
+def batch_key(table, since, until):
+    """
+    Build the cache key for an extracted batch.
+
+    Args:
+        table (str): The name of the table.
+        since (str): The lower watermark of the batch.
+        until (str): The upper watermark of the batch.
+
+    Returns:
+        str: The batch key.
+    """
+    return f"{table}|{since}|{until}"
+
+
+def evict(cache_dir, manifest, max_bytes):
+    """
+    Evict least recently used committed files until the cache fits in max_bytes.
+
+    Batches that still need to be replayed are never evicted: replay advances the
+    watermark batch by batch, so a missing batch would leave a gap. Callers hold manifest_lock.
+
+    Args:
+        cache_dir (str): The cache directory.
+        manifest (dict): A dictionary mapping batch keys to their cache entries.
+        max_bytes (int): The maximum total size of the cached files.
+
+    Returns:
+        int: The total size of the cached files left, which may still exceed max_bytes.
+    """
+    files = {}
+    for key, entry in manifest.items():
+        files.setdefault(entry["file"], []).append(key)
+
+    def last_used(file_name):
+        return max(manifest[key]["last_used"] for key in files[file_name])
+
+    total = sum(manifest[keys[0]]["bytes"] for keys in files.values())
+    committed = [
+        file_name for file_name, keys in files.items() if all(manifest[key]["committed"] for key in keys)
+    ]
+    for file_name in sorted(committed, key=last_used):
+        if total <= max_bytes:
+            break
+        total -= manifest[files[file_name][0]]["bytes"]
+        for key in files[file_name]:
+            del manifest[key]
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def put_batch(cache_dir, table, since, until, df, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Spill an extracted batch to a content-addressed Parquet file.
+
+    If the batch does not fit in max_bytes even after evicting every committed batch,
+    it is not cached: uncommitted batches are never evicted to make room.
+
+    Args:
+        cache_dir (str): The cache directory.
+        table (str): The name of the table.
+        since (str): The lower watermark of the batch.
+        until (str): The upper watermark of the batch.
+        df (DataFrame): The transformed batch.
+        max_bytes (int): The maximum total size of the cached files.
+
+    Returns:
+        str: The batch key, or None if the batch could not be cached.
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        content = buffer.getvalue()
+        file_name = hashlib.sha256(content).hexdigest() + ".parquet"
+
+        path = os.path.join(cache_dir, file_name)
+        key = batch_key(table, since, until)
+        with manifest_lock(cache_dir):
+            # written under the lock, so a concurrent eviction cannot remove it before it is listed
+            if not os.path.exists(path):
+                replace_file(path, content)
+
+            manifest = read_manifest(cache_dir)
+            manifest[key] = {
+                "table": table,
+                "since": str(since),
+                "until": str(until),
+                "file": file_name,
+                "bytes": len(content),
+                "committed": False,
+                "last_used": time.time(),
+            }
+            if evict(cache_dir, manifest, max_bytes) > max_bytes:
+                del manifest[key]
+                if not any(entry["file"] == file_name for entry in manifest.values()):
+                    os.remove(path)
+                write_manifest(cache_dir, manifest)
+                print(f"{table}: Batch cache full of uncommitted batches, batch not cached")
+                return None
+            write_manifest(cache_dir, manifest)
+        return key
+    except Exception as e:
+        print(f"{table}: Batch cache write failed - {e}")
+        return None
+
+
+def mark_committed(cache_dir, key):
+    """
+    Mark a cached batch as loaded into Snowflake so it is no longer replayed.
+
+    Args:
+        cache_dir (str): The cache directory.
+        key (str): The batch key.
+
+    Returns:
+        None
+    """
+    with manifest_lock(cache_dir):
+        manifest = read_manifest(cache_dir)
+        if key in manifest:
+            manifest[key]["committed"] = True
+            write_manifest(cache_dir, manifest)
+
+
+def get_pending_batches(cache_dir, table):
+    """
+    List the cached batches of a table that have not been committed to Snowflake.
+
+    Args:
+        cache_dir (str): The cache directory.
+        table (str): The name of the table.
+
+    Returns:
+        list: A list of (key, entry) tuples ordered by watermark.
+    """
+    manifest = read_manifest(cache_dir)
+    pending = [
+        (key, entry)
+        for key, entry in manifest.items()
+        if entry["table"] == table and not entry["committed"]
+    ]
+    return sorted(pending, key=lambda item: (item[1]["since"], item[1]["until"]))
+
+
+def load_batch(cache_dir, key):
+    """
+    Load a cached batch and refresh its LRU position.
+
+    Args:
+        cache_dir (str): The cache directory.
+        key (str): The batch key.
+
+    Returns:
+        DataFrame: The cached batch.
+    """
+    with manifest_lock(cache_dir):
+        manifest = read_manifest(cache_dir)
+        entry = manifest[key]
+        df = pd.read_parquet(os.path.join(cache_dir, entry["file"]))
+        entry["last_used"] = time.time()
+        write_manifest(cache_dir, manifest)
+    return df
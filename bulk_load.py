@@ -2,32 +2,14 @@
 from datetime import datetime
 from snowflake.connector.pandas_tools import write_pandas
 from ns_to_sf_transform import transform_data
-
-
-def fetch_data_ns(ns_cnxn, table):
-    """
-    Fetch data from a table in NetSuite.
-
-    Args:
-        ns_cnxn: The NetSuite database connection.
-        table (str): The name of the table to fetch data from.
-
-    Returns:
-        tuple: A tuple containing two elements:
-            - A list of column names.
-            - A list of fetched data rows.
-            Returns (-1, -1) if an error occurs during the execution.
-    """
-    query = f"SELECT * FROM {table};"
-    try:
-        with ns_cnxn.cursor() as ns_cursor:
-            ns_cursor.execute(query)
-            columns = [desc[0] for desc in ns_cursor.description]
-            data = ns_cursor.fetchall()
-        return columns, data
-    except Exception as e:
-        print(e)
-        return -1, -1
+from extract import extract_frame
+from catalog import get_table_setting
+from column_projection import get_table_columns
+from transient_landing_tables import create_run_table, drop_run_table, new_run_id
+from run_stats import finish_table_stats, new_table_stats
+from query_tags import tag_session
+from warehouse_policy import warehouse_for
+from work_queue import check_lease
 
 
 def update_control_table(
@@ -76,17 +58,28 @@ def bulk_load(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
         props (dict): A dictionary of additional properties.
 
     Returns:
-        None
+        dict: A dictionary mapping each loaded table to its run statistics
+            (started, seconds, rows, bytes).
     """
     LANDING_DB = props["LANDING_DB"]
     LANDING_SCHEMA = props["LANDING_SCHEMA"]
-    TRANSIENT_SCHEMA = "FINANCE_TRANSIENT"
+    props = dict(props)
+    props.setdefault("TRANSIENT_SCHEMA", "FINANCE_TRANSIENT")
+    props.setdefault("RUN_ID", new_run_id())
+    stats = {}
 
     for table in KEY_TABLES:
+        run_table = None
+        table_stats = new_table_stats()
         try:
-            columns, data = fetch_data_ns(ns_cnxn, table)
+            columns, data = extract_frame(
+                ns_cnxn,
+                table,
+                columns=get_table_columns(table, PRIMARY_KEY_TABLES, props),
+                batch_rows=get_table_setting(table, "batch_size"),
+            )
 
-            if columns == -1 or data == -1:
+            if columns == -1:
                 print(f"Fetching {table} data from NetSuite Failed!!!")
                 continue
 
@@ -95,33 +88,45 @@ def bulk_load(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
             )
             df = transform_data(data, columns, table, PRIMARY_KEY_TABLES)
             # print(df)
-            with sf_cnxn.cursor() as sf_cur:
-                sf_cur.execute(
-                    f"TRUNCATE TABLE {LANDING_DB}.{TRANSIENT_SCHEMA}.{table}"
+            tag_session(sf_cnxn, props, table)
+            run_table = create_run_table(sf_cnxn, table, props)
+
+            with warehouse_for(sf_cnxn, props, table, "write+overwrite", len(df), large_only=True):
+                write_pandas(
+                    conn=sf_cnxn,
+                    df=df,
+                    table_name=run_table.split(".")[-1],
+                    quote_identifiers=False,
+                    database=LANDING_DB,
+                    schema=props["TRANSIENT_SCHEMA"],
                 )
 
-            write_pandas(
-                conn=sf_cnxn,
-                df=df,
-                table_name=table,
-                quote_identifiers=False,
-                database=LANDING_DB,
-                schema=TRANSIENT_SCHEMA,
-            )
+                # swap the full extract into landing in a single statement
+                check_lease(props, table)
+                with sf_cnxn.cursor() as sf_cur:
+                    sf_cur.execute(
+                        f"INSERT OVERWRITE INTO {LANDING_DB}.{LANDING_SCHEMA}.{table} SELECT * FROM {run_table}"
+                    )
             print(f"{table}: Bulk Uploading to Snowflake Complete!")
 
             update_control_table(
                 sf_cnxn,
-                env="INFOFISCUS_PYTHON_LANDING",
+                env=props.get("ENV", "INFOFISCUS_PYTHON_LANDING"),
                 ns_table_name=table,
                 incr_modified_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 # source_df['DATE_LAST_MODIFIED'].values.max())
                 control_table=props["CONTROL_TABLE"],
             )
+            table_stats["rows"] = len(df)
+            table_stats["bytes"] = int(df.memory_usage(index=False, deep=True).sum())
+            stats[table] = finish_table_stats(table_stats)
 
         except Exception as e:
             print(f"ERROR in {table}: {e}")
             continue
         finally:
             sf_cnxn.commit()
-            sf_cnxn.close()
+            if run_table:
+                drop_run_table(sf_cnxn, run_table)
+
+    return stats
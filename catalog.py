@@ -0,0 +1,232 @@
+import json
+import os
+
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json")
+STRATEGIES = ("incremental", "bulk")
+CHANGE_CAPTURES = ("timestamp", "stream")
+TABLE_SETTINGS = {
+    "primary_key": (str, list, type(None)),
+    "enabled": (bool,),
+    "strategy": (str,),
+    "priority": (int,),
+    "batch_size": (int,),
+    "partitions": (int,),
+    "columns": (list, type(None)),
+    "cluster_by": (list, type(None)),
+    "search_optimization": (bool,),
+    "merge_shards": (int,),
+}
+TABLE_DEFAULTS = {
+    "primary_key": None,
+    "enabled": True,
+    "strategy": "incremental",
+    "priority": 0,
+    "batch_size": 50000,
+    "partitions": 16,
+    "columns": None,
+    "cluster_by": None,
+    "search_optimization": False,
+    "merge_shards": 1,
+}
+
+CATALOG = None
+
+
+def key_columns(primary_key):
+    """
+    Normalise a primary key setting to its list of columns.
+
+    Args:
+        primary_key (str or list): A single key column or the columns of a composite key.
+
+    Returns:
+        list: The key columns.
+    """
+    return [primary_key] if isinstance(primary_key, str) else list(primary_key)
+
+
+def validate_table(table, settings, errors):
+    """
+    Check one table entry of the catalog, collecting every problem found.
+
+    Args:
+        table (str): The NetSuite table name.
+        settings (dict): The table settings, defaults applied.
+        errors (list): The list the problems are appended to.
+
+    Returns:
+        None
+    """
+    for key, value in settings.items():
+        if key not in TABLE_SETTINGS:
+            errors.append(f"tables.{table}: unknown setting '{key}'")
+        # bool is an int subclass, so check it explicitly for the numeric settings
+        elif not isinstance(value, TABLE_SETTINGS[key]) or (isinstance(value, bool) and bool not in TABLE_SETTINGS[key]):
+            errors.append(f"tables.{table}.{key}: invalid value {value!r}")
+
+    if settings.get("strategy") not in STRATEGIES:
+        errors.append(f"tables.{table}.strategy: must be one of {', '.join(STRATEGIES)}")
+    for key in ("batch_size", "partitions", "merge_shards"):
+        if isinstance(settings.get(key), int) and settings[key] < 1:
+            errors.append(f"tables.{table}.{key}: must be at least 1")
+    primary_key = settings.get("primary_key")
+    if isinstance(primary_key, list) and (not primary_key or not all(isinstance(col, str) for col in primary_key)):
+        errors.append(f"tables.{table}.primary_key: must be a column name or a non-empty list of column names")
+    columns = settings.get("columns")
+    if isinstance(columns, list) and not all(isinstance(col, str) for col in columns):
+        errors.append(f"tables.{table}.columns: must be a list of column names")
+    cluster_by = settings.get("cluster_by")
+    if isinstance(cluster_by, list) and (not cluster_by or not all(isinstance(col, str) for col in cluster_by)):
+        errors.append(f"tables.{table}.cluster_by: must be a non-empty list of columns or expressions")
+    if settings.get("search_optimization") and settings.get("primary_key") is None:
+        errors.append(f"tables.{table}.search_optimization: needs a primary_key")
+    if isinstance(settings.get("merge_shards"), int) and settings["merge_shards"] > 1 and settings.get("primary_key") is None:
+        errors.append(f"tables.{table}.merge_shards: needs a primary_key")
+
+
+def validate_warehouse_policy(path, policy, errors):
+    """
+    Check a phase's WAREHOUSE_POLICY, collecting every problem found.
+
+    Args:
+        path (str): The policy's location in the catalog, for the messages.
+        policy (dict): The policy, or None.
+        errors (list): The list the problems are appended to.
+
+    Returns:
+        None
+    """
+    from warehouse_policy import WAREHOUSE_SIZES, normalize_size
+
+    if policy is None:
+        return
+    if not isinstance(policy, dict):
+        errors.append(f"{path}.WAREHOUSE_POLICY: must be an object")
+        return
+    if "ENABLED" in policy and not isinstance(policy["ENABLED"], bool):
+        errors.append(f"{path}.WAREHOUSE_POLICY.ENABLED: must be true or false")
+    for key in ("SIZE", "LARGE_SIZE", "BASELINE_SIZE"):
+        if key in policy and normalize_size(policy[key]) not in WAREHOUSE_SIZES:
+            errors.append(f"{path}.WAREHOUSE_POLICY.{key}: unknown warehouse size {policy[key]!r}")
+    for key in ("LARGE_ROWS", "AUTO_SUSPEND"):
+        if key in policy and (not isinstance(policy[key], int) or isinstance(policy[key], bool) or policy[key] < 0):
+            errors.append(f"{path}.WAREHOUSE_POLICY.{key}: must be a non-negative integer")
+
+
+def load_catalog(path=CATALOG_FILE, env=None):
+    """
+    Load and validate the table catalog for one environment.
+
+    Args:
+        path (str): The path of the catalog JSON file.
+        env (str, optional): The environment to load. Defaults to the catalog's default_environment.
+
+    Returns:
+        dict: The resolved catalog with ENVIRONMENT, PHASE_PROPS, DEFAULTS and TABLES (per-table settings),
+            NETSUITE_TABLES (enabled tables by priority), PRIMARY_KEY_TABLES, SF_DATATYPES,
+            SOURCE_VIEW_KEYS and COLUMN_ALLOWLISTS.
+
+    Raises:
+        ValueError: If the catalog is invalid, listing every problem found.
+    """
+    with open(path) as f:
+        raw = json.load(f)
+
+    errors = []
+    env = env or raw.get("default_environment")
+    environments = raw.get("environments", {})
+    if env not in environments:
+        raise ValueError(f"{path}: unknown environment {env!r} (defined: {', '.join(environments)})")
+
+    phases = environments[env].get("phases", {})
+    for phase in ("0", "1", "2", "3"):
+        if not isinstance(phases.get(phase), dict):
+            errors.append(f"environments.{env}.phases.{phase}: missing")
+        else:
+            validate_warehouse_policy(f"environments.{env}.phases.{phase}", phases[phase].get("WAREHOUSE_POLICY"), errors)
+            if phases[phase].get("CHANGE_CAPTURE", "timestamp") not in CHANGE_CAPTURES:
+                errors.append(f"environments.{env}.phases.{phase}.CHANGE_CAPTURE: must be one of {', '.join(CHANGE_CAPTURES)}")
+
+    defaults = {**TABLE_DEFAULTS, **raw.get("defaults", {})}
+    tables = {}
+    for table, settings in raw.get("tables", {}).items():
+        if not isinstance(settings, dict):
+            errors.append(f"tables.{table}: must be an object")
+            continue
+        tables[table.upper()] = {**defaults, **settings}
+        validate_table(table, tables[table.upper()], errors)
+
+    for key in ("datatypes", "source_view_keys"):
+        if not isinstance(raw.get(key), dict):
+            errors.append(f"{key}: missing")
+
+    if errors:
+        raise ValueError(f"{path}: invalid catalog\n  " + "\n  ".join(errors))
+
+    enabled = sorted(
+        (table for table, settings in tables.items() if settings["enabled"]),
+        key=lambda table: tables[table]["priority"],
+    )
+    return {
+        "ENVIRONMENT": env,
+        "PHASE_PROPS": {int(phase): dict(props) for phase, props in phases.items()},
+        "DEFAULTS": defaults,
+        "TABLES": tables,
+        "NETSUITE_TABLES": enabled,
+        "PRIMARY_KEY_TABLES": {
+            table: settings["primary_key"]
+            for table, settings in tables.items()
+            if settings["primary_key"] is not None
+        },
+        "SF_DATATYPES": raw["datatypes"],
+        "SOURCE_VIEW_KEYS": raw["source_view_keys"],
+        "COLUMN_ALLOWLISTS": {
+            table: settings["columns"]
+            for table, settings in tables.items()
+            if settings["columns"] is not None
+        },
+    }
+
+
+def configure_catalog(path=None, env=None):
+    """
+    Load the catalog used by the tables.py getters.
+
+    Args:
+        path (str, optional): The catalog file. Defaults to $ELT_CATALOG, then catalog.json.
+        env (str, optional): The environment. Defaults to $ELT_ENV, then the catalog default.
+
+    Returns:
+        dict: The resolved catalog.
+    """
+    global CATALOG
+    CATALOG = load_catalog(
+        path or os.environ.get("ELT_CATALOG", CATALOG_FILE),
+        env or os.environ.get("ELT_ENV"),
+    )
+    return CATALOG
+
+
+def get_catalog():
+    """
+    Return the loaded catalog, loading it from the defaults on first use.
+
+    Returns:
+        dict: The resolved catalog.
+    """
+    return CATALOG if CATALOG is not None else configure_catalog()
+
+
+def get_table_setting(table, key):
+    """
+    Look up one per-table setting, falling back to the catalog defaults for unlisted tables.
+
+    Args:
+        table (str): The NetSuite table name.
+        key (str): The setting, e.g. "batch_size" or "strategy".
+
+    Returns:
+        object: The setting's value.
+    """
+    catalog = get_catalog()
+    return catalog["TABLES"].get(table, catalog["DEFAULTS"])[key]
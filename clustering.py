@@ -0,0 +1,143 @@
+import json
+import time
+from catalog import get_table_setting
+from load_tables import get_search_optimization_query
+from run_stats import DEFAULT_STATS_DB, connect_stats
+
+# the phase 1 watermark column, used to report on tables without a clustering key
+DEFAULT_REPORT_COLUMNS = ["DATE_LAST_MODIFIED"]
+
+
+def get_clustering_information(sf_cnxn, table, columns):
+    """
+    Read SYSTEM$CLUSTERING_INFORMATION for a table on the given columns or expressions.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        table (str): The fully qualified table name.
+        columns (list): The clustering columns or expressions to measure.
+
+    Returns:
+        dict: The parsed clustering information, or -1 if an error occurs.
+    """
+    try:
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(
+                "SELECT SYSTEM$CLUSTERING_INFORMATION(%s, %s)", (table, f"({', '.join(columns)})")
+            )
+            return json.loads(sf_cur.fetchone()[0])
+    except Exception as e:
+        print(f"{table}: Clustering information not available - {e}")
+        return -1
+
+
+def record_clustering(table, cluster_by, info, path=DEFAULT_STATS_DB):
+    """
+    Store a clustering snapshot and return the previous one for the same key.
+
+    Args:
+        table (str): The table name.
+        cluster_by (str): The measured clustering expression.
+        info (dict): The clustering information from get_clustering_information.
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        tuple: The previous (TOTAL_PARTITIONS, CONSTANT_PARTITIONS, AVERAGE_OVERLAPS,
+            AVERAGE_DEPTH), or None if there is none.
+    """
+    try:
+        cnxn = connect_stats(path)
+        previous = cnxn.execute(
+            "SELECT TOTAL_PARTITIONS, CONSTANT_PARTITIONS, AVERAGE_OVERLAPS, AVERAGE_DEPTH FROM CLUSTERING_SNAPSHOTS "
+            "WHERE TABLE_NAME = ? AND CLUSTER_BY = ? ORDER BY RECORDED_AT DESC LIMIT 1",
+            (table, cluster_by),
+        ).fetchone()
+        with cnxn:
+            cnxn.execute(
+                "INSERT INTO CLUSTERING_SNAPSHOTS VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    table,
+                    cluster_by,
+                    info.get("total_partition_count"),
+                    info.get("total_constant_partition_count"),
+                    info.get("average_overlaps"),
+                    info.get("average_depth"),
+                    time.time(),
+                ),
+            )
+        cnxn.close()
+        return previous
+    except Exception as e:
+        print("Clustering snapshot not recorded:", e)
+        return None
+
+
+def clustering_report(sf_cnxn, tables, props):
+    """
+    Print how well each landing table is clustered for its watermark predicates.
+
+    Every table is measured on its catalog cluster_by (DATE_LAST_MODIFIED without one)
+    and compared with the previous snapshot, so the effect of a clustering key shows up
+    as falling average depth and overlaps from one report to the next.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        tables (list): The NetSuite tables.
+        props (dict): The phase props holding LANDING_DB and LANDING_SCHEMA.
+
+    Returns:
+        dict: A dictionary mapping each measured table to its clustering information.
+    """
+    report = {}
+    for table in tables:
+        columns = get_table_setting(table, "cluster_by") or DEFAULT_REPORT_COLUMNS
+        info = get_clustering_information(
+            sf_cnxn, f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table}", columns
+        )
+        if info == -1:
+            continue
+        report[table] = info
+        previous = record_clustering(table, ", ".join(columns), info)
+        change = ""
+        if previous and previous[3] is not None and info.get("average_depth") is not None:
+            change = f" (was {previous[3]:.1f} depth, {previous[2]:.1f} overlaps)"
+        print(
+            f"{table} [{', '.join(columns)}]: {info.get('total_partition_count')} partitions, "
+            f"{info.get('total_constant_partition_count')} constant, "
+            f"average depth {info.get('average_depth', 0):.1f}, "
+            f"average overlaps {info.get('average_overlaps', 0):.1f}{change}"
+        )
+    return report
+
+
+def apply_clustering(sf_cnxn, tables, PRIMARY_KEY_TABLES, props):
+    """
+    Apply the catalog clustering keys and search optimization to existing landing tables.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        tables (list): The NetSuite tables.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): The phase props holding LANDING_DB and LANDING_SCHEMA.
+
+    Returns:
+        None
+    """
+    LANDING_DB = props["LANDING_DB"]
+    LANDING_SCHEMA = props["LANDING_SCHEMA"]
+
+    for table in tables:
+        queries = []
+        cluster_by = get_table_setting(table, "cluster_by")
+        if cluster_by:
+            queries.append(f"ALTER TABLE {LANDING_DB}.{LANDING_SCHEMA}.{table} CLUSTER BY ({', '.join(cluster_by)})")
+        if get_table_setting(table, "search_optimization"):
+            queries.append(get_search_optimization_query(table, LANDING_DB, LANDING_SCHEMA, PRIMARY_KEY_TABLES))
+        try:
+            with sf_cnxn.cursor() as sf_cur:
+                for query in queries:
+                    sf_cur.execute(query)
+            if queries:
+                print(f"{table}: Clustering applied")
+        except Exception as e:
+            print(f"{table}: Clustering not applied - {e}")
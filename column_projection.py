@@ -0,0 +1,87 @@
+from catalog import key_columns
+
+ALWAYS_KEEP_COLUMNS = ["DATE_LAST_MODIFIED"]
+
+
+def get_table_columns(table, PRIMARY_KEY_TABLES, props):
+    """
+    Get the column allowlist for a table, if one is configured.
+
+    The primary key and the watermark column are always kept, since the loaders
+    cannot MERGE or filter incrementally without them.
+
+    Args:
+        table (str): The name of the table.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of properties, optionally holding COLUMN_ALLOWLISTS.
+
+    Returns:
+        list: The upper-case column names to extract, or None to extract every column.
+    """
+    allowlist = props.get("COLUMN_ALLOWLISTS", {}).get(table)
+    if not allowlist:
+        return None
+
+    columns = [col.upper() for col in allowlist]
+    required = key_columns(PRIMARY_KEY_TABLES[table]) if table in PRIMARY_KEY_TABLES else []
+    for col in required + ALWAYS_KEEP_COLUMNS:
+        if col not in columns:
+            columns.insert(0, col)
+    return columns
+
+
+def get_select_list(columns):
+    """
+    Build the SELECT list for an extract query.
+
+    Args:
+        columns (list): The columns to extract, or None for every column.
+
+    Returns:
+        str: A comma separated column list, or "*".
+    """
+    return ", ".join(columns) if columns else "*"
+
+
+def derive_column_allowlists(sf_cnxn, KEY_TABLES, props):
+    """
+    Derive column allowlists from the columns the staging views and DIM tables actually use.
+
+    A landing column is kept when a column with the same name exists in any VW_STG_* view
+    in the staging schema or any DIM_* table in the datamart schema, which is the same
+    name-based matching staging_to_datamart.get_common_columns relies on.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        KEY_TABLES (list): A list of landing table names.
+        props (dict): A dictionary of properties containing the LANDING, STAGING and DATAMART
+            database and schema names.
+
+    Returns:
+        dict: A dictionary mapping table names to their derived column lists, or -1 on error.
+    """
+    try:
+        query = f"""
+            WITH
+                USED AS (
+                  SELECT COLUMN_NAME FROM {props['STAGING_DB']}.INFORMATION_SCHEMA.COLUMNS
+                  WHERE TABLE_SCHEMA = '{props['STAGING_SCHEMA']}' AND TABLE_NAME LIKE 'VW_STG_%'
+                  UNION
+                  SELECT COLUMN_NAME FROM {props['DATAMART_DB']}.INFORMATION_SCHEMA.COLUMNS
+                  WHERE TABLE_SCHEMA = '{props['DATAMART_SCHEMA']}' AND TABLE_NAME LIKE 'DIM_%')
+                SELECT L.TABLE_NAME, L.COLUMN_NAME
+                FROM {props['LANDING_DB']}.INFORMATION_SCHEMA.COLUMNS L
+                INNER JOIN USED U ON L.COLUMN_NAME = U.COLUMN_NAME
+                WHERE L.TABLE_SCHEMA = '{props['LANDING_SCHEMA']}'
+                AND L.TABLE_NAME IN ({', '.join([f"'{table}'" for table in KEY_TABLES])})
+                ORDER BY L.TABLE_NAME, L.ORDINAL_POSITION;
+            """
+        allowlists = {}
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(query)
+            for table_name, column_name in sf_cur.fetchall():
+                allowlists.setdefault(table_name, []).append(column_name)
+        return allowlists
+    except Exception as e:
+        print(e)
+        return -1
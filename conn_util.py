@@ -1,5 +1,11 @@
-import snowflake.connector as sfc
-import pyodbc
+import datetime
+import queue
+import struct
+import time
+from contextlib import contextmanager
+
+# The database drivers are imported inside the connect functions, so Snowflake-only
+# phases never pay for loading pyodbc (and vice versa).
 
 
 def get_sf_connection(snowflake):
@@ -13,6 +19,8 @@ def get_sf_connection(snowflake):
         sf_connection: The Snowflake database connection object, or -1 if connection fails.
 
     """
+    import snowflake.connector as sfc
+
     try:
         sf_connection = sfc.connect(
             user=snowflake["user"],
@@ -27,6 +35,153 @@ def get_sf_connection(snowflake):
         return -1
 
 
+class SnowflakeSessionPool:
+    """
+    Hand out Snowflake sessions to worker threads, one thread per session at a time.
+
+    The pool starts with the caller's own session and opens further sessions on demand,
+    up to size, switching them to the caller's current warehouse. Only the sessions the
+    pool opened are closed by close().
+    """
+
+    def __init__(self, sf_cnxn, connect, size):
+        self.connect = connect
+        self.size = max(1, size)
+        self.idle = queue.Queue()
+        self.idle.put(sf_cnxn)
+        self.opened = []
+        self.warehouse = None
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute("SELECT CURRENT_WAREHOUSE()")
+            self.warehouse = sf_cur.fetchone()[0]
+
+    def open_session(self):
+        """
+        Open one more session on the pool's warehouse.
+
+        Returns:
+            sf_connection: The new Snowflake session.
+
+        Raises:
+            ConnectionError: If the session could not be opened.
+        """
+        sf_cnxn = self.connect()
+        if sf_cnxn == -1:
+            raise ConnectionError("Snowflake session could not be opened")
+        if self.warehouse:
+            with sf_cnxn.cursor() as sf_cur:
+                sf_cur.execute(f"USE WAREHOUSE {self.warehouse}")
+        return sf_cnxn
+
+    @contextmanager
+    def session(self):
+        """
+        Borrow a session for the duration of a with block.
+
+        Yields:
+            sf_connection: A Snowflake session no other thread is using.
+        """
+        try:
+            sf_cnxn = self.idle.get_nowait()
+        except queue.Empty:
+            sf_cnxn = self.open_session()
+            self.opened.append(sf_cnxn)
+        try:
+            yield sf_cnxn
+        finally:
+            self.idle.put(sf_cnxn)
+
+    def close(self):
+        """Close the sessions the pool opened."""
+        for sf_cnxn in self.opened:
+            try:
+                sf_cnxn.close()
+            except Exception as e:
+                print("Snowflake session not closed:", e)
+        self.opened = []
+
+
+def get_statement_count(sf_cnxn):
+    """
+    Read how many statements a Snowflake session has sent so far.
+
+    This is the connector's request sequence counter, so every statement counts:
+    QUERY_TAG changes, write_pandas' stage, PUT and COPY, asynchronous queries and COMMITs.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+
+    Returns:
+        int: The number of statements, or 0 for a connection without the counter.
+    """
+    return getattr(sf_cnxn, "sequence_counter", 0)
+
+
+def execute_async_statements(sf_cnxn, statements, concurrency=8, poll_seconds=0.5):
+    """
+    Run independent statements as asynchronous Snowflake queries on one session.
+
+    At most concurrency statements are in flight at a time; as each finishes the next is
+    submitted, so compile and metadata latency overlap instead of adding up. A failing
+    statement does not stop the others.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        statements (list): A list of (label, query) tuples, submitted in order.
+        concurrency (int): The maximum number of statements in flight.
+        poll_seconds (float): The interval between status checks.
+
+    Returns:
+        tuple: A tuple containing two elements:
+            - A dictionary mapping labels to the first result row (None for no rows).
+            - A dictionary mapping the labels of failed statements to their error messages.
+    """
+    pending = list(statements)
+    running = {}
+    results, failures = {}, {}
+    while pending or running:
+        while pending and len(running) < max(1, concurrency):
+            label, query = pending.pop(0)
+            try:
+                with sf_cnxn.cursor() as sf_cur:
+                    sf_cur.execute_async(query)
+                    running[label] = sf_cur.sfqid
+            except Exception as e:
+                failures[label] = str(e)
+        for label, sfqid in list(running.items()):
+            try:
+                if sf_cnxn.is_still_running(sf_cnxn.get_query_status(sfqid)):
+                    continue
+                del running[label]
+                sf_cnxn.get_query_status_throw_if_error(sfqid)
+                with sf_cnxn.cursor() as sf_cur:
+                    sf_cur.get_results_from_sfqid(sfqid)
+                    results[label] = sf_cur.fetchone()
+            except Exception as e:
+                running.pop(label, None)
+                failures[label] = str(e)
+        if running:
+            time.sleep(poll_seconds)
+    return results, failures
+
+
+def print_statement_summary(action, results, failures):
+    """
+    Print the outcome of a batch of statements from execute_async_statements.
+
+    Args:
+        action (str): What the statements did, e.g. "Created".
+        results (dict): The succeeded statements' results by label.
+        failures (dict): The failed statements' error messages by label.
+
+    Returns:
+        None
+    """
+    print(f"{action} {len(results)} table(s), {len(failures)} failed")
+    for label, error in failures.items():
+        print(f"  {label}: {error}")
+
+
 def get_ns_connection(netsuite):
     """
     Establishes a connection to NetSuite database.
@@ -38,10 +193,14 @@ def get_ns_connection(netsuite):
         ns_connection: The NetSuite database connection object, or -1 if connection fails.
 
     """
+    import pyodbc
+    from ns_governor import get_governor
+
     driver = [item for item in pyodbc.drivers()][-1]
 
     try:
-        ns_connection = pyodbc.connect(
+        ns_connection = get_governor().connect(
+            pyodbc.connect,
             "DRIVER="
             + driver
             + ";Host="
@@ -57,9 +216,84 @@ def get_ns_connection(netsuite):
             + ";CustomProperties=AccountID="
             + netsuite["accountid"]
             + ";RoleID="
-            + netsuite["roleid"]
+            + netsuite["roleid"],
         )
+        register_output_converters(ns_connection)
         return ns_connection
-    except ConnectionError as e:
+    except (ConnectionError, pyodbc.Error) as e:
         print(e)
         return -1
+
+
+def decode_text(value):
+    """
+    Decode a date or timestamp the driver returned as text into an ISO timestamp string.
+
+    Args:
+        value (bytes): The textual value, e.g. "2024-01-31 12:00:00.000" or "2024-01-31".
+
+    Returns:
+        str: The ISO timestamp.
+
+    Raises:
+        ValueError: If the value is neither the ODBC struct nor a readable timestamp.
+    """
+    text = value.decode("utf-16-le" if b"\x00" in value else "ascii").strip("\x00 ")
+    return datetime.datetime.fromisoformat(text[:19]).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def decode_timestamp(value):
+    """
+    Decode a raw SQL_TIMESTAMP_STRUCT into an ISO "YYYY-MM-DD HH:MM:SS" string.
+
+    Args:
+        value (bytes): The packed year, month, day, hour, minute, second, fraction struct,
+            or the value as text for drivers that return it that way.
+
+    Returns:
+        str: The ISO timestamp, or None for NULL.
+    """
+    if value is None:
+        return None
+    if len(value) != struct.calcsize("=hHHHHHI"):
+        return decode_text(value)
+    year, month, day, hour, minute, second, _ = struct.unpack("=hHHHHHI", value)
+    return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+
+
+def decode_date(value):
+    """
+    Decode a raw SQL_DATE_STRUCT into an ISO timestamp string at midnight.
+
+    Args:
+        value (bytes): The packed year, month, day struct, or the value as text.
+
+    Returns:
+        str: The ISO timestamp, or None for NULL.
+    """
+    if value is None:
+        return None
+    if len(value) != struct.calcsize("=hHH"):
+        return decode_text(value)
+    year, month, day = struct.unpack("=hHH", value)
+    return f"{year:04d}-{month:02d}-{day:02d} 00:00:00"
+
+
+def register_output_converters(ns_connection):
+    """
+    Decode NetSuite DATE/TIMESTAMP values straight into ISO strings.
+
+    This skips building datetime objects that the extract would otherwise format again.
+    NUMBER values keep pyodbc's default conversion to decimal.Decimal, which is exact;
+    their raw buffer layout is driver specific.
+
+    Args:
+        ns_connection: The NetSuite database connection.
+
+    Returns:
+        None
+    """
+    import pyodbc
+
+    ns_connection.add_output_converter(pyodbc.SQL_TYPE_TIMESTAMP, decode_timestamp)
+    ns_connection.add_output_converter(pyodbc.SQL_TYPE_DATE, decode_date)
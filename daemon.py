@@ -0,0 +1,306 @@
+import json
+import os
+import signal
+import time
+from configparser import ConfigParser
+from datetime import datetime
+from accounts import ACCOUNT_COLUMN, ensure_account_schema, get_account_props, get_accounts
+from conn_util import get_sf_connection, get_ns_connection
+from ns_governor import THREAD_GOVERNOR, configure_governor, new_governor
+from tables import *
+from incremental_load_transient import incremental_load_transient
+from landing_to_staging import landing_to_staging_accounts
+from staging_to_datamart import staging_to_datamart
+from transient_landing_tables import new_run_id
+from run_stats import record_stats
+from warehouse_policy import warehouse_for
+
+CONFIG_FILE = "properties/conn_props.ini"
+DEFAULT_INTERVALS = {1: 900, 2: 900, 3: 3600}
+HEALTH_CHECK_SECONDS = 60
+NS_HEALTH_QUERY = "SELECT table_name FROM oa_columns WHERE 1 = 0"
+SF_HEALTH_QUERY = "SELECT 1"
+
+
+def read_config():
+    """
+    Read the connection properties, picking up rotated credentials on every call.
+
+    Returns:
+        ConfigParser: The parsed connection properties.
+    """
+    config = ConfigParser()
+    config.read(CONFIG_FILE)
+    return config
+
+
+class WarmConnections:
+    """
+    Keeps one Snowflake connection and one NetSuite connection per account open between
+    scheduled jobs.
+
+    Connections are health-checked at most every HEALTH_CHECK_SECONDS and re-opened
+    from a freshly read config file when the check fails.
+    """
+
+    def __init__(self):
+        self.ns_cnxns = {}
+        self.sf_cnxn = None
+        self.governors = {}
+        self.checked = {"snowflake": 0.0}
+        self.reconnects = {"snowflake": 0}
+
+    def is_healthy(self, cnxn, query):
+        """
+        Run a trivial query to check that a connection is alive.
+
+        Args:
+            cnxn: The connection to check.
+            query (str): The health-check query.
+
+        Returns:
+            bool: True if the query succeeded.
+        """
+        try:
+            cur = cnxn.cursor()
+            cur.execute(query)
+            cur.fetchall()
+            cur.close()
+            return True
+        except Exception as e:
+            print("Health check failed:", e)
+            return False
+
+    def ensure(self, name, cnxn, query, connect):
+        """
+        Return a healthy connection, reconnecting with fresh credentials when needed.
+
+        Args:
+            name (str): "snowflake", "netsuite" or "netsuite:ACCOUNT".
+            cnxn: The current connection, or None.
+            query (str): The health-check query.
+            connect (callable): Opens a new connection from a config section.
+
+        Returns:
+            object: The healthy connection, or -1 if reconnecting failed.
+        """
+        now = time.monotonic()
+        if cnxn not in (None, -1):
+            if now - self.checked.get(name, 0.0) < HEALTH_CHECK_SECONDS or self.is_healthy(cnxn, query):
+                self.checked[name] = now
+                return cnxn
+            try:
+                cnxn.close()
+            except Exception:
+                pass
+
+        config = read_config()
+        if name == "snowflake":
+            section = config["snowflake"]
+        else:
+            section = dict(get_accounts(config))[name.partition(":")[2] or None]
+            if name == "netsuite":
+                configure_governor(section)
+            else:
+                # every account has its own limits, as in a multi-account main.py run
+                self.governors[name] = THREAD_GOVERNOR.governor = new_governor(section)
+        cnxn = connect(section)
+        self.reconnects[name] = self.reconnects.get(name, 0) + 1
+        self.checked[name] = now
+        return cnxn
+
+    def netsuite(self, account=None):
+        """Return a healthy NetSuite connection to an account (None for [netsuite]), or -1."""
+        name = f"netsuite:{account}" if account else "netsuite"
+        if name in self.governors:
+            THREAD_GOVERNOR.governor = self.governors[name]
+        self.ns_cnxns[name] = self.ensure(name, self.ns_cnxns.get(name), NS_HEALTH_QUERY, get_ns_connection)
+        return self.ns_cnxns[name]
+
+    def snowflake(self):
+        """Return a healthy Snowflake connection, or -1."""
+        self.sf_cnxn = self.ensure("snowflake", self.sf_cnxn, SF_HEALTH_QUERY, get_sf_connection)
+        return self.sf_cnxn
+
+    def invalidate(self):
+        """
+        Force a health check before the next job, e.g. after a failed one.
+
+        Returns:
+            None
+        """
+        self.checked = {name: 0.0 for name in self.checked}
+
+    def close(self):
+        """Close all connections."""
+        for cnxn in [*self.ns_cnxns.values(), self.sf_cnxn]:
+            if cnxn not in (None, -1):
+                cnxn.close()
+
+
+def get_jobs(config):
+    """
+    Build the job list from the [daemon] section of the connection properties.
+
+    Phase 1 runs one job per NetSuite account and table so busy tables can poll more often.
+    Recognised keys are phase_1_interval, phase_2_interval, phase_3_interval (seconds,
+    0 disables a phase) and per-table overrides such as phase_1.TRANSACTION_LINES = 300.
+
+    Args:
+        config (ConfigParser): The parsed connection properties.
+
+    Returns:
+        list: A list of job dictionaries with NAME, PHASE, ACCOUNT, TABLE and INTERVAL.
+    """
+    daemon = config["daemon"] if config.has_section("daemon") else {}
+    jobs = []
+
+    for phase in (1, 2, 3):
+        interval = int(daemon.get(f"phase_{phase}_interval", DEFAULT_INTERVALS[phase]))
+        if phase == 1:
+            for account, _ in get_accounts(config):
+                for table in getNetsuiteTables():
+                    table_interval = int(daemon.get(f"phase_1.{table}".lower(), interval))
+                    if table_interval > 0:
+                        jobs.append(
+                            {
+                                "NAME": f"1:{account}:{table}" if account else f"1:{table}",
+                                "PHASE": 1,
+                                "ACCOUNT": account,
+                                "TABLE": table,
+                                "INTERVAL": table_interval,
+                            }
+                        )
+        elif interval > 0:
+            jobs.append({"NAME": str(phase), "PHASE": phase, "ACCOUNT": None, "TABLE": None, "INTERVAL": interval})
+
+    return jobs
+
+
+def run_job(job, connections):
+    """
+    Run one scheduled job on the warm connections.
+
+    Args:
+        job (dict): The job to run.
+        connections (WarmConnections): The pooled connections.
+
+    Returns:
+        None
+
+    Raises:
+        ConnectionError: If a required connection could not be (re)established.
+        RuntimeError: If the phase loaded none of the requested tables. The loaders print
+            and swallow per-table errors, so this is how a dead warm connection shows up.
+    """
+    props = dict(getPhaseProps()[job["PHASE"]])
+    props["RUN_ID"] = new_run_id()
+    props["PHASE"] = job["PHASE"]
+    props["COLUMN_ALLOWLISTS"] = getColumnAllowlists()
+
+    sf_cnxn = connections.snowflake()
+    if sf_cnxn == -1:
+        raise ConnectionError("Snowflake connection failed")
+
+    with warehouse_for(sf_cnxn, props, job["TABLE"], "phase"):
+        if job["PHASE"] == 1:
+            ns_cnxn = connections.netsuite(job["ACCOUNT"])
+            if ns_cnxn == -1:
+                raise ConnectionError("NetSuite connection failed")
+            props = get_account_props(props, job["ACCOUNT"], dict(get_accounts(read_config()))[job["ACCOUNT"]])
+            ensure_account_schema(sf_cnxn, [job["TABLE"]], props)
+            stats = incremental_load_transient(ns_cnxn, sf_cnxn, [job["TABLE"]], getPrimaryKeyTables(), props)
+        elif job["PHASE"] == 2:
+            stats = landing_to_staging_accounts(
+                sf_cnxn, props, get_accounts(read_config()), lambda: get_sf_connection(read_config()["snowflake"])
+            )
+        elif job["PHASE"] == 3:
+            if get_accounts(read_config())[0][0] is not None:
+                props["ACCOUNT_COLUMN"] = ACCOUNT_COLUMN
+            stats = staging_to_datamart(sf_cnxn, props, getSourceViewKeys())
+            if stats == -1:
+                raise RuntimeError("Snowflake Staging to DataMart Failed")
+    record_stats(props["RUN_ID"], job["PHASE"], stats)
+    if not stats or (job["TABLE"] and job["TABLE"] not in stats):
+        raise RuntimeError(f"Phase {job['PHASE']} loaded no tables, see the errors above")
+
+
+def write_status(status_file, status):
+    """
+    Atomically write the daemon status as JSON.
+
+    Args:
+        status_file (str): The path of the status file.
+        status (dict): The status to write.
+
+    Returns:
+        None
+    """
+    with open(status_file + ".tmp", "w") as f:
+        json.dump(status, f, indent=2, default=str)
+    os.replace(status_file + ".tmp", status_file)
+
+
+def run_daemon():
+    """
+    Run the configured phases on their own intervals until SIGINT or SIGTERM.
+
+    Returns:
+        None
+    """
+    config = read_config()
+    status_file = config.get("daemon", "status_file", fallback="daemon_status.json")
+    jobs = get_jobs(config)
+    if not jobs:
+        print("No daemon jobs: every phase interval is 0 or no NetSuite table is enabled")
+        return
+    connections = WarmConnections()
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    now = time.time()
+    status = {
+        "pid": os.getpid(),
+        "started": datetime.now(),
+        "jobs": {job["NAME"]: {"interval": job["INTERVAL"], "next_due": now, "runs": 0, "failures": 0} for job in jobs},
+    }
+
+    try:
+        while not stopping:
+            job = min(jobs, key=lambda j: status["jobs"][j["NAME"]]["next_due"])
+            job_status = status["jobs"][job["NAME"]]
+            delay = job_status["next_due"] - time.time()
+            if delay > 0:
+                # sleep in short steps so a stop signal is honoured promptly
+                time.sleep(min(delay, 5))
+                continue
+
+            started = time.time()
+            job_status["last_start"] = datetime.now()
+            try:
+                run_job(job, connections)
+                job_status["last_status"] = "OK"
+            except Exception as e:
+                print(f"Job {job['NAME']} failed: {e}")
+                job_status["last_status"] = f"FAILED: {e}"
+                job_status["failures"] += 1
+                connections.invalidate()
+            job_status["runs"] += 1
+            job_status["last_seconds"] = round(time.time() - started, 3)
+            job_status["next_due"] = started + job["INTERVAL"]
+            status["reconnects"] = connections.reconnects
+            status["updated"] = datetime.now()
+            write_status(status_file, status)
+    finally:
+        connections.close()
+        status["stopped"] = datetime.now()
+        write_status(status_file, status)
+
+
+if __name__ == "__main__":
+    run_daemon()
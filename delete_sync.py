@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from snowflake.connector.pandas_tools import write_pandas
+from extract import extract
+from query_tags import tag_session
+from transient_landing_tables import drop_run_table, get_run_table_name, new_run_id
+
+FETCH_BATCH_ROWS = 100000
+
+
+def fetch_keys_ns(ns_cnxn, table, pk_col):
+    """
+    Stream the primary key column of a NetSuite table into a sorted NumPy array.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        table (str): The name of the table in NetSuite.
+        pk_col (str): The primary key column of the table.
+
+    Returns:
+        ndarray: A sorted, de-duplicated int64 array of keys, or -1 if an error occurs.
+    """
+    try:
+        chunks = [
+            batch.column(0).to_numpy()
+            for batch in extract(ns_cnxn, table, columns=[pk_col], batch_rows=FETCH_BATCH_ROWS)
+            if batch.num_rows
+        ]
+        keys = np.concatenate(chunks).astype(np.int64) if chunks else np.empty(0, dtype=np.int64)
+        return np.unique(keys)
+    except Exception as e:
+        print(table, ":", e)
+        return -1
+
+
+def fetch_keys_sf(sf_cnxn, landing_table, pk_col):
+    """
+    Fetch the primary key column of a Snowflake landing table into a sorted NumPy array.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        landing_table (str): The fully qualified landing table name.
+        pk_col (str): The primary key column of the table.
+
+    Returns:
+        ndarray: A sorted, de-duplicated int64 array of keys, or -1 if an error occurs.
+    """
+    try:
+        chunks = []
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(f"SELECT {pk_col} FROM {landing_table}")
+            for batch in sf_cur.fetch_pandas_batches():
+                chunks.append(batch[pk_col].to_numpy(dtype=np.int64))
+        keys = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+        return np.unique(keys)
+    except Exception as e:
+        print(landing_table, ":", e)
+        return -1
+
+
+def apply_deletes(sf_cnxn, table, pk_col, deleted_keys, props):
+    """
+    Remove (or flag) the deleted keys in the landing table with one set-based statement.
+
+    The keys are uploaded to a run-scoped temporary table and joined in a single
+    DELETE ... USING, or an UPDATE ... FROM when SOFT_DELETE_COLUMN is set in props.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the landing table.
+        pk_col (str): The primary key column of the table.
+        deleted_keys (ndarray): The keys present in landing but no longer in NetSuite.
+        props (dict): A dictionary of properties.
+
+    Returns:
+        int: The number of rows affected.
+    """
+    landing_table = f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table}"
+    keys_table = get_run_table_name(f"{table}_DELETED", props)
+    soft_delete_col = props.get("SOFT_DELETE_COLUMN")
+
+    try:
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(f"CREATE TEMPORARY TABLE {keys_table} ({pk_col} NUMBER(38,0))")
+
+        write_pandas(
+            conn=sf_cnxn,
+            df=pd.DataFrame({pk_col: deleted_keys}),
+            table_name=keys_table.split(".")[-1],
+            quote_identifiers=False,
+            database=props["LANDING_DB"],
+            schema=props["TRANSIENT_SCHEMA"],
+        )
+
+        if soft_delete_col:
+            query = (
+                f"UPDATE {landing_table} TGT SET TGT.{soft_delete_col} = TRUE "
+                f"FROM {keys_table} DEL WHERE TGT.{pk_col} = DEL.{pk_col}"
+            )
+        else:
+            query = f"DELETE FROM {landing_table} TGT USING {keys_table} DEL WHERE TGT.{pk_col} = DEL.{pk_col}"
+
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(query)
+            affected = sf_cur.fetchone()[0]
+        sf_cnxn.commit()
+        return affected
+    finally:
+        drop_run_table(sf_cnxn, keys_table)
+
+
+def delete_sync(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
+    """
+    Remove landing rows whose primary keys no longer exist in NetSuite.
+
+    Only the primary key column is read on both sides; the set difference is computed on
+    sorted NumPy arrays, so memory is roughly 8 bytes per key per side.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        sf_cnxn: The Snowflake database connection.
+        KEY_TABLES (list): A list of table names to check.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of properties. DELETE_SYNC_MAX_RATIO (default 0.5) guards
+            against wiping a table when NetSuite returns an unexpectedly small key set.
+
+    Returns:
+        None
+    """
+    props = dict(props)
+    props.setdefault("TRANSIENT_SCHEMA", "FINANCE_TRANSIENT")
+    props.setdefault("RUN_ID", new_run_id())
+    max_ratio = float(props.get("DELETE_SYNC_MAX_RATIO", 0.5))
+
+    for table in KEY_TABLES:
+        if table not in PRIMARY_KEY_TABLES:
+            print(f"{table}: No primary key configured, skipping delete sync")
+            continue
+        if not isinstance(PRIMARY_KEY_TABLES[table], str):
+            print(f"{table}: Composite primary key, skipping delete sync")
+            continue
+        pk_col = PRIMARY_KEY_TABLES[table]
+        landing_table = f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table}"
+
+        try:
+            # landing first: a row created in NetSuite after its key snapshot and landed
+            # before the landing snapshot would otherwise look deleted
+            tag_session(sf_cnxn, props, table)
+            sf_keys = fetch_keys_sf(sf_cnxn, landing_table, pk_col)
+            if isinstance(sf_keys, int):
+                continue
+            ns_keys = fetch_keys_ns(ns_cnxn, table, pk_col)
+            if isinstance(ns_keys, int):
+                continue
+
+            deleted_keys = np.setdiff1d(sf_keys, ns_keys, assume_unique=True)
+            if len(deleted_keys) == 0:
+                print(f"{table}: No deleted records")
+                continue
+
+            if len(deleted_keys) > max_ratio * len(sf_keys):
+                print(
+                    f"{table}: {len(deleted_keys)} of {len(sf_keys)} keys missing in NetSuite exceeds "
+                    f"DELETE_SYNC_MAX_RATIO={max_ratio}, skipping delete sync"
+                )
+                continue
+
+            affected = apply_deletes(sf_cnxn, table, pk_col, deleted_keys, props)
+            print(f"{table}: {affected} deleted records synced to Landing")
+        except Exception as e:
+            print(f"ERROR in {table}: {e}")
+            continue
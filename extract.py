@@ -0,0 +1,305 @@
+import datetime
+import decimal
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from column_projection import get_select_list
+from load_tables import ns_query
+from ns_governor import get_governor
+from ns_to_sf_transform import EPOCH_TIMESTAMP, FETCH_BATCH_ROWS
+
+# oa_columns rows per NetSuite table, read once per process
+OA_COLUMNS = {}
+
+OA_TYPES = {
+    "INT": pa.int64(),
+    "INTEGER": pa.int64(),
+    "BIGINT": pa.int64(),
+    "SMALLINT": pa.int64(),
+    "FLOAT": pa.float64(),
+    "DOUBLE": pa.float64(),
+    "DATE": pa.timestamp("s"),
+    "TIMESTAMP": pa.timestamp("s"),
+}
+DESCRIPTION_TYPES = {
+    int: pa.int64(),
+    float: pa.float64(),
+    datetime.datetime: pa.timestamp("s"),
+    datetime.date: pa.timestamp("s"),
+}
+
+
+def get_oa_columns(ns_cnxn, table):
+    """
+    Read a table's column metadata from oa_columns, cached per process.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        table (str): The name of the table.
+
+    Returns:
+        dict: A dictionary mapping upper-cased column names to (type_name, oa_length,
+            oa_precision, oa_scale), empty if the metadata could not be read.
+    """
+    if table not in OA_COLUMNS:
+        try:
+            rows = ns_query(table, ns_cnxn)
+        except Exception as e:
+            print(f"{table}: oa_columns not available, typing from the cursor - {e}")
+            return {}
+        OA_COLUMNS[table] = {str(row[1]).upper(): tuple(row[2:6]) for row in rows}
+    return OA_COLUMNS[table]
+
+
+def get_decimal_type(precision, scale):
+    """
+    Map a NUMBER(precision, scale) to an exact Arrow type.
+
+    Args:
+        precision (int): The precision, or None if unknown.
+        scale (int): The scale, or None if unknown.
+
+    Returns:
+        DataType: int64 for integers that fit, otherwise decimal128.
+    """
+    precision = min(int(precision or 38), 38)
+    scale = int(scale or 0)
+    if scale == 0 and precision <= 18:
+        return pa.int64()
+    return pa.decimal128(max(precision, scale), scale)
+
+
+def get_arrow_type(oa_column, description):
+    """
+    Map a NetSuite column to its Arrow type.
+
+    Finance amounts stay exact: NUMBER and DECIMAL columns with a scale become
+    decimal128(precision, scale) rather than float64.
+
+    Args:
+        oa_column (tuple): The (type_name, oa_length, oa_precision, oa_scale) metadata, or None.
+        description (tuple): The column's cursor description, used without metadata.
+
+    Returns:
+        DataType: The Arrow type.
+    """
+    if oa_column is None:
+        if description[1] is decimal.Decimal:
+            return get_decimal_type(description[4], description[5])
+        return DESCRIPTION_TYPES.get(description[1], pa.string())
+    type_name, _, precision, scale = oa_column
+    type_name = str(type_name).upper()
+    if type_name in ("NUMBER", "DECIMAL"):
+        return get_decimal_type(precision, scale)
+    return OA_TYPES.get(type_name, pa.string())
+
+
+def get_arrow_schema(table, description, oa_columns):
+    """
+    Build the Arrow schema of an extract from its cursor description and oa_columns.
+
+    Every field carries its oa_columns metadata (oa_type, oa_length, oa_precision and
+    oa_scale), and the schema carries the table name.
+
+    Args:
+        table (str): The name of the table.
+        description (tuple): The executed cursor's description.
+        oa_columns (dict): The table's metadata from get_oa_columns.
+
+    Returns:
+        Schema: The Arrow schema.
+    """
+    fields = []
+    for desc in description:
+        oa_column = oa_columns.get(str(desc[0]).upper())
+        metadata = None
+        if oa_column is not None:
+            metadata = {
+                key: str(value)
+                for key, value in zip(("oa_type", "oa_length", "oa_precision", "oa_scale"), oa_column)
+            }
+        fields.append(pa.field(desc[0], get_arrow_type(oa_column, desc), metadata=metadata))
+    return pa.schema(fields, metadata={"table": table})
+
+
+def to_arrow_array(values, arrow_type):
+    """
+    Convert the values of one column into an Arrow array of the given type.
+
+    Timestamps arrive as ISO strings from the NetSuite output converters and are parsed;
+    Decimal values for integer columns are converted to int first.
+
+    Args:
+        values (tuple): The column values.
+        arrow_type (DataType): The column's Arrow type.
+
+    Returns:
+        Array: The Arrow array.
+    """
+    if pa.types.is_timestamp(arrow_type) and any(isinstance(v, str) for v in values):
+        return pa.array(values, pa.string()).cast(arrow_type)
+    if pa.types.is_string(arrow_type):
+        return pa.array([None if v is None else str(v) for v in values], arrow_type)
+    try:
+        return pa.array(values, arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if pa.types.is_integer(arrow_type):
+            convert = int
+        elif pa.types.is_decimal(arrow_type):
+            convert = decimal.Decimal
+        else:
+            convert = float
+        return pa.array([None if v is None else convert(v) for v in values], arrow_type)
+
+
+def to_record_batch(rows, schema):
+    """
+    Convert fetched rows into a record batch.
+
+    Args:
+        rows (list): The fetched rows.
+        schema (Schema): The extract's schema.
+
+    Returns:
+        RecordBatch: The batch.
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.RecordBatch.from_arrays(
+        [to_arrow_array(values, field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def get_extract_query(table, since=None, columns=None, until=None, where=None):
+    """
+    Build the NetSuite extract query.
+
+    Args:
+        table (str): The name of the table.
+        since (str, optional): The exclusive lower bound of DATE_LAST_MODIFIED.
+        columns (list, optional): The columns to extract. Defaults to every column.
+        until (str, optional): The inclusive upper bound of DATE_LAST_MODIFIED.
+        where (str, optional): A further predicate, e.g. a key range.
+
+    Returns:
+        str: The query.
+    """
+    predicates = []
+    if since:
+        predicates.append(f"DATE_LAST_MODIFIED > '{since}'")
+    if until:
+        predicates.append(f"DATE_LAST_MODIFIED <= '{until}'")
+    if where:
+        predicates.append(f"({where})")
+    query = f"SELECT {get_select_list(columns)} FROM {table}"
+    if predicates:
+        query += " WHERE " + " AND ".join(predicates)
+    return query
+
+
+def extract(ns_cnxn, table, since=None, columns=None, until=None, where=None, batch_rows=FETCH_BATCH_ROWS):
+    """
+    Stream a NetSuite extract as typed Arrow record batches.
+
+    The query runs through the NetSuite governor, which retries it when throttled; the
+    fetch then streams batch by batch, so only one batch is held in memory at a time.
+    The governor's concurrency slot is held until the generator finishes or is closed.
+    At least one batch, possibly empty, is always yielded so consumers get the schema.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        table (str): The name of the table.
+        since (str, optional): The exclusive lower bound of DATE_LAST_MODIFIED.
+        columns (list, optional): The columns to extract. Defaults to every column.
+        until (str, optional): The inclusive upper bound of DATE_LAST_MODIFIED.
+        where (str, optional): A further predicate, e.g. a key range.
+        batch_rows (int): The number of rows per batch and fetch round-trip.
+
+    Yields:
+        RecordBatch: The batches, with the schema from get_arrow_schema.
+    """
+    query = get_extract_query(table, since, columns, until, where)
+    # read before the extract opens its cursor, one active statement per connection
+    oa_columns = get_oa_columns(ns_cnxn, table)
+
+    def run_query():
+        ns_cursor = ns_cnxn.cursor()
+        try:
+            ns_cursor.execute(query)
+        except Exception:
+            ns_cursor.close()
+            raise
+        return ns_cursor
+
+    with get_governor().hold(table, run_query) as ns_cursor:
+        try:
+            schema = get_arrow_schema(table, ns_cursor.description, oa_columns)
+            yielded = False
+            while True:
+                rows = ns_cursor.fetchmany(batch_rows)
+                if not rows and yielded:
+                    break
+                yield to_record_batch(rows, schema)
+                yielded = True
+                if not rows:
+                    break
+        finally:
+            ns_cursor.close()
+
+
+def to_dataframe(batches):
+    """
+    Combine record batches into the DataFrame the loaders transform and write.
+
+    Timestamps become "YYYY-MM-DD HH:MM:SS" strings (NULL as 1970-01-01 00:00:00),
+    formatted by Arrow so sentinel dates such as 0001-01-01 or 9999-12-31, which are
+    outside the range of nanosecond pandas timestamps, keep their value; decimals stay decimal.Decimal objects, and numeric columns with NULLs become object
+    columns holding None, so NULLs reach Snowflake as NULL rather than 0.
+
+    Args:
+        batches (list): The record batches of one extract.
+
+    Returns:
+        DataFrame: One column per field.
+    """
+    table = pa.Table.from_batches(batches)
+    arrays = {}
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_timestamp(field.type):
+            values = pc.fill_null(pc.strftime(column, format="%Y-%m-%d %H:%M:%S"), EPOCH_TIMESTAMP)
+            arrays[field.name] = np.array(values.to_pylist(), dtype=object)
+        elif pa.types.is_decimal(field.type) or (
+            column.null_count and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))
+        ):
+            arrays[field.name] = np.array(column.to_pylist(), dtype=object)
+        else:
+            arrays[field.name] = column.to_pandas().to_numpy()
+    return pd.DataFrame(arrays, columns=table.column_names)
+
+
+def extract_frame(ns_cnxn, table, since=None, columns=None, until=None, where=None, batch_rows=FETCH_BATCH_ROWS):
+    """
+    Run an extract into a single DataFrame, for loaders that write whole batches.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        table (str): The name of the table.
+        since (str, optional): The exclusive lower bound of DATE_LAST_MODIFIED.
+        columns (list, optional): The columns to extract. Defaults to every column.
+        until (str, optional): The inclusive upper bound of DATE_LAST_MODIFIED.
+        where (str, optional): A further predicate, e.g. a key range.
+        batch_rows (int): The number of rows per fetch round-trip.
+
+    Returns:
+        tuple: A tuple containing two elements:
+            - A list of column names.
+            - A DataFrame of the fetched data.
+        Returns (-1, -1) if an error occurs during the execution.
+    """
+    try:
+        df = to_dataframe(list(extract(ns_cnxn, table, since, columns, until, where, batch_rows)))
+        return list(df.columns), df
+    except Exception as e:
+        print(table, ":", e)
+        return -1, -1
@@ -1,6 +1,9 @@
 # import pandas as pd
 from datetime import *
+from catalog import key_columns
 from ns_to_sf_transform import transform_data
+from extract import extract_frame
+from column_projection import get_table_columns
 
 
 def check_date_last_modified(sf_cnxn, control_table_name, env, table_name):
@@ -69,36 +72,6 @@ def update_control_table(
         return -1
 
 
-def fetch_data_ns(ns_cnxn, table, last_modified_date):
-    """
-    Fetch data from a table in NetSuite based on the last modified date.
-
-    Args:
-        ns_cnxn: The NetSuite database connection.
-        table (str): The name of the table to fetch data from.
-        last_modified_date (str): The last modified date to filter the data.
-
-    Returns:
-        tuple: A tuple containing two elements:
-            - A list of column names.
-            - A list of fetched data rows.
-        Returns (-1, -1) if an error occurs during the execution.
-    """
-    try:
-        query = (
-            f"SELECT * FROM {table} WHERE DATE_LAST_MODIFIED > '{last_modified_date}'"
-        )
-
-        with ns_cnxn.cursor() as ns_cursor:
-            ns_cursor.execute(query)
-            columns = [desc[0] for desc in ns_cursor.description]
-            data = ns_cursor.fetchall()
-        return columns, data
-    except Exception as e:
-        print(table, ":", e)
-        return -1, -1
-
-
 def upsert_to_snowflake(sf_cnxn, sf_data, table, id_cols):
     """
     Upsert data from a Pandas DataFrame to Snowflake.
@@ -175,8 +148,10 @@ def incremental_load(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
                 continue
 
             # filter the records from NetSuite based on the watermarked (LAST_MODIFIED_DATE) column
-            columns, data = fetch_data_ns(ns_cnxn, table, ct_dt)
-            if columns == -1 or data == -1:
+            columns, data = extract_frame(
+                ns_cnxn, table, ct_dt, get_table_columns(table, PRIMARY_KEY_TABLES, props)
+            )
+            if columns == -1:
                 continue
 
             if len(data) == 0:
@@ -184,7 +159,7 @@ def incremental_load(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
                 continue
 
             sf_data = transform_data(data, columns, table, PRIMARY_KEY_TABLES)
-            id_cols = [PRIMARY_KEY_TABLES[table]]
+            id_cols = key_columns(PRIMARY_KEY_TABLES[table])
 
             # upsert the newly processed records to snowflake
             upsertRes = upsert_to_snowflake(sf_cnxn, sf_data, table, id_cols)
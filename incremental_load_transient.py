@@ -1,10 +1,31 @@
-# import pandas as pd
+import time
+import pandas as pd
 from datetime import datetime
 from snowflake.connector.pandas_tools import write_pandas
 from ns_to_sf_transform import transform_data
-from tables import getPrimaryKeyTables
-
-PRIMARY_KEY_TABLES = getPrimaryKeyTables()
+from extract import extract_frame, get_extract_query
+from conn_util import get_statement_count
+from column_projection import get_table_columns
+from ns_governor import get_governor
+from bulk_load import bulk_load
+from catalog import get_table_setting, key_columns
+from transient_landing_tables import create_run_table, drop_run_table, new_run_id
+from run_stats import finish_table_stats, new_table_stats
+from query_tags import tag_session
+from warehouse_policy import warehouse_for
+from work_queue import check_lease
+from sharded_merge import get_range_predicate, get_shard_bounds, get_shard_ranges, run_shards, should_shard
+from batch_cache import (
+    DEFAULT_MAX_BYTES,
+    get_pending_batches,
+    load_batch,
+    mark_committed,
+    put_batch,
+)
+
+# watermark gap below which a table is loaded in one window even with WINDOW_MAX_ROWS set,
+# so regular incremental runs never pay for plan_windows' NetSuite COUNT(*) queries
+DEFAULT_WINDOW_MIN_GAP_HOURS = 24
 
 def check_date_last_modified(df, env, table_name):
     """
@@ -38,34 +59,118 @@ def check_date_last_modified(df, env, table_name):
         return -1
 
 
-def fetch_data_ns(ns_cnxn, table, last_modified_date):
+def count_data_ns(ns_cnxn, table, since=None, until=None):
     """
-    Fetch data from a table in NetSuite based on the last modified date.
+    Count the NetSuite rows modified within a watermark window.
 
     Args:
         ns_cnxn: The NetSuite database connection.
-        table (str): The name of the table to fetch data from.
-        last_modified_date (str): The last modified date to filter the data.
+        table (str): The name of the table.
+        since (str, optional): The exclusive lower bound of DATE_LAST_MODIFIED.
+        until (str, optional): The inclusive upper bound of DATE_LAST_MODIFIED.
+            Without either bound the whole table is counted.
 
     Returns:
-        tuple: A tuple containing two elements:
-            - A list of column names.
-            - A list of fetched data rows.
-        Returns (-1, -1) if an error occurs during the execution.
+        int: The number of rows in the window.
     """
-    try:
-        query = (
-            f"SELECT * FROM {table} WHERE DATE_LAST_MODIFIED > '{last_modified_date}'"
-        )
+    query = get_extract_query(table, since, ["COUNT(*)"], until)
 
+    def run_query():
         with ns_cnxn.cursor() as ns_cursor:
             ns_cursor.execute(query)
-            columns = [desc[0] for desc in ns_cursor.description]
-            data = ns_cursor.fetchall()
-        return columns, data
-    except Exception as e:
-        print(table, ":", e)
-        return -1, -1
+            return int(ns_cursor.fetchone()[0])
+
+    return get_governor().run(table, run_query)
+
+
+def should_window(props, since, until):
+    """
+    Check whether a table's watermark range is a catch-up worth splitting into windows.
+
+    Windowing is opt-in with WINDOW_MAX_ROWS, and only ranges longer than
+    WINDOW_MIN_GAP_HOURS (DEFAULT_WINDOW_MIN_GAP_HOURS) are planned.
+
+    Args:
+        props (dict): The phase props.
+        since (str): The table's watermark, or None for a full extract.
+        until (str): The run's watermark.
+
+    Returns:
+        bool: True if the range should be loaded with plan_windows.
+    """
+    if not props.get("WINDOW_MAX_ROWS") or since is None:
+        return False
+    min_gap = pd.Timedelta(hours=props.get("WINDOW_MIN_GAP_HOURS", DEFAULT_WINDOW_MIN_GAP_HOURS))
+    return pd.Timestamp(until) - pd.Timestamp(since) > min_gap
+
+
+def plan_windows(ns_cnxn, table, since, until, max_rows):
+    """
+    Split a catch-up range into consecutive windows of at most max_rows estimated rows.
+
+    Windows are bisected on time until their COUNT(*) fits, so bursts of changes get
+    narrow windows and quiet periods stay wide.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        table (str): The name of the table.
+        since (str): The exclusive lower bound of DATE_LAST_MODIFIED.
+        until (str): The inclusive upper bound of DATE_LAST_MODIFIED.
+        max_rows (int): The target maximum number of rows per window.
+
+    Returns:
+        list: A list of (since, until) string tuples in ascending order.
+    """
+    windows = []
+    pending = [(pd.Timestamp(since), pd.Timestamp(until))]
+
+    while pending:
+        lo, hi = pending.pop()
+        lo_str, hi_str = lo.strftime("%Y-%m-%d %H:%M:%S"), hi.strftime("%Y-%m-%d %H:%M:%S")
+        if hi - lo <= pd.Timedelta(seconds=1):
+            windows.append((lo_str, hi_str))
+            continue
+
+        rows = count_data_ns(ns_cnxn, table, lo_str, hi_str)
+        if rows <= max_rows:
+            if rows > 0:
+                windows.append((lo_str, hi_str))
+            continue
+
+        mid = (lo + (hi - lo) / 2).floor("s")
+        pending.extend([(mid, hi), (lo, mid)])
+
+    # fold empty stretches into the following window so the windows stay contiguous
+    bounds = sorted(hi for _, hi in windows)[:-1]
+    bounds.append(pd.Timestamp(until).strftime("%Y-%m-%d %H:%M:%S"))
+    lo = pd.Timestamp(since).strftime("%Y-%m-%d %H:%M:%S")
+    contiguous = []
+    for hi in bounds:
+        contiguous.append((lo, hi))
+        lo = hi
+    return contiguous
+
+
+def get_control_merge_query(env, ns_table_name, incr_modified_date, control_table):
+    """
+    Build the MERGE that stores a table's last modified date in the control table.
+
+    Args:
+        env (str): The environment of the table.
+        ns_table_name (str): The name of the table in NetSuite.
+        incr_modified_date (str): The incremental modified date to store.
+        control_table (str): The name of the control table.
+
+    Returns:
+        str: The MERGE statement.
+    """
+    return (
+        f"MERGE INTO {control_table} t USING (SELECT '{env}' AS env, '{ns_table_name}' AS table_name, '{incr_modified_date}' AS last_modified_date) s "
+        f"ON (t.ENV = s.env AND t.NETSUITE_TABLE_NAME ILIKE s.table_name) "
+        f"WHEN MATCHED THEN UPDATE SET t.last_modified_date = s.last_modified_date "
+        f"WHEN NOT MATCHED THEN INSERT (ENV, NETSUITE_TABLE_NAME, last_modified_date) "
+        f"VALUES (s.env, s.table_name, s.last_modified_date)"
+    )
 
 
 def update_control_table(
@@ -85,13 +190,7 @@ def update_control_table(
         None
     """
     try:
-        ct_scd_query = (
-            f"MERGE INTO {control_table} t USING (SELECT '{env}' AS env, '{ns_table_name}' AS table_name, '{incr_modified_date}' AS last_modified_date) s "
-            f"ON (t.ENV = s.env AND t.NETSUITE_TABLE_NAME ILIKE s.table_name) "
-            f"WHEN MATCHED THEN UPDATE SET t.last_modified_date = s.last_modified_date "
-            f"WHEN NOT MATCHED THEN INSERT (ENV, NETSUITE_TABLE_NAME, last_modified_date) "
-            f"VALUES (s.env, s.table_name, s.last_modified_date)"
-        )
+        ct_scd_query = get_control_merge_query(env, ns_table_name, incr_modified_date, control_table)
         with sf_cnxn.cursor() as sf_cur:
             sf_cur.execute(ct_scd_query)
 
@@ -121,26 +220,286 @@ def fetch_control_table(sf_cnxn, control_table_name):
     except Exception as e:
         print("Control table error:", e)
 
-def merge_snowflake(sf_cnxn, sf_data, table, landing_db, landing_schema, transient_schema):
-    columns = sf_data.columns
+def get_merge_query(columns, table, landing_db, landing_schema, source_table, PRIMARY_KEY_TABLES, target_predicate=None):
+    """
+    Build the MERGE of a staged batch into its landing table on the table's key columns.
+
+    Args:
+        columns (list): The batch's columns.
+        table (str): The name of the table.
+        landing_db (str): The landing database.
+        landing_schema (str): The landing schema.
+        source_table (str): The table holding the batch, or a parenthesised subquery.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        target_predicate (str, optional): A condition on TGT added to the join, so only
+            the matching part of the landing table is scanned.
 
-    merge_query = (f"""
-            MERGE INTO {landing_db}.{landing_schema}.{table} TGT USING {landing_db}.{transient_schema}.{table} SRC
-            ON TGT.{PRIMARY_KEY_TABLES[table]} = SRC.{PRIMARY_KEY_TABLES[table]}
+    Returns:
+        str: The MERGE statement.
+    """
+    join = [f"TGT.{col} = SRC.{col}" for col in key_columns(PRIMARY_KEY_TABLES[table])]
+    if target_predicate:
+        join.append(f"({target_predicate})")
+    return f"""
+            MERGE INTO {landing_db}.{landing_schema}.{table} TGT USING {source_table} SRC
+            ON {' AND '.join(join)}
             WHEN MATCHED THEN UPDATE SET {', '.join([f'TGT.{col} = SRC.{col}' for col in columns])} 
-            WHEN NOT MATCHED THEN INSERT 
-            VALUES ({', '.join([f'SRC.{col}' for col in columns])});
+            WHEN NOT MATCHED THEN INSERT ({', '.join(columns)})
+            VALUES ({', '.join([f'SRC.{col}' for col in columns])})
             """
-        )
+
+
+def merge_snowflake(sf_cnxn, sf_data, table, landing_db, landing_schema, source_table, PRIMARY_KEY_TABLES):
+    merge_query = get_merge_query(sf_data.columns, table, landing_db, landing_schema, source_table, PRIMARY_KEY_TABLES)
 
     with sf_cnxn.cursor() as sf_cur:
         sf_cur.execute(merge_query)
         print(sf_cur.fetchone(), "values upserted to Landing!")
 
+
+def merge_sharded(sf_cnxn, columns, table, landing_db, landing_schema, source_table, PRIMARY_KEY_TABLES, props):
+    """
+    MERGE a staged batch into landing as primary-key-range shards.
+
+    The batch is split on its first key column into the table's merge_shards ranges of
+    about equal row counts; each shard MERGEs only its range, on both sides of the join.
+    See sharded_merge.run_shards for concurrency, retries and progress.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        columns (list): The batch's columns.
+        table (str): The name of the table.
+        landing_db (str): The landing database.
+        landing_schema (str): The landing schema.
+        source_table (str): The table holding the batch.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): The phase props.
+
+    Returns:
+        None
+    """
+    key = key_columns(PRIMARY_KEY_TABLES[table])[0]
+    bounds = get_shard_bounds(sf_cnxn, source_table, key, get_table_setting(table, "merge_shards"))
+    shards = []
+    for lower, upper in get_shard_ranges(bounds):
+        predicate = get_range_predicate(key, lower, upper)
+        source = f"(SELECT * FROM {source_table} WHERE {predicate})" if predicate else source_table
+        target_predicate = get_range_predicate(f"TGT.{key}", lower, upper)
+        shards.append((get_merge_query(columns, table, landing_db, landing_schema, source, PRIMARY_KEY_TABLES, target_predicate), lower, upper))
+    merged, _ = run_shards(sf_cnxn, table, shards, props)
+    print(f"{table}: {merged} values upserted to Landing in {len(shards)} shard(s)!")
+
+
+def get_post_upload_script(merge_query, control_query, run_table):
+    """
+    Wrap the post-upload steps of a batch in one Snowflake Scripting block.
+
+    The landing MERGE and the control table watermark commit together in one
+    transaction (or roll back together), then the run table is dropped, all in
+    a single round-trip that returns the number of rows merged.
+
+    Args:
+        merge_query (str): The landing MERGE from get_merge_query.
+        control_query (str): The control table MERGE from get_control_merge_query.
+        run_table (str): The run-scoped table holding the batch.
+
+    Returns:
+        str: The EXECUTE IMMEDIATE statement.
+    """
+    return f"""EXECUTE IMMEDIATE $$
+DECLARE
+    merged INTEGER DEFAULT 0;
+BEGIN
+    BEGIN TRANSACTION;
+    {merge_query.strip()};
+    merged := SQLROWCOUNT;
+    {control_query};
+    COMMIT;
+    DROP TABLE IF EXISTS {run_table};
+    RETURN merged;
+EXCEPTION
+    WHEN OTHER THEN
+        ROLLBACK;
+        RAISE;
+END;
+$$"""
+
+
+def load_to_landing(sf_cnxn, table, df, PRIMARY_KEY_TABLES, props, watermark=None):
+    """
+    Stage a transformed batch in a run-scoped table and MERGE it into landing.
+
+    With SCRIPTED_LOAD in props and a watermark, the MERGE, the control table update
+    and the run table cleanup run as one scripted block (see get_post_upload_script)
+    instead of one statement and commit each.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the table.
+        df (DataFrame): The transformed batch.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of properties.
+        watermark (str, optional): The control table watermark to store with the batch.
+
+    Returns:
+        bool: Whether the control table watermark was stored.
+    """
+    sharded = should_shard(table, len(df), props)
+    scripted = bool(props.get("SCRIPTED_LOAD")) and watermark is not None and not sharded
+    tag_session(sf_cnxn, props, table)
+    run_table = create_run_table(sf_cnxn, table, props)
+    print(f"{table}: Run table {run_table} created")
+    done = False
+
+    try:
+        with warehouse_for(sf_cnxn, props, table, "write+merge", len(df), large_only=True):
+            write_pandas(
+                conn=sf_cnxn,
+                df=df,
+                table_name=run_table.split(".")[-1],
+                quote_identifiers=False,
+                database=props["LANDING_DB"],
+                schema=props["TRANSIENT_SCHEMA"],
+            )
+            print(f"{table}: Snowflake Transient table data loaded!")
+            check_lease(props, table)
+
+            if scripted:
+                script = get_post_upload_script(
+                    get_merge_query(
+                        df.columns, table, props["LANDING_DB"], props["LANDING_SCHEMA"], run_table, PRIMARY_KEY_TABLES
+                    ),
+                    get_control_merge_query(props["ENV"], table, watermark, props["CONTROL_TABLE"]),
+                    run_table,
+                )
+                with sf_cnxn.cursor() as sf_cur:
+                    sf_cur.execute(script)
+                    print(sf_cur.fetchone(), "values upserted to Landing!")
+                done = True
+                print(f"{table}: Snowflake Landing table data loaded, control table updated on {watermark}")
+            elif sharded:
+                merge_sharded(
+                    sf_cnxn, df.columns, table, props["LANDING_DB"], props["LANDING_SCHEMA"], run_table, PRIMARY_KEY_TABLES, props
+                )
+                print(f"{table}: Snowflake Landing table data loaded!")
+            else:
+                merge_snowflake(sf_cnxn, sf_data=df, table=table, landing_db=props["LANDING_DB"], landing_schema=props["LANDING_SCHEMA"], source_table=run_table, PRIMARY_KEY_TABLES=PRIMARY_KEY_TABLES)
+                print(f"{table}: Snowflake Landing table data loaded!")
+    finally:
+        if not done:
+            sf_cnxn.commit()
+            drop_run_table(sf_cnxn, run_table)
+    return done
+
+
+def store_watermark(sf_cnxn, table, df, until, PRIMARY_KEY_TABLES, props):
+    """
+    Load a batch into landing and store its watermark in the control table.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the table.
+        df (DataFrame): The transformed batch.
+        until (str): The watermark the batch brings the table up to.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of properties.
+
+    Returns:
+        int: The number of Snowflake statements issued (see conn_util.get_statement_count),
+            or -1 if the control table was not updated.
+    """
+    before = get_statement_count(sf_cnxn)
+    if load_to_landing(sf_cnxn, table, df, PRIMARY_KEY_TABLES, props, until):
+        return get_statement_count(sf_cnxn) - before
+
+    tag_session(sf_cnxn, props, table)
+    ct_res = update_control_table(
+        sf_cnxn,
+        env=props["ENV"],
+        ns_table_name=table,
+        incr_modified_date=until,
+        control_table=props["CONTROL_TABLE"],
+    )
+    sf_cnxn.commit()
+    return -1 if ct_res == -1 else get_statement_count(sf_cnxn) - before
+
+
+def load_window(ns_cnxn, sf_cnxn, table, since, until, bounded, PRIMARY_KEY_TABLES, props):
+    """
+    Extract one watermark window from NetSuite, MERGE it into landing and advance the watermark.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the table.
+        since (str): The exclusive lower bound of DATE_LAST_MODIFIED.
+        until (str): The watermark stored in the control table once the window is loaded.
+        bounded (bool): Whether to filter DATE_LAST_MODIFIED <= until in the extract.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of additional properties.
+
+    Returns:
+        tuple: The number of rows and the in-memory bytes loaded, the Snowflake statements
+            issued and the milliseconds spent on them from upload to watermark, or
+            (-1, -1, -1, -1) if the window was not loaded or the control table not updated.
+    """
+    CACHE_DIR = props.get("CACHE_DIR")
+
+    columns, data = extract_frame(
+        ns_cnxn,
+        table,
+        since,
+        get_table_columns(table, PRIMARY_KEY_TABLES, props),
+        until if bounded else None,
+        batch_rows=get_table_setting(table, "batch_size"),
+    )
+
+    if columns == -1:
+        print(f"Fetching {table} data from NetSuite Failed!!!")
+        return -1, -1, -1, -1
+
+    print(
+        f"\n{table}: Data collected from NetSuite. Uploading to Snowflake.."
+    )
+    df = transform_data(data, columns, table, PRIMARY_KEY_TABLES)
+    # print(df)
+    cache_key = None
+    if CACHE_DIR:
+        cache_key = put_batch(
+            CACHE_DIR,
+            table,
+            since,
+            until,
+            df,
+            props.get("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES),
+        )
+
+    started = time.perf_counter()
+    statements = store_watermark(sf_cnxn, table, df, until, PRIMARY_KEY_TABLES, props)
+    if statements == -1:
+        return -1, -1, -1, -1
+    if cache_key:
+        mark_committed(CACHE_DIR, cache_key)
+    return (
+        len(df),
+        int(df.memory_usage(index=False, deep=True).sum()),
+        statements,
+        round((time.perf_counter() - started) * 1000),
+    )
+
+
 def incremental_load_transient(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
     """
     Load tables from NetSuite to Snowflake incrementally for specific interval.
 
+    When props holds a CACHE_DIR, every extracted batch is also spilled to the local
+    Parquet cache so a failed Snowflake load can be replayed without NetSuite.
+    When props holds WINDOW_MAX_ROWS, catch-up ranges (see should_window) are loaded in
+    consecutive DATE_LAST_MODIFIED windows of about that many rows each.
+    Tables whose catalog strategy is "bulk" are fully reloaded with bulk_load instead.
+    When props holds SCRIPTED_LOAD, each batch's MERGE, watermark and cleanup run as
+    one scripted Snowflake block; every table prints its statement count and time either way.
+
     Args:
         ns_cnxn: The NetSuite database connection.
         sf_cnxn: The Snowflake database connection.
@@ -149,17 +508,27 @@ def incremental_load_transient(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES,
         props (dict): A dictionary of additional properties.
 
     Returns:
-        None
+        dict: A dictionary mapping each fully loaded table to its run statistics
+            (started, seconds, rows, bytes, statements, snowflake_ms).
     """
-    LANDING_DB = props["LANDING_DB"]
-    LANDING_SCHEMA = props["LANDING_SCHEMA"]
     ENV = props["ENV"]
-    TRANSIENT_SCHEMA = "FINANCE_TRANSIENT"
     CONTROL_TABLE = props["CONTROL_TABLE"]
+    WINDOW_MAX_ROWS = props.get("WINDOW_MAX_ROWS")
+    props = dict(props)
+    props.setdefault("TRANSIENT_SCHEMA", "FINANCE_TRANSIENT")
+    props.setdefault("RUN_ID", new_run_id())
 
+    tag_session(sf_cnxn, props)
     control_table_df = fetch_control_table(sf_cnxn, control_table_name=CONTROL_TABLE)
+    stats = {}
 
     for table in KEY_TABLES:
+        if get_table_setting(table, "strategy") == "bulk":
+            stats.update(bulk_load(ns_cnxn, sf_cnxn, [table], PRIMARY_KEY_TABLES, props))
+            continue
+
+        table_stats = new_table_stats()
+        table_stats.update({"statements": 0, "snowflake_ms": 0})
         try:
             ct_last_mod_dt = check_date_last_modified(
                 df=control_table_df, env=ENV, table_name=table
@@ -167,47 +536,111 @@ def incremental_load_transient(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES,
             if ct_last_mod_dt == -1:
                 continue
 
-            columns, data = fetch_data_ns(ns_cnxn, table, ct_last_mod_dt)
+            # taken before the extract so rows modified while it runs are picked up next time
+            run_watermark = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            windowed = should_window(props, ct_last_mod_dt, run_watermark)
+            if windowed:
+                windows = plan_windows(
+                    ns_cnxn, table, ct_last_mod_dt, run_watermark, WINDOW_MAX_ROWS
+                )
+                print(f"{table}: Catch-up split into {len(windows)} window(s)")
+            else:
+                windows = [(ct_last_mod_dt, run_watermark)]
+
+            for since, until in windows:
+                # the watermark advances after every window, so a failed window is resumed next run
+                rows, nbytes, statements, snowflake_ms = load_window(
+                    ns_cnxn,
+                    sf_cnxn,
+                    table,
+                    since,
+                    until,
+                    windowed,
+                    PRIMARY_KEY_TABLES,
+                    props,
+                )
+                if rows == -1:
+                    break
+                table_stats["rows"] += rows
+                table_stats["bytes"] += nbytes
+                table_stats["statements"] += statements
+                table_stats["snowflake_ms"] += snowflake_ms
+            else:
+                stats[table] = finish_table_stats(table_stats)
+                print(
+                    f"{table}: {table_stats['statements']} Snowflake statements, {table_stats['snowflake_ms']} ms "
+                    f"from upload to watermark ({'scripted' if props.get('SCRIPTED_LOAD') else 'per-statement'})"
+                )
 
-            if columns == -1 or data == -1:
-                print(f"Fetching {table} data from NetSuite Failed!!!")
-                continue
+        except Exception as e:
+            print(f"ERROR in {table}: {e}")
+            continue
 
-            print(
-                f"\n{table}: Data collected from NetSuite. Uploading to Snowflake.."
-            )
-            df = transform_data(data, columns, table, PRIMARY_KEY_TABLES)
-            # print(df)
-            with sf_cnxn.cursor() as sf_cur:
-                sf_cur.execute(
-                    f"TRUNCATE TABLE {LANDING_DB}.{TRANSIENT_SCHEMA}.{table}"
-                )
-            print(f"{table}: Transient table truncated")
+    return stats
 
-            write_pandas(
-                conn=sf_cnxn,
-                df=df,
-                table_name=table,
-                quote_identifiers=False,
-                database=LANDING_DB,
-                schema=TRANSIENT_SCHEMA,
-            )
-            print(f"{table}: Snowflake Transient table data loaded!")
 
-            merge_snowflake(sf_cnxn, sf_data=df, table=table, landing_db=LANDING_DB, landing_schema=LANDING_SCHEMA, transient_schema=TRANSIENT_SCHEMA)
-            print(f"{table}: Snowflake Landing table data loaded!")
+def replay_cached_batches(sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
+    """
+    Load uncommitted batches from the local Parquet cache into Snowflake without querying NetSuite.
 
-            update_control_table(
-                sf_cnxn,
-                env=ENV,
-                ns_table_name=table,
-                incr_modified_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                # source_df['DATE_LAST_MODIFIED'].values.max())
-                control_table=props["CONTROL_TABLE"],
-            )
+    Batches are replayed oldest first and advance the control table watermark one by one.
+    Batches already covered by the current watermark are skipped. Replay stops at the
+    first batch starting after the watermark, or at the first failure, so the watermark
+    never jumps over a range that is not in the cache.
 
-        except Exception as e:
-            print(f"ERROR in {table}: {e}")
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        KEY_TABLES (list): A list of table names to replay.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of additional properties, including CACHE_DIR.
+
+    Returns:
+        None
+    """
+    ENV = props["ENV"]
+    CONTROL_TABLE = props["CONTROL_TABLE"]
+    CACHE_DIR = props["CACHE_DIR"]
+    props = dict(props)
+    props.setdefault("TRANSIENT_SCHEMA", "FINANCE_TRANSIENT")
+    props.setdefault("RUN_ID", new_run_id())
+
+    tag_session(sf_cnxn, props)
+    control_table_df = fetch_control_table(sf_cnxn, control_table_name=CONTROL_TABLE)
+
+    for table in KEY_TABLES:
+        pending = get_pending_batches(CACHE_DIR, table)
+        if not pending:
+            print(f"{table}: No cached batches to replay")
             continue
-        finally:
-            sf_cnxn.commit()
+
+        ct_last_mod_dt = check_date_last_modified(
+            df=control_table_df, env=ENV, table_name=table
+        )
+        if ct_last_mod_dt == -1:
+            continue
+        watermark = pd.Timestamp(ct_last_mod_dt)
+
+        for key, entry in pending:
+            try:
+                if pd.Timestamp(entry["until"]) <= watermark:
+                    print(f"{table}: Cached batch up to {entry['until']} already loaded, skipping")
+                    mark_committed(CACHE_DIR, key)
+                    continue
+
+                if pd.Timestamp(entry["since"]) > watermark:
+                    print(
+                        f"{table}: Cached batch {entry['since']} - {entry['until']} starts after the watermark "
+                        f"{watermark}, stopping replay; the next incremental run extracts the gap"
+                    )
+                    break
+
+                df = load_batch(CACHE_DIR, key)
+                print(f"\n{table}: Replaying cached batch {entry['since']} - {entry['until']}")
+                if store_watermark(sf_cnxn, table, df, entry["until"], PRIMARY_KEY_TABLES, props) == -1:
+                    break
+                mark_committed(CACHE_DIR, key)
+                watermark = pd.Timestamp(entry["until"])
+            except Exception as e:
+                # keep the remaining batches so the watermark never skips a gap
+                print(f"ERROR replaying {table}: {e}")
+                break
@@ -1,6 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 import snowflake.connector as sc
 import pandas as pd
+from accounts import ensure_account_column, ensure_account_views, get_account_schema_props, get_account_value
+from conn_util import SnowflakeSessionPool
+from run_stats import finish_table_stats, new_table_stats
+from query_tags import tag_session
+from warehouse_policy import warehouse_for
 
 
 def get_control_table(sf_conn, CONTROL_TABLE):
@@ -24,8 +31,7 @@ def get_control_table(sf_conn, CONTROL_TABLE):
 
 def update_control_table(
     sf_conn,
-    table,
-    last_mod_ts,
+    updates,
     ct_data,
     SRC_VIEW_TABLE,
     CONTROL_TABLE,
@@ -33,14 +39,15 @@ def update_control_table(
     STAGING_SCHEMA,
     LANDING_DB,
     LANDING_SCHEMA,
+    match_schema=False,
 ):
     """
-    Update the control table in Snowflake with the latest run information.
+    Update the control table in Snowflake with the latest run information of several tables at once.
 
     Args:
         sf_conn: The Snowflake database connection.
-        table (tuple): The table metadata (name, target database, target schema).
-        last_mod_ts (str): The last modified timestamp for the table.
+        updates (list): (table, run timestamp) tuples, where table is the table metadata
+            (source view, target table) and the timestamp is when it was loaded.
         ct_data (DataFrame): The data from the control table.
         SRC_VIEW_TABLE (dict): A dictionary mapping source table names to their corresponding view names.
         CONTROL_TABLE (str): The name of the control table.
@@ -48,24 +55,37 @@ def update_control_table(
         STAGING_SCHEMA (str): The name of the staging schema.
         LANDING_DB (str): The name of the landing database.
         LANDING_SCHEMA (str): The name of the landing schema.
+        match_schema (bool): Whether rows are also matched on SRC_SCHEMA, so every
+            account's landing schema keeps its own run timestamp per staging table.
 
     Returns:
         None
 
     """
+    next_row_num = ct_data["ROW_NUM"].values.max() + 1
+    source_rows = " UNION ALL ".join(
+        [
+            f"SELECT {next_row_num + i} AS ROW_NUM, '{LANDING_SCHEMA}' AS SRC_SCHEMA, "
+            f"'{SRC_VIEW_TABLE[table[0]]}' AS SRC_TABLE, '{table[0]}' AS SRC_VIEW, "
+            f"'{STAGING_DB}' AS TGT_DB, '{STAGING_SCHEMA}' AS TGT_SCHEMA, '{table[1]}' AS TGT_TABLE, '{run_ts}' AS LAST_RUN_DATE_TIME"
+            for i, (table, run_ts) in enumerate(updates)
+        ]
+    )
     ct_scd_query = (
-        f"MERGE INTO {CONTROL_TABLE} t USING (SELECT '{STAGING_DB}' AS TGT_DB, '{STAGING_SCHEMA}' AS TGT_SCHEMA, '{table[1]}' AS TGT_TABLE, '{last_mod_ts}' AS LAST_RUN_DATE_TIME) s "
-        f"ON (t.TGT_DB = s.TGT_DB AND t.TGT_SCHEMA = s.TGT_SCHEMA AND t.TGT_TABLE = s.TGT_TABLE) "
-        f"WHEN MATCHED THEN UPDATE SET t.LAST_RUN_DATE_TIME = '{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}' "
+        f"MERGE INTO {CONTROL_TABLE} t USING ({source_rows}) s "
+        f"ON (t.TGT_DB = s.TGT_DB AND t.TGT_SCHEMA = s.TGT_SCHEMA AND t.TGT_TABLE = s.TGT_TABLE"
+        + (" AND t.SRC_SCHEMA = s.SRC_SCHEMA) " if match_schema else ") ")
+        + 
+        f"WHEN MATCHED THEN UPDATE SET t.LAST_RUN_DATE_TIME = s.LAST_RUN_DATE_TIME "
         f"WHEN NOT MATCHED THEN INSERT (ROW_NUM, SRC_DB, SRC_SCHEMA, SRC_TABLE, SRC_VIEW, TGT_DB, TGT_SCHEMA, TGT_TABLE, LAST_RUN_DATE_TIME) "
-        f"VALUES ({ct_data['ROW_NUM'].values.max() + 1}, '{LANDING_DB}', '{LANDING_SCHEMA}', '{SRC_VIEW_TABLE[table[0]]}', '{table[0]}', s.TGT_DB, s.TGT_SCHEMA, s.TGT_TABLE, '{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}')"
+        f"VALUES (s.ROW_NUM, '{LANDING_DB}', s.SRC_SCHEMA, s.SRC_TABLE, s.SRC_VIEW, s.TGT_DB, s.TGT_SCHEMA, s.TGT_TABLE, s.LAST_RUN_DATE_TIME)"
     )
 
     with sf_conn.cursor() as sf_cur:
         sf_cur.execute(ct_scd_query)
         sf_cur.close()
 
-    print(f"{CONTROL_TABLE.split('.')[-1]} updated for {table[1]}")
+    print(f"{CONTROL_TABLE.split('.')[-1]} updated for {', '.join(table[1] for table, _ in updates)}")
 
 
 def check_new_records(sf_conn, table, last_mod_ts, LANDING_DB, LANDING_SCHEMA):
@@ -93,11 +113,14 @@ def check_new_records(sf_conn, table, last_mod_ts, LANDING_DB, LANDING_SCHEMA):
 
 
 def insert_to_snowflake(
-    sf_conn, table, last_mod_ts, STAGING_DB, STAGING_SCHEMA, LANDING_DB, LANDING_SCHEMA
+    sf_conn, table, last_mod_ts, STAGING_DB, STAGING_SCHEMA, LANDING_DB, LANDING_SCHEMA, props=None, tag_table=None
 ):
     """
     Truncate the staging table and insert new records from the landing table to Snowflake.
 
+    With APPEND in props the staging table was truncated before the run (see
+    landing_to_staging_accounts) and the records are appended to it.
+
     Args:
         sf_conn: The Snowflake database connection.
         table (tuple): The table metadata (name, target database, target schema).
@@ -106,34 +129,262 @@ def insert_to_snowflake(
         STAGING_SCHEMA (str): The name of the staging schema.
         LANDING_DB (str): The name of the landing database.
         LANDING_SCHEMA (str): The name of the landing schema.
+        props (dict, optional): The phase props, to tag the truncate and insert statements.
+        tag_table (str, optional): The table name used in the query tags.
 
     Returns:
         None
 
     """
+    props = props or {}
+    if props:
+        tag_session(sf_conn, props, tag_table)
     sf_cur = sf_conn.cursor()
-    # Truncate Staging table before Insert
-    truncate_query = f"""TRUNCATE TABLE {STAGING_DB}.{STAGING_SCHEMA}.{table[1]}"""
-    sf_cur.execute(truncate_query)
+    if not props.get("APPEND"):
+        # Truncate Staging table before Insert
+        truncate_query = f"""TRUNCATE TABLE {STAGING_DB}.{STAGING_SCHEMA}.{table[1]}"""
+        sf_cur.execute(truncate_query)
 
     # Insert data into tables
     insert_query = f"""
-    INSERT INTO {STAGING_DB}.{STAGING_SCHEMA}.{table[1]} (SELECT * FROM {LANDING_DB}.{LANDING_SCHEMA}.{table[0]} lv WHERE lv.INSERT_DT > '{last_mod_ts}')
+    INSERT INTO {STAGING_DB}.{STAGING_SCHEMA}.{table[1]} (SELECT lv.*{get_account_value(props)} FROM {LANDING_DB}.{LANDING_SCHEMA}.{table[0]} lv WHERE lv.INSERT_DT > '{last_mod_ts}')
     """
     sf_cur.execute(insert_query)
     print(f"\n{table[1]} truncated and loaded...")
 
 
-def landing_to_staging(sf_conn, props):
+def get_stream_name(table, props):
+    """
+    Build the fully qualified name of the stream phase 2 consumes for a control-table row.
+
+    Args:
+        table (tuple): The table metadata (source view, target table).
+        props (dict): The phase props holding LANDING_DB and LANDING_SCHEMA.
+
+    Returns:
+        str: The stream name.
+    """
+    return f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table[0]}_STG_STREAM"
+
+
+def get_stream_states(sf_conn, props):
+    """
+    List the streams in the landing schema and whether they are stale.
+
+    Args:
+        sf_conn: The Snowflake database connection.
+        props (dict): The phase props holding LANDING_DB and LANDING_SCHEMA.
+
+    Returns:
+        dict: A dictionary mapping fully qualified stream names to True if stale.
+    """
+    with sf_conn.cursor() as sf_cur:
+        sf_cur.execute(f"SHOW STREAMS IN SCHEMA {props['LANDING_DB']}.{props['LANDING_SCHEMA']}")
+        columns = [col[0].lower() for col in sf_cur.description]
+        rows = sf_cur.fetchall()
+    return {
+        f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{row[columns.index('name')]}".upper(): str(
+            row[columns.index("stale")]
+        ).lower() == "true"
+        for row in rows
+    }
+
+
+def ensure_stream(sf_conn, table, src_table, props, streams):
+    """
+    Create the stream on a landing object if it is missing, or recreate it if stale.
+
+    The stream is on the object phase 2 reads: the landing table itself, or the
+    landing view when SRC_VIEW differs from SRC_TABLE.
+
+    Args:
+        sf_conn: The Snowflake database connection.
+        table (tuple): The table metadata (source view, target table).
+        src_table (str): The landing table name.
+        props (dict): The phase props.
+        streams (dict): The stream states from get_stream_states.
+
+    Returns:
+        bool: True if the stream already held this table's changes, False if it was
+            just (re)created and starts tracking from now.
+    """
+    stream = get_stream_name(table, props)
+    stale = streams.get(stream.upper())
+    if stale is False:
+        return True
+
+    source = f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table[0]}"
+    kind = "TABLE" if str(table[0]).upper() == src_table else "VIEW"
+    tag_session(sf_conn, props, src_table)
+    with sf_conn.cursor() as sf_cur:
+        sf_cur.execute(f"CREATE OR REPLACE STREAM {stream} ON {kind} {source}")
+    print(f"{src_table}: Stream {stream} {'recreated, it was stale' if stale else 'created'}")
+    return False
+
+
+def stream_has_data(sf_conn, stream):
+    """
+    Check whether a stream holds unconsumed changes, without scanning them.
+
+    Args:
+        sf_conn: The Snowflake database connection.
+        stream (str): The fully qualified stream name.
+
+    Returns:
+        bool: True if the stream has change rows.
+    """
+    with sf_conn.cursor() as sf_cur:
+        sf_cur.execute(f"SELECT SYSTEM$STREAM_HAS_DATA('{stream}')")
+        return bool(sf_cur.fetchone()[0])
+
+
+def insert_stream_changes(sf_conn, table, stream, props, tag_table):
+    """
+    Reload a staging table with the new row images in a stream, consuming the stream.
+
+    The truncate and insert commit together, and the stream's offset only advances
+    with that commit, so the offset is the table's watermark. With APPEND in props
+    the staging table was truncated before the run and the rows are appended.
+
+    Args:
+        sf_conn: The Snowflake database connection.
+        table (tuple): The table metadata (source view, target table).
+        stream (str): The fully qualified stream name.
+        props (dict): The phase props.
+        tag_table (str): The table name used in the query tags.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    staging_table = f"{props['STAGING_DB']}.{props['STAGING_SCHEMA']}.{table[1]}"
+    tag_session(sf_conn, props, tag_table)
+    with sf_conn.cursor() as sf_cur:
+        sf_cur.execute("BEGIN TRANSACTION")
+        try:
+            if not props.get("APPEND"):
+                sf_cur.execute(f"TRUNCATE TABLE {staging_table}")
+            # updates arrive as DELETE + INSERT pairs, the INSERT carrying the new image
+            sf_cur.execute(
+                f"INSERT INTO {staging_table} SELECT * EXCLUDE (METADATA$ACTION, METADATA$ISUPDATE, METADATA$ROW_ID)"
+                f"{get_account_value(props)} FROM {stream} WHERE METADATA$ACTION = 'INSERT'"
+            )
+            inserted = sf_cur.rowcount
+            sf_cur.execute("COMMIT")
+        except Exception:
+            sf_cur.execute("ROLLBACK")
+            raise
+    print(f"\n{table[1]} truncated and loaded from {stream}...")
+    return inserted
+
+
+def get_schema_control_rows(ct_data, props):
+    """
+    Select the control table rows of the landing schema being loaded.
+
+    The shared landing schema uses the control table as is. An account's landing schema
+    (see accounts.get_account_schema_props) uses its own rows, by SRC_SCHEMA; staging
+    tables it has no row for yet are taken from the other rows with the run timestamp
+    reset, so their first load takes every landing row of the account.
+
+    Args:
+        ct_data (DataFrame): The data from the control table.
+        props (dict): The phase props.
+
+    Returns:
+        DataFrame: The control table rows to load.
+    """
+    if "BASE_LANDING_SCHEMA" not in props:
+        return ct_data
+    in_schema = ct_data["SRC_SCHEMA"].astype(str).str.upper() == props["LANDING_SCHEMA"]
+    rows = ct_data[in_schema]
+    new_rows = (
+        ct_data[~in_schema & ~ct_data["TGT_TABLE"].isin(rows["TGT_TABLE"])]
+        .drop_duplicates(["SRC_VIEW", "TGT_TABLE"])
+        .assign(SRC_SCHEMA=props["LANDING_SCHEMA"], LAST_RUN_DATE_TIME=pd.Timestamp("1900-01-01"))
+    )
+    return pd.concat([rows, new_rows], ignore_index=True)
+
+
+def load_staging_table(sf_conn, table, last_modified_dt, src_table, props, streams=None):
+    """
+    Reload one staging table with the landing rows inserted since its last run.
+
+    With stream states (CHANGE_CAPTURE "stream"), the rows come from the table's stream
+    instead of an INSERT_DT scan of the landing table. A stream that was just created
+    or recreated has no history yet, so that run still uses the INSERT_DT scan.
+
+    Args:
+        sf_conn: The Snowflake session to run on.
+        table (tuple): The table metadata (source view, target table).
+        last_modified_dt (str): The table's last run timestamp from the control table.
+        src_table (str): The landing table name, for tags and statistics.
+        props (dict): The phase props.
+        streams (dict, optional): The stream states from get_stream_states.
+
+    Returns:
+        tuple: The number of new records and the run timestamp to store in the
+            control table, or None if there was nothing to load.
+    """
+    LANDING_DB = props["LANDING_DB"]
+    LANDING_SCHEMA = props["LANDING_SCHEMA"]
+
+    tag_session(sf_conn, props, src_table)
+    if streams is not None and ensure_stream(sf_conn, table, src_table, props, streams):
+        stream = get_stream_name(table, props)
+        if not stream_has_data(sf_conn, stream):
+            print(f"No new records for {table[1]} in {stream}\n")
+            return 0, None
+        num_records = insert_stream_changes(sf_conn, table, stream, props, src_table)
+        return num_records, datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    num_records = check_new_records(
+        sf_conn, table, last_modified_dt, LANDING_DB, LANDING_SCHEMA
+    )
+    if num_records == 0:
+        print(
+            f"No new records for {table[1]} in {LANDING_DB}.{LANDING_SCHEMA}\n"
+        )
+        return num_records, None
+
+    with warehouse_for(sf_conn, props, src_table, "insert", num_records, large_only=True):
+        insert_to_snowflake(
+            sf_conn,
+            table,
+            last_modified_dt,
+            props["STAGING_DB"],
+            props["STAGING_SCHEMA"],
+            LANDING_DB,
+            LANDING_SCHEMA,
+            props,
+            src_table,
+        )
+    sf_conn.commit()
+    return num_records, datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def landing_to_staging(sf_conn, props, connect=None):
     """
     Perform the landing-to-staging process for the specified tables.
 
+    The tables are independent, so with a connect callable they are loaded concurrently
+    on a pool of up to CONCURRENCY Snowflake sessions (a props value, default 1). A failing
+    table does not stop the others. The control table is updated once at the end, for
+    every table that was loaded; staging reloads are truncate-and-insert, so tables whose
+    update is lost are simply reloaded next run.
+
+    With CHANGE_CAPTURE "stream" in props, each table's changes are read from a Snowflake
+    STREAM on its landing object (see load_staging_table), so the cost follows the
+    number of changes rather than the table size.
+
     Args:
         sf_conn: The Snowflake database connection.
         props (dict): A dictionary containing the properties/configuration for the landing-to-staging process.
+            An optional TABLES list limits the run to control-table rows with those SRC_TABLEs.
+        connect (callable, optional): Opens a further Snowflake session for the pool.
 
     Returns:
-        None
+        dict: A dictionary mapping each processed SRC_TABLE to its run statistics
+            (started, seconds, rows).
 
     """
     CONTROL_TABLE = props["CONTROL_TABLE"]
@@ -141,12 +392,27 @@ def landing_to_staging(sf_conn, props):
     LANDING_SCHEMA = props["LANDING_SCHEMA"]
     STAGING_DB = props["STAGING_DB"]
     STAGING_SCHEMA = props["STAGING_SCHEMA"]
+    CONCURRENCY = int(props.get("CONCURRENCY", 1)) if connect else 1
+    USE_STREAMS = props.get("CHANGE_CAPTURE") == "stream"
 
-    ct_data = get_control_table(sf_conn, CONTROL_TABLE)
+    tag_session(sf_conn, props)
+    ct_all = get_control_table(sf_conn, CONTROL_TABLE)
+    ct_data = get_schema_control_rows(ct_all, props)
+    if props.get("TABLES"):
+        ct_data = ct_data[ct_data["SRC_TABLE"].str.upper().isin(props["TABLES"])]
     SRC_VIEW_TABLE = dict(zip(ct_data.SRC_VIEW.values, ct_data.SRC_TABLE.values))
     KEY_TABLES = list(zip(ct_data.SRC_VIEW.values, ct_data.TGT_TABLE.values))
+    ensure_account_views(sf_conn, list(SRC_VIEW_TABLE), props)
+    if props.get("ACCOUNT"):
+        ensure_account_column(sf_conn, [f"{STAGING_DB}.{STAGING_SCHEMA}.{table[1]}" for table in KEY_TABLES])
+    streams = get_stream_states(sf_conn, props) if USE_STREAMS else None
+    stats = {}
+    updates = []
+    failed = []
 
-    for table in KEY_TABLES:
+    def run_table(table):
+        table_stats = new_table_stats()
+        src_table = str(SRC_VIEW_TABLE[table[0]]).upper()
         last_modified_dt = pd.to_datetime(
             str(
                 ct_data[
@@ -158,41 +424,114 @@ def landing_to_staging(sf_conn, props):
         last_modified_dt = last_modified_dt.strftime("%Y-%m-%d %H:%M:%S")
 
         try:
-            num_records = check_new_records(
-                sf_conn, table, last_modified_dt, LANDING_DB, LANDING_SCHEMA
-            )
-            if num_records > 0:
-                insert_to_snowflake(
-                    sf_conn,
-                    table,
-                    last_modified_dt,
-                    STAGING_DB,
-                    STAGING_SCHEMA,
-                    LANDING_DB,
-                    LANDING_SCHEMA,
-                )
-                update_control_table(
-                    sf_conn,
-                    table,
-                    last_modified_dt,
-                    ct_data,
-                    SRC_VIEW_TABLE,
-                    CONTROL_TABLE,
-                    STAGING_DB,
-                    STAGING_SCHEMA,
-                    LANDING_DB,
-                    LANDING_SCHEMA,
-                )
-                sf_conn.commit()
-            else:
-                print(
-                    f"No new records for {table[1]} in {LANDING_DB}.{LANDING_SCHEMA}\n"
+            with (pool.session() if pool else nullcontext(sf_conn)) as session:
+                num_records, run_ts = load_staging_table(
+                    session, table, last_modified_dt, src_table, props, streams
                 )
+            if run_ts:
+                updates.append((table, run_ts))
+            table_stats["rows"] = num_records
+            table_stats["bytes"] = None
+            stats[src_table] = finish_table_stats(table_stats)
         except KeyError as ke:
             print(
                 f"\nError with {table[0]}: Check if user has access privilege and/or object exists!"
             )
-            continue
+            failed.append(src_table)
         except sc.errors.ProgrammingError as pe:
             print(pe)
-            continue
+            failed.append(src_table)
+        except Exception as e:
+            print(f"ERROR in {src_table}: {e}")
+            failed.append(src_table)
+
+    pool = SnowflakeSessionPool(sf_conn, connect, CONCURRENCY) if CONCURRENCY > 1 else None
+    try:
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+            list(executor.map(run_table, KEY_TABLES))
+    finally:
+        if pool:
+            pool.close()
+
+    if updates:
+        try:
+            tag_session(sf_conn, props)
+            update_control_table(
+                sf_conn,
+                updates,
+                ct_all,
+                SRC_VIEW_TABLE,
+                CONTROL_TABLE,
+                STAGING_DB,
+                STAGING_SCHEMA,
+                LANDING_DB,
+                LANDING_SCHEMA,
+                "BASE_LANDING_SCHEMA" in props,
+            )
+            sf_conn.commit()
+        except Exception as e:
+            print(f"{CONTROL_TABLE} not updated, {len(updates)} table(s) will be reloaded next run: {e}")
+
+    print(
+        f"{len(KEY_TABLES) - len(failed)} of {len(KEY_TABLES)} staging table(s) processed"
+        + (f", failed: {', '.join(failed)}" if failed else "")
+    )
+    return stats
+
+
+def truncate_staging_tables(sf_conn, props):
+    """
+    Truncate the staging tables of a run's control table rows.
+
+    Args:
+        sf_conn: The Snowflake database connection.
+        props (dict): The phase props; an optional TABLES list limits the truncation.
+
+    Returns:
+        list: The truncated staging tables.
+    """
+    tag_session(sf_conn, props)
+    ct_data = get_control_table(sf_conn, props["CONTROL_TABLE"])
+    if props.get("TABLES"):
+        ct_data = ct_data[ct_data["SRC_TABLE"].str.upper().isin(props["TABLES"])]
+    staging_tables = sorted(
+        {f"{props['STAGING_DB']}.{props['STAGING_SCHEMA']}.{table}" for table in ct_data.TGT_TABLE.values}
+    )
+    with sf_conn.cursor() as sf_cur:
+        for staging_table in staging_tables:
+            sf_cur.execute(f"TRUNCATE TABLE {staging_table}")
+    print(f"{len(staging_tables)} staging table(s) truncated for the accounts' loads")
+    return staging_tables
+
+
+def landing_to_staging_accounts(sf_conn, props, accounts, connect=None):
+    """
+    Run landing_to_staging for every NetSuite account's landing schema.
+
+    Every account lands in its own schema (see accounts.get_account_schema_props) and
+    all of them load the same staging tables, so phase 3 covers every account. Named
+    accounts' rows carry their account in accounts.ACCOUNT_COLUMN. With several
+    accounts the staging tables are truncated once up front and every account's
+    records are appended, instead of each load truncating the others' rows away.
+
+    Args:
+        sf_conn: The Snowflake database connection.
+        props (dict): The phase props.
+        accounts (list): The (name, section) tuples from accounts.get_accounts.
+        connect (callable, optional): Opens a further Snowflake session for the pool.
+
+    Returns:
+        dict: A dictionary mapping each processed SRC_TABLE, prefixed with "ACCOUNT." for
+            named accounts, to its run statistics.
+    """
+    stats = {}
+    if len(accounts) > 1:
+        truncate_staging_tables(sf_conn, props)
+        props = {**props, "APPEND": True}
+    for account, netsuite in accounts:
+        account_props = get_account_schema_props(props, account, netsuite)
+        if account is not None:
+            print(f"\n{account}: Landing schema {account_props['LANDING_SCHEMA']} to Staging")
+        for table, table_stats in landing_to_staging(sf_conn, account_props, connect).items():
+            stats[f"{account}.{table}" if account else table] = table_stats
+    return stats
@@ -1,3 +1,9 @@
+from catalog import get_table_setting, key_columns
+from column_projection import get_table_columns
+from conn_util import execute_async_statements, print_statement_summary
+from ns_governor import get_governor
+
+
 def ns_query(table, ns_cnxn):
     """
     Execute a query to fetch column information for a table in NetSuite.
@@ -11,22 +17,30 @@ def ns_query(table, ns_cnxn):
     """
     query = f"select table_name,column_name,type_name,oa_length,oa_precision,oa_scale from oa_columns where table_name='{table}'"
     # print(query)
-    with ns_cnxn.cursor() as ns_cursor:
-        ns_cursor.execute(query)
-        data = ns_cursor.fetchall()
-    return data
 
+    def run_query():
+        with ns_cnxn.cursor() as ns_cursor:
+            ns_cursor.execute(query)
+            return ns_cursor.fetchall()
 
-def get_ddl_query(rows, LANDING_DB, LANDING_SCHEMA, PRIMARY_KEY_TABLES, SF_DATATYPES):
+    return get_governor().run(table, run_query)
+
+
+def get_ddl_query(rows, LANDING_DB, LANDING_SCHEMA, PRIMARY_KEY_TABLES, SF_DATATYPES, columns=None, cluster_by=None):
     """
     Generate a SQL statement for creating or replacing a table in Snowflake.
 
+    The PRIMARY KEY is informational only in Snowflake; pruning on the watermark
+    predicates comes from the optional clustering key.
+
     Args:
         rows (list): The fetched column information for a table.
         LANDING_DB (str): The name of the Snowflake landing database.
         LANDING_SCHEMA (str): The name of the Snowflake landing schema.
         PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
         SF_DATATYPES (dict): A dictionary mapping data types.
+        columns (list, optional): The column allowlist for the table. Defaults to every column.
+        cluster_by (list, optional): The clustering key columns or expressions.
 
     Returns:
         str: The SQL statement for creating or replacing a table in Snowflake.
@@ -36,6 +50,8 @@ def get_ddl_query(rows, LANDING_DB, LANDING_SCHEMA, PRIMARY_KEY_TABLES, SF_DATAT
         """
     sql_statement = ""
     for row in rows:
+        if columns and row[1].upper() not in columns:
+            continue
         # matching datatypes with length and precision
         dtype = f"{SF_DATATYPES[row[2]]}"
         if dtype == "NUMBER":
@@ -48,9 +64,30 @@ def get_ddl_query(rows, LANDING_DB, LANDING_SCHEMA, PRIMARY_KEY_TABLES, SF_DATAT
             dtype += f"({row[4]})"
         sql_statement += f"{row[1]} {dtype},\n"
     sql_statement = (
-        header + sql_statement + f"PRIMARY KEY ({PRIMARY_KEY_TABLES[tableName]})" + ");"
+        header + sql_statement + f"PRIMARY KEY ({', '.join(key_columns(PRIMARY_KEY_TABLES[tableName]))})" + ")"
+    )
+    if cluster_by:
+        sql_statement += f"\nCLUSTER BY ({', '.join(cluster_by)})"
+    return sql_statement + ";"
+
+
+def get_search_optimization_query(table, LANDING_DB, LANDING_SCHEMA, PRIMARY_KEY_TABLES):
+    """
+    Generate the statement adding search optimization for equality lookups on a table's key.
+
+    Args:
+        table (str): The name of the table.
+        LANDING_DB (str): The name of the Snowflake landing database.
+        LANDING_SCHEMA (str): The name of the Snowflake landing schema.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+
+    Returns:
+        str: The ALTER TABLE statement.
+    """
+    return (
+        f"ALTER TABLE {LANDING_DB}.{LANDING_SCHEMA}.{table} ADD SEARCH OPTIMIZATION "
+        f"ON EQUALITY({', '.join(key_columns(PRIMARY_KEY_TABLES[table]))})"
     )
-    return sql_statement
 
 
 def sf_query(sf_cnxn, query):
@@ -79,6 +116,12 @@ def load_tables(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, SF_DATATYPES,
     """
     Load tables from NetSuite to Snowflake.
 
+    The column metadata is read from NetSuite table by table, then every CREATE OR REPLACE
+    TABLE is submitted asynchronously, at most DDL_CONCURRENCY (a props value, default 8)
+    at a time, followed by the search optimization of the tables that were created.
+    Tables get the clustering key and search optimization set in the catalog. Failures
+    are collected and printed in one summary.
+
     Args:
         ns_cnxn: The NetSuite database connection.
         sf_cnxn: The Snowflake database connection.
@@ -88,27 +131,50 @@ def load_tables(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, SF_DATATYPES,
         props (dict): A dictionary of additional properties.
 
     Returns:
-        None
+        dict: A dictionary mapping the names of failed tables to their error messages.
     """
     LANDING_DB = props["LANDING_DB"]
     LANDING_SCHEMA = props["LANDING_SCHEMA"]
+    DDL_CONCURRENCY = int(props.get("DDL_CONCURRENCY", 8))
 
+    statements, failures = [], {}
     for table in KEY_TABLES:
-        ns_query_res = ns_query(table, ns_cnxn)
-        if ns_query_res:
+        try:
+            ns_query_res = ns_query(table, ns_cnxn)
+        except Exception as e:
+            failures[table] = f"NetSuite: {e}"
+            continue
+        if not ns_query_res:
+            failures[table] = "NetSuite: no columns in oa_columns"
+            continue
+        try:
             query = get_ddl_query(
                 ns_query_res,
                 LANDING_DB,
                 LANDING_SCHEMA,
                 PRIMARY_KEY_TABLES,
                 SF_DATATYPES,
+                get_table_columns(table, PRIMARY_KEY_TABLES, props),
+                get_table_setting(table, "cluster_by"),
             )
-            sf_query_res = sf_query(sf_cnxn, query)
-            if sf_query_res != -1:
-                print(sf_query_res)
-            else:
-                print("Snowflake: Table creation failed")
-        else:
-            print(f"NetSuite: Table - {table} fetching failed")
+        except Exception as e:
+            failures[table] = str(e)
+            continue
+        statements.append((table, query))
+
+    created, ddl_failures = execute_async_statements(sf_cnxn, statements, DDL_CONCURRENCY)
+    failures.update(ddl_failures)
+    _, search_failures = execute_async_statements(
+        sf_cnxn,
+        [
+            (table, get_search_optimization_query(table, LANDING_DB, LANDING_SCHEMA, PRIMARY_KEY_TABLES))
+            for table in created
+            if get_table_setting(table, "search_optimization")
+        ],
+        DDL_CONCURRENCY,
+    )
+    failures.update({table: f"search optimization: {error}" for table, error in search_failures.items()})
 
     sf_cnxn.commit()
+    print_statement_summary("Created", created, failures)
+    return failures
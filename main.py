@@ -1,116 +1,571 @@
 from configparser import ConfigParser
-from conn_util import get_sf_connection, get_ns_connection
 from tables import *
-from load_tables import load_tables
-from bulk_load import bulk_load
-from incremental_load import incremental_load
-from landing_to_staging import landing_to_staging
-from staging_to_datamart import staging_to_datamart
-from incremental_load_transient import incremental_load_transient
+from contextlib import ExitStack
 import argparse
+import os
+import time
 
-parser = argparse.ArgumentParser(
-    description="Parser for Infofiscus-Python",
-    formatter_class=argparse.RawTextHelpFormatter,
-)
-
-parser.add_argument(
-    "phase",
-    type=int,
-    choices=range(0, 4),
-    
-    help="""Phase # of the operation:
-	0: NetSuite to Landing - Create tables + Bulk Load
-	1: NetSuite to Landing - Incremental Load
-	2: Landing to Staging
-	3: Staging to Datamart
-""",
-)
-args = parser.parse_args()
-phase_config = vars(args)
-PHASE_ID = phase_config["phase"]
+# Phase modules, pandas and the database drivers are imported inside the phase handlers,
+# so e.g. "main.py 3" never loads pyodbc or pandas and never logs in to NetSuite.
 
-if __name__ == "__main__":
-    config = ConfigParser()
-    config.read("properties/conn_props.ini")
-    ns_config = config["netsuite"]
-    sf_config = config["snowflake"]
+PHASE_ALIASES = {
+    "0": ["bulk"],
+    "1": ["incremental"],
+    "2": ["staging"],
+    "3": ["datamart"],
+}
+PHASE_HELP = {
+    "0": "NetSuite to Landing - Create tables + Bulk Load",
+    "1": "NetSuite to Landing - Incremental Load",
+    "2": "Landing to Staging",
+    "3": "Staging to Datamart",
+}
 
-    ns_cnxn = get_ns_connection(ns_config)
-    sf_cnxn = get_sf_connection(sf_config)
 
-    # PHASE_ID = 0 -> NetSutie to Snowflake Landing (Bulk)
-    # PHASE_ID = 1 -> NetSuite to Snowflake Landing (Incremental)
-    # PHASE_ID = 2 -> Snowflake Landing to Staging
-    # PHASE_ID = 3 -> Snowflake Staging to DataMart
-    # PHASE_ID = 1
+def add_landing_arguments(subparser):
+    """
+    Add the options shared by the NetSuite-to-Landing phases.
+
+    Args:
+        subparser (ArgumentParser): The phase 0 or phase 1 subcommand parser.
+
+    Returns:
+        None
+    """
+    subparser.add_argument(
+        "--accounts",
+        nargs="+",
+        metavar="ACCOUNT",
+        help="Load only these [netsuite:ACCOUNT] sections (default: every configured account)",
+    )
+    subparser.add_argument(
+        "--delete-sync",
+        action="store_true",
+        help="Remove Landing rows whose primary keys were deleted in NetSuite",
+    )
+    subparser.add_argument(
+        "--derive-columns",
+        action="store_true",
+        help="Extract only the columns used by the staging views and DIM tables",
+    )
+    subparser.add_argument(
+        "--worker",
+        metavar="QUEUE_NAME",
+        help="Claim tables from the shared work queue QUEUE_NAME until it is drained",
+    )
+    subparser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="With --worker: add the table list to the queue first (tables already queued are skipped)",
+    )
+    subparser.add_argument(
+        "--queue-db",
+        metavar="PATH",
+        help="With --worker: keep the lease table in a local SQLite file instead of Snowflake",
+    )
+    subparser.add_argument(
+        "--apply-clustering",
+        action="store_true",
+        help="Set the catalog clustering keys and search optimization on the landing tables first",
+    )
+    subparser.add_argument(
+        "--clustering-report",
+        action="store_true",
+        help="Report SYSTEM$CLUSTERING_INFORMATION per landing table against the previous report",
+    )
+    subparser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Dry run: print each table's expected rows, bytes, strategy and duration, and write nothing",
+    )
+
+
+def get_parser():
+    """
+    Build the command line parser, one subcommand per phase.
+
+    Returns:
+        ArgumentParser: The parser.
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--tables",
+        nargs="+",
+        metavar="TABLE",
+        help="Run only these NetSuite tables (space or comma separated)",
+    )
+    common.add_argument(
+        "--env",
+        help="Catalog environment to run against (default: $ELT_ENV, then the catalog default)",
+    )
+    common.add_argument(
+        "--cost-report",
+        metavar="PATH",
+        help="Also save the run's Snowflake cost report (from QUERY_HISTORY) as CSV",
+    )
+    common.add_argument(
+        "--catalog",
+        metavar="PATH",
+        help="Table catalog file (default: $ELT_CATALOG, then catalog.json)",
+    )
+    parser = argparse.ArgumentParser(
+        description="Parser for Infofiscus-Python",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(
+        dest="phase",
+        required=True,
+        metavar="phase",
+        help="Phase # (or name) of the operation:\n"
+        + "\n".join([f"\t{phase} ({PHASE_ALIASES[phase][0]}): {text}" for phase, text in PHASE_HELP.items()]),
+    )
+    phase_parsers = {
+        phase: subparsers.add_parser(
+            phase, aliases=PHASE_ALIASES[phase], help=text, parents=[common]
+        )
+        for phase, text in PHASE_HELP.items()
+    }
+
+    add_landing_arguments(phase_parsers["0"])
+    add_landing_arguments(phase_parsers["1"])
+    phase_parsers["1"].add_argument(
+        "--reconcile",
+        action="store_true",
+        help="Compare key-range checksums with NetSuite and re-extract only drifted ranges",
+    )
+    phase_parsers["1"].add_argument(
+        "--replay",
+        action="store_true",
+        help="Load uncommitted batches from the local Parquet cache without querying NetSuite",
+    )
+    phase_parsers["1"].add_argument(
+        "--scripted",
+        action="store_true",
+        help="Run each batch's MERGE, watermark update and cleanup as one Snowflake Scripting block",
+    )
+    phase_parsers["1"].add_argument(
+        "--continuous",
+        action="store_true",
+        help="Poll NetSuite continuously and MERGE the deltas in micro-batches until stopped",
+    )
+    phase_parsers["2"].add_argument(
+        "--streams",
+        action="store_true",
+        help="Read landing changes from Snowflake STREAMs instead of scanning INSERT_DT",
+    )
+    return parser
 
+
+def get_phase_id(phase):
+    """
+    Resolve a phase subcommand or alias to its phase number.
+
+    Args:
+        phase (str): The subcommand as typed, e.g. "1" or "incremental".
+
+    Returns:
+        int: The phase number.
+    """
+    for phase_id, aliases in PHASE_ALIASES.items():
+        if phase == phase_id or phase in aliases:
+            return int(phase_id)
+    raise ValueError(f"Invalid phase: {phase}")
+
+
+def get_tables(args):
+    """
+    Resolve the --tables option against the configured NetSuite tables.
+
+    Args:
+        args (Namespace): The parsed command line.
+
+    Returns:
+        list: The selected table names, in catalog priority order.
+    """
     NETSUITE_TABLES = getNetsuiteTables()
+    if not args.tables:
+        return NETSUITE_TABLES
+
+    selected = [table.strip().upper() for value in args.tables for table in value.split(",") if table.strip()]
+    unknown = [table for table in selected if table not in NETSUITE_TABLES]
+    if unknown:
+        raise SystemExit(f"Unknown or disabled table(s): {', '.join(unknown)}")
+    return [table for table in NETSUITE_TABLES if table in selected]
+
+
+def record_run(run_id, phase_id, stats):
+    """
+    Add a phase's per-table statistics to the run history used for scheduling.
+
+    Args:
+        run_id (str): The run identifier.
+        phase_id (int): The phase.
+        stats (dict): The statistics returned by the phase, keyed by table.
+
+    Returns:
+        None
+    """
+    from run_stats import record_stats
+
+    record_stats(run_id, phase_id, stats)
+
+
+def run_queue_worker(args, phase_id, tables, sf_config, load_table, queue_name=None):
+    """
+    Run this process as one worker of the shared table work queue.
+
+    Args:
+        args (Namespace): The parsed command line.
+        phase_id (int): The phase the queued tasks run.
+        tables (list): The tables to enqueue with --enqueue.
+        sf_config (dict): The Snowflake connection parameters, used for the lease table.
+        load_table (callable): Loads a single table; called with the table name and the
+            task's lease-lost event. Its per-table statistics are added to the run history,
+            and a table missing from them fails the task so the queue retries it.
+        queue_name (str, optional): The queue to work on. Defaults to the --worker name.
+
+    Returns:
+        None
+    """
+    from conn_util import get_sf_connection
+    from work_queue import LeaseQueue, connect_sqlite, run_worker
+
+    if args.queue_db:
+        connect = lambda: connect_sqlite(args.queue_db)
+        queue_table = "WORK_QUEUE"
+    else:
+        connect = lambda: get_sf_connection(sf_config)
+        queue_table = "INFOFISCUS_PYTHON_LANDING.PUBLIC.WORK_QUEUE"
+
+    queue_name = queue_name or args.worker
+    queue = LeaseQueue(connect, queue_table, queue_name)
+    queue.create()
+    if args.enqueue:
+        print(f"{queue.enqueue(phase_id, tables)} task(s) added to {queue_name}")
+
+    def run_task(phase, table, lease_lost):
+        stats = load_table(table, lease_lost)
+        record_run(queue_name, phase, stats)
+        if table not in stats:
+            # the loaders print and swallow per-table errors, so fail the task here
+            raise RuntimeError(f"{table}: Load failed, see the errors above")
+
+    run_worker(queue, run_task)
+
+
+def get_landing_props(args, phase_id, tables, sf_cnxn):
+    """
+    Build the props for a NetSuite-to-Landing phase.
+
+    Args:
+        args (Namespace): The parsed command line.
+        phase_id (int): 0 or 1.
+        tables (list): The selected tables.
+        sf_cnxn: The Snowflake database connection, used by --derive-columns.
+
+    Returns:
+        dict: The phase props.
+    """
+    from transient_landing_tables import new_run_id
+
+    PHASE_PROPS = getPhaseProps()
+    COLUMN_ALLOWLISTS = getColumnAllowlists()
+    if args.derive_columns:
+        from column_projection import derive_column_allowlists
+
+        derived = derive_column_allowlists(
+            sf_cnxn, tables, {**PHASE_PROPS[2], **PHASE_PROPS[3]}
+        )
+        if derived != -1:
+            COLUMN_ALLOWLISTS = {**derived, **COLUMN_ALLOWLISTS}
+
+    props = dict(PHASE_PROPS[phase_id])
+    props.update(
+        {"RUN_ID": new_run_id(), "PHASE": phase_id, "COLUMN_ALLOWLISTS": COLUMN_ALLOWLISTS}
+    )
+    if getattr(args, "scripted", False):
+        props["SCRIPTED_LOAD"] = True
+    return props
+
+
+def run_landing_phase(args, phase_id, tables, config):
+    """
+    Run phase 0 (bulk) or phase 1 (incremental) from NetSuite to Snowflake Landing.
+
+    With several [netsuite:ACCOUNT] sections configured, every account is loaded
+    concurrently on its own connections.
+
+    Args:
+        args (Namespace): The parsed command line.
+        phase_id (int): 0 or 1.
+        tables (list): The selected tables.
+        config (ConfigParser): The connection properties.
+
+    Returns:
+        None
+    """
+    from accounts import get_accounts, run_accounts
+    from ns_governor import configure_governor
+    from run_stats import plan_run
+
+    # longest-expected tables first, so the run never ends waiting on one big table
+    tables = plan_run(phase_id, tables)
+
+    accounts = get_accounts(config, args.accounts)
+    if accounts[0][0] is None:
+        configure_governor(config["netsuite"])
+    stop = None
+    if phase_id == 1 and args.continuous:
+        from micro_batch import stop_on_signals
+
+        stop = stop_on_signals()
+    run_accounts(
+        accounts,
+        lambda account, netsuite: run_account(
+            args, phase_id, tables, config, account, netsuite, stop
+        ),
+    )
+
+
+def report_costs(args, sf_cnxn, props, started_at, stats=None):
+    """
+    Print the run's Snowflake cost report, harvested from the tagged QUERY_HISTORY.
+
+    Args:
+        args (Namespace): The parsed command line.
+        sf_cnxn: The Snowflake database connection.
+        props (dict): The phase props, holding RUN_ID.
+        started_at (float): The run's start as a Unix timestamp.
+        stats (dict, optional): The phase's per-table run statistics.
+
+    Returns:
+        None
+    """
+    from query_tags import harvest_costs
+
+    path = args.cost_report
+    if path and props.get("ACCOUNT"):
+        root, ext = os.path.splitext(path)
+        path = f"{root}_{props['ACCOUNT']}{ext}"
+    harvest_costs(sf_cnxn, props, started_at, stats, path)
+
+
+def run_account(args, phase_id, tables, config, account, netsuite, stop=None):
+    """
+    Run phase 0 or phase 1 for one NetSuite account.
+
+    Args:
+        args (Namespace): The parsed command line.
+        phase_id (int): 0 or 1.
+        tables (list): The selected tables.
+        config (ConfigParser): The connection properties.
+        account (str): The account name, or None for the single [netsuite] account.
+        netsuite (dict): The account's NetSuite connection parameters.
+        stop (Event, optional): Ends a --continuous run.
+
+    Returns:
+        None
+    """
+    from accounts import ensure_account_schema, get_account_props
+    from conn_util import get_sf_connection, get_ns_connection
+    from ns_governor import bind_governor, get_governor
+    from warehouse_policy import warehouse_for
+
     PRIMARY_KEY_TABLES = getPrimaryKeyTables()
-    SF_DATATYPES = getDataTypes()
-    SOURCE_VIEW_KEYS = getSourceViewKeys()
-
-    if ns_cnxn != -1 and sf_cnxn != -1:
-        try:
-            if PHASE_ID == 0:
-                props = dict(
-                    {
-                        "ENV": "INFOFISCUS_PYTHON_LANDING",
-                        "CONTROL_TABLE": "INFOFISCUS_PYTHON_LANDING.PUBLIC.NETSUITE_CT",
-                        "LANDING_DB": "INFOFISCUS_PYTHON_LANDING",
-                        "LANDING_SCHEMA": "FINANCE",
-                    }
-                )
-                # load_tables(ns_cnxn, sf_cnxn, NETSUITE_TABLES, PRIMARY_KEY_TABLES, SF_DATATYPES, props)
-                # bulk_load(ns_cnxn, sf_cnxn, NETSUITE_TABLES, PRIMARY_KEY_TABLES, props)
-
-            elif PHASE_ID == 1:
-                props = dict(
-                    {
-                        "ENV": "INFOFISCUS_PYTHON_LANDING",
-                        "CONTROL_TABLE": "INFOFISCUS_PYTHON_LANDING.PUBLIC.NETSUITE_CT",
-                        "LANDING_DB": "INFOFISCUS_PYTHON_LANDING",
-                        "LANDING_SCHEMA": "FINANCE",
-                    }
-                )
-                # incremental_load(ns_cnxn, sf_cnxn, NETSUITE_TABLES, PRIMARY_KEY_TABLES, props)
-                incremental_load_transient(
-                    ns_cnxn, sf_cnxn, NETSUITE_TABLES, PRIMARY_KEY_TABLES, props
+    replay = phase_id == 1 and args.replay and not args.plan
+    started_at = time.time()
+    stats = None
+    phase_warehouse = ExitStack()
+
+    if account is not None:
+        bind_governor(netsuite)
+    ns_cnxn = None if replay else get_ns_connection(netsuite)
+    sf_cnxn = get_sf_connection(config["snowflake"])
+
+    if ns_cnxn == -1 or sf_cnxn == -1:
+        print(f"{account or 'NetSuite'}: Connection Error")
+        return
+
+    try:
+        props = get_account_props(
+            get_landing_props(args, phase_id, tables, sf_cnxn), account, netsuite
+        )
+        if args.plan:
+            from planner import plan_landing
+
+            plan_landing(ns_cnxn, sf_cnxn, tables, props, phase_id)
+            return
+        ensure_account_schema(sf_cnxn, tables, props)
+        phase_warehouse.enter_context(warehouse_for(sf_cnxn, props, stage="phase"))
+        if args.apply_clustering:
+            from clustering import apply_clustering
+
+            apply_clustering(sf_cnxn, tables, PRIMARY_KEY_TABLES, props)
+        queue_name = f"{args.worker}_{account}" if args.worker and account else None
+
+        if phase_id == 0:
+            from bulk_load import bulk_load
+
+            # load_tables(ns_cnxn, sf_cnxn, tables, PRIMARY_KEY_TABLES, getDataTypes(), props)
+            # bulk_load(ns_cnxn, sf_cnxn, tables, PRIMARY_KEY_TABLES, props)
+            if args.worker:
+                run_queue_worker(
+                    args,
+                    phase_id,
+                    tables,
+                    config["snowflake"],
+                    lambda table, lease_lost: bulk_load(
+                        ns_cnxn, sf_cnxn, [table], PRIMARY_KEY_TABLES, {**props, "LEASE_LOST": lease_lost}
+                    ),
+                    queue_name,
                 )
+        else:
+            from incremental_load_transient import incremental_load_transient, replay_cached_batches
 
-            elif PHASE_ID == 2:
-                props = dict(
-                    {
-                        "CONTROL_TABLE": "INFOFISCUS_PYTHON_STAGING.PUBLIC.STAGING_CT",
-                        "LANDING_DB": "INFOFISCUS_PYTHON_LANDING",
-                        "LANDING_SCHEMA": "FINANCE",
-                        "STAGING_DB": "INFOFISCUS_PYTHON_STAGING",
-                        "STAGING_SCHEMA": "FINANCE_STG",
-                    }
+            # incremental_load(ns_cnxn, sf_cnxn, tables, PRIMARY_KEY_TABLES, props)
+            if replay:
+                replay_cached_batches(sf_cnxn, tables, PRIMARY_KEY_TABLES, props)
+            elif args.continuous:
+                from micro_batch import run_micro_batches
+
+                run_micro_batches(
+                    ns_cnxn,
+                    sf_cnxn,
+                    tables,
+                    PRIMARY_KEY_TABLES,
+                    props,
+                    lambda: get_sf_connection(config["snowflake"]),
+                    stop,
                 )
-                landing_to_staging(sf_cnxn, props)
-
-            elif PHASE_ID == 3:
-                props = dict(
-                    {
-                        "STAGING_DB": "INFOFISCUS_PYTHON_STAGING",
-                        "STAGING_SCHEMA": "FINANCE_STG",
-                        "DATAMART_DB": "INFOFISCUS_PYTHON_DATAMART",
-                        "DATAMART_SCHEMA": "FINANCE",
-                    }
+            elif args.worker:
+                run_queue_worker(
+                    args,
+                    phase_id,
+                    tables,
+                    config["snowflake"],
+                    lambda table, lease_lost: incremental_load_transient(
+                        ns_cnxn, sf_cnxn, [table], PRIMARY_KEY_TABLES, {**props, "LEASE_LOST": lease_lost}
+                    ),
+                    queue_name,
                 )
-                res = staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS)
-                if res == -1:
-                    print("Snowflake Staging to DataMart Failed!!!")
-                else:
-                    print("Snowflake Staging to DataMart Completed!!!")
             else:
-                print("Invalid PHASE_ID:", PHASE_ID)
+                stats = incremental_load_transient(
+                    ns_cnxn, sf_cnxn, tables, PRIMARY_KEY_TABLES, props
+                )
+                record_run(props["RUN_ID"], phase_id, stats)
+
+        if args.delete_sync and not replay:
+            from delete_sync import delete_sync
 
-        except Exception as e:
-            print(e)
-        finally:
+            delete_sync(ns_cnxn, sf_cnxn, tables, PRIMARY_KEY_TABLES, props)
+        if phase_id == 1 and args.reconcile and not replay:
+            from reconcile import reconcile
+
+            reconcile(ns_cnxn, sf_cnxn, tables, PRIMARY_KEY_TABLES, props)
+        if args.clustering_report:
+            from clustering import clustering_report
+
+            clustering_report(sf_cnxn, tables, props)
+
+        report_costs(args, sf_cnxn, props, started_at, stats)
+    except Exception as e:
+        print(f"{account}: {e}" if account else e)
+    finally:
+        phase_warehouse.close()
+        get_governor().print_metrics()
+        if ns_cnxn:
             ns_cnxn.close()
-            sf_cnxn.close()
-    else:
+        sf_cnxn.close()
+
+
+def run_snowflake_phase(args, phase_id, config):
+    """
+    Run phase 2 (Landing to Staging) or phase 3 (Staging to DataMart); Snowflake only.
+
+    Phase 2 reads the landing schema of every configured NetSuite account (or of the
+    --accounts given) into the shared staging tables, which phase 3 then reads; with
+    named accounts, phase 3 also matches the datamart rows on the account column.
+
+    Args:
+        args (Namespace): The parsed command line.
+        phase_id (int): 2 or 3.
+        config (ConfigParser): The connection properties.
+
+    Returns:
+        None
+    """
+    from accounts import ACCOUNT_COLUMN, get_accounts
+    from conn_util import get_sf_connection
+    from run_stats import get_expected_seconds, plan_run
+    from transient_landing_tables import new_run_id
+    from warehouse_policy import warehouse_for
+
+    accounts = get_accounts(config, args.accounts)
+    sf_cnxn = get_sf_connection(config["snowflake"])
+    if sf_cnxn == -1:
         print("Connection Error")
+        return
+
+    tables = get_tables(args) if args.tables else None
+    props = dict(getPhaseProps()[phase_id])
+    props.update({"RUN_ID": new_run_id(), "PHASE": phase_id})
+    started_at = time.time()
+    # the table list comes from Snowflake metadata here, so only the ETA uses the history
+    plan_run(phase_id, tables or list(get_expected_seconds(phase_id)))
+
+    try:
+        if phase_id == 2:
+            from landing_to_staging import landing_to_staging_accounts
+
+            props["TABLES"] = tables
+            if args.streams:
+                props["CHANGE_CAPTURE"] = "stream"
+            with warehouse_for(sf_cnxn, props, stage="phase"):
+                res = landing_to_staging_accounts(
+                    sf_cnxn,
+                    props,
+                    accounts,
+                    lambda: get_sf_connection(config["snowflake"]),
+                )
+        else:
+            from staging_to_datamart import staging_to_datamart
+
+            if accounts[0][0] is not None:
+                props["ACCOUNT_COLUMN"] = ACCOUNT_COLUMN
+            with warehouse_for(sf_cnxn, props, stage="phase"):
+                res = staging_to_datamart(sf_cnxn, props, getSourceViewKeys(), tables)
+            if res == -1:
+                print("Snowflake Staging to DataMart Failed!!!")
+            else:
+                print("Snowflake Staging to DataMart Completed!!!")
+        record_run(props["RUN_ID"], phase_id, res)
+        report_costs(args, sf_cnxn, props, started_at, res)
+    except Exception as e:
+        print(e)
+    finally:
+        sf_cnxn.close()
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    PHASE_ID = get_phase_id(args.phase)
+
+    from catalog import configure_catalog
+
+    try:
+        configure_catalog(args.catalog, args.env)
+    except (OSError, ValueError) as e:
+        raise SystemExit(e)
+
+    config = ConfigParser()
+    config.read("properties/conn_props.ini")
+
+    # PHASE_ID = 0 -> NetSutie to Snowflake Landing (Bulk)
+    # PHASE_ID = 1 -> NetSuite to Snowflake Landing (Incremental)
+    # PHASE_ID = 2 -> Snowflake Landing to Staging
+    # PHASE_ID = 3 -> Snowflake Staging to DataMart
+
+    if PHASE_ID in (0, 1):
+        run_landing_phase(args, PHASE_ID, get_tables(args), config)
+    else:
+        run_snowflake_phase(args, PHASE_ID, config)
@@ -0,0 +1,365 @@
+import os
+import signal
+import tempfile
+import threading
+import time
+from datetime import datetime
+from catalog import get_table_setting, key_columns
+from column_projection import get_table_columns
+from extract import extract_frame
+from incremental_load_transient import (
+    check_date_last_modified,
+    fetch_control_table,
+    get_control_merge_query,
+    get_merge_query,
+    get_post_upload_script,
+)
+from ns_to_sf_transform import transform_data
+from query_tags import tag_session
+from transient_landing_tables import create_run_table, drop_run_table
+from warehouse_policy import warehouse_for
+
+DEFAULT_MICRO_BATCH = {
+    "STAGE": "NETSUITE_MICRO_BATCHES",
+    "POLL_SECONDS": 30,
+    "FLUSH_SECONDS": 60,
+    "FLUSH_BYTES": 64 * 1024 ** 2,
+}
+
+
+def stop_on_signals():
+    """
+    Return an event that is set on SIGINT or SIGTERM, to end a continuous run cleanly.
+
+    Must be called from the main thread.
+
+    Returns:
+        Event: The stop event.
+    """
+    stop = threading.Event()
+
+    def handle(signum, frame):
+        print("Stopping after the current poll and a final flush...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+    return stop
+
+
+def get_stage_path(table, props):
+    """
+    Build the internal stage path a table's micro-batch files are put under.
+
+    Args:
+        table (str): The name of the table.
+        props (dict): The phase props holding LANDING_DB, TRANSIENT_SCHEMA and MICRO_BATCH.
+
+    Returns:
+        str: The stage path, e.g. @DB.SCHEMA.STAGE/ACCOUNT/TABLE/.
+    """
+    stage = props["MICRO_BATCH"]["STAGE"]
+    return f"@{props['LANDING_DB']}.{props['TRANSIENT_SCHEMA']}.{stage}/{props.get('ACCOUNT') or 'DEFAULT'}/{table}/"
+
+
+def create_stage(sf_cnxn, props):
+    """
+    Create the internal stage holding the micro-batch files, if it does not exist.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        props (dict): The phase props.
+
+    Returns:
+        None
+    """
+    with sf_cnxn.cursor() as sf_cur:
+        sf_cur.execute(
+            f"CREATE STAGE IF NOT EXISTS {props['LANDING_DB']}.{props['TRANSIENT_SCHEMA']}.{props['MICRO_BATCH']['STAGE']} "
+            "FILE_FORMAT = (TYPE = PARQUET)"
+        )
+
+
+def put_micro_batch(sf_cnxn, table, df, file_name, props):
+    """
+    Write a transformed delta as a Parquet file and PUT it to the table's stage path.
+
+    PUT runs in the client and the cloud services layer, so it needs no warehouse.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the table.
+        df (DataFrame): The transformed delta.
+        file_name (str): The file name on the stage.
+        props (dict): The phase props.
+
+    Returns:
+        int: The size of the file in bytes.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, file_name)
+        df.to_parquet(path, index=False)
+        size = os.path.getsize(path)
+        tag_session(sf_cnxn, props, table)
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(
+                f"PUT 'file://{path.replace(os.sep, '/')}' {get_stage_path(table, props)} AUTO_COMPRESS = FALSE OVERWRITE = TRUE"
+            )
+    return size
+
+
+def get_flush_script(table, columns, run_table, until, PRIMARY_KEY_TABLES, props):
+    """
+    Build the scripted MERGE of a run table's deltas, deduplicated to the latest row per key.
+
+    Args:
+        table (str): The name of the table.
+        columns (list): The extracted columns.
+        run_table (str): The run table the staged files were copied into.
+        until (str): The watermark the flushed files bring the table up to.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): The phase props.
+
+    Returns:
+        str: The EXECUTE IMMEDIATE statement, see get_post_upload_script.
+    """
+    keys = ", ".join(key_columns(PRIMARY_KEY_TABLES[table]))
+    latest = (
+        f"(SELECT * FROM {run_table} "
+        f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY DATE_LAST_MODIFIED DESC) = 1)"
+    )
+    return get_post_upload_script(
+        get_merge_query(columns, table, props["LANDING_DB"], props["LANDING_SCHEMA"], latest, PRIMARY_KEY_TABLES),
+        get_control_merge_query(props["ENV"], table, until, props["CONTROL_TABLE"]),
+        run_table,
+    )
+
+
+def flush_table(sf_cnxn, table, batch, PRIMARY_KEY_TABLES, props):
+    """
+    COPY a table's staged micro-batch files into a run table and MERGE them into landing.
+
+    The MERGE and the control table watermark commit together; the files are removed
+    from the stage only afterwards, so a failed flush can simply be retried.
+
+    Args:
+        sf_cnxn: The Snowflake session of the flush loop.
+        table (str): The name of the table.
+        batch (dict): The pending files: files, rows, bytes, columns, oldest and until.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): The phase props.
+
+    Returns:
+        None
+    """
+    stage_path = get_stage_path(table, props)
+    files = ", ".join(f"'{file_name}'" for file_name in batch["files"])
+    tag_session(sf_cnxn, props, table)
+    run_table = create_run_table(sf_cnxn, table, props)
+    try:
+        with warehouse_for(sf_cnxn, props, table, "copy+merge", batch["rows"], large_only=True):
+            with sf_cnxn.cursor() as sf_cur:
+                # FORCE, since a retried flush copies the same files into a new run table
+                sf_cur.execute(
+                    f"COPY INTO {run_table} FROM {stage_path} FILES = ({files}) "
+                    "FILE_FORMAT = (TYPE = PARQUET) MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE FORCE = TRUE"
+                )
+                sf_cur.execute(
+                    get_flush_script(table, batch["columns"], run_table, batch["until"], PRIMARY_KEY_TABLES, props)
+                )
+                merged = sf_cur.fetchone()[0]
+    finally:
+        drop_run_table(sf_cnxn, run_table)
+
+    with sf_cnxn.cursor() as sf_cur:
+        pattern = "|".join(file_name.replace(".", "\\\\.") for file_name in batch["files"])
+        sf_cur.execute(f"REMOVE {stage_path} PATTERN = '.*({pattern})'")
+    print(
+        f"{table}: {len(batch['files'])} micro-batch(es), {batch['rows']} rows, {merged} merged, "
+        f"watermark {batch['until']}, {time.time() - batch['oldest']:.0f}s after the oldest poll"
+    )
+
+
+class MicroBatchState:
+    """
+    The staged but not yet merged files of every table, shared by the poll and flush loops.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def add(self, table, file_name, rows, nbytes, columns, until):
+        """Record a staged file."""
+        with self.lock:
+            batch = self.pending.setdefault(
+                table, {"files": [], "rows": 0, "bytes": 0, "columns": columns, "oldest": time.time(), "until": until}
+            )
+            batch["files"].append(file_name)
+            batch["rows"] += rows
+            batch["bytes"] += nbytes
+            batch["until"] = until
+
+    def mark_polled(self, table, until):
+        """Advance the pending watermark of a table whose poll found no changes."""
+        with self.lock:
+            if table in self.pending:
+                self.pending[table]["until"] = until
+
+    def take_due(self, flush_seconds, flush_bytes, flush_all=False):
+        """
+        Remove and return the tables whose pending files are old or large enough to flush.
+
+        Args:
+            flush_seconds (float): Flush files older than this.
+            flush_bytes (int): Flush tables with at least this many pending bytes.
+            flush_all (bool): Flush every table with pending files.
+
+        Returns:
+            dict: A dictionary mapping tables to their pending batches.
+        """
+        now = time.time()
+        with self.lock:
+            due = [
+                table
+                for table, batch in self.pending.items()
+                if flush_all or now - batch["oldest"] >= flush_seconds or batch["bytes"] >= flush_bytes
+            ]
+            return {table: self.pending.pop(table) for table in due}
+
+    def put_back(self, table, batch):
+        """Requeue a batch whose flush failed, ahead of files staged since."""
+        with self.lock:
+            newer = self.pending.get(table)
+            if newer:
+                batch["files"] += newer["files"]
+                batch["rows"] += newer["rows"]
+                batch["bytes"] += newer["bytes"]
+                batch["until"] = newer["until"]
+            self.pending[table] = batch
+
+
+def flush_loop(sf_cnxn, state, PRIMARY_KEY_TABLES, props, stop):
+    """
+    Merge due micro-batches until stopped, then flush whatever is left.
+
+    Args:
+        sf_cnxn: The flush loop's own Snowflake session.
+        state (MicroBatchState): The shared pending files.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): The phase props.
+        stop (Event): Set to end the loop.
+
+    Returns:
+        None
+    """
+    settings = props["MICRO_BATCH"]
+    while True:
+        stopping = stop.wait(1)
+        due = state.take_due(settings["FLUSH_SECONDS"], settings["FLUSH_BYTES"], flush_all=stopping)
+        for table, batch in due.items():
+            try:
+                flush_table(sf_cnxn, table, batch, PRIMARY_KEY_TABLES, props)
+            except Exception as e:
+                print(f"ERROR flushing {table}: {e}")
+                if not stopping:
+                    state.put_back(table, batch)
+        if stopping:
+            return
+
+
+def run_micro_batches(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props, connect, stop):
+    """
+    Continuously poll NetSuite for deltas and merge them into landing in micro-batches.
+
+    Every POLL_SECONDS each table is extracted with the incremental predicate from its
+    last polled watermark, and a non-empty delta is PUT as a Parquet file to an internal
+    stage. A separate flush loop, on its own session, COPYs a table's files into a run
+    table once the oldest is FLUSH_SECONDS old or they reach FLUSH_BYTES, and MERGEs them
+    in one go, keeping the latest row per key. Polling and PUT need no warehouse, so the
+    warehouse only runs for the flushes. The settings are the MICRO_BATCH props.
+
+    The control table watermark only advances with a flush, so after a crash the
+    deltas of unflushed files are extracted again.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        sf_cnxn: The Snowflake database connection, used by the poll loop.
+        KEY_TABLES (list): A list of table names to poll.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): The phase props.
+        connect (callable): Opens the flush loop's Snowflake session.
+        stop (Event): Set to end the run, e.g. from stop_on_signals.
+
+    Returns:
+        None
+    """
+    props = dict(props)
+    props.setdefault("TRANSIENT_SCHEMA", "FINANCE_TRANSIENT")
+    props["MICRO_BATCH"] = {**DEFAULT_MICRO_BATCH, **props.get("MICRO_BATCH", {})}
+    settings = props["MICRO_BATCH"]
+
+    tables = [table for table in KEY_TABLES if table in PRIMARY_KEY_TABLES]
+    for table in set(KEY_TABLES) - set(tables):
+        print(f"{table}: No primary key, skipped in continuous mode")
+
+    create_stage(sf_cnxn, props)
+    tag_session(sf_cnxn, props)
+    control_table_df = fetch_control_table(sf_cnxn, control_table_name=props["CONTROL_TABLE"])
+    watermarks = {}
+    for table in tables:
+        since = check_date_last_modified(df=control_table_df, env=props["ENV"], table_name=table)
+        if since == -1:
+            continue
+        watermarks[table] = since
+        # files left by an earlier run are re-extracted from the control table watermark
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(f"REMOVE {get_stage_path(table, props)}")
+
+    flush_cnxn = connect()
+    if flush_cnxn == -1:
+        print("Snowflake connection for the flush loop failed")
+        return
+    state = MicroBatchState()
+    flusher = threading.Thread(
+        target=flush_loop, args=(flush_cnxn, state, PRIMARY_KEY_TABLES, props, stop), daemon=True
+    )
+    flusher.start()
+    print(f"Continuous mode: polling {len(watermarks)} table(s) every {settings['POLL_SECONDS']}s")
+
+    sequence = 0
+    try:
+        while not stop.is_set():
+            started = time.time()
+            # one watermark per poll cycle, taken before any extract as in the batch load, so a
+            # slow PUT does not widen the next table's window past what the cycle extracted
+            until = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for table, since in watermarks.items():
+                columns, data = extract_frame(
+                    ns_cnxn,
+                    table,
+                    since,
+                    get_table_columns(table, PRIMARY_KEY_TABLES, props),
+                    until,
+                    batch_rows=get_table_setting(table, "batch_size"),
+                )
+                if columns == -1:
+                    continue
+                if len(data) == 0:
+                    state.mark_polled(table, until)
+                else:
+                    df = transform_data(data, columns, table, PRIMARY_KEY_TABLES)
+                    sequence += 1
+                    file_name = f"{table}_{props['RUN_ID']}_{sequence:08d}.parquet"
+                    try:
+                        nbytes = put_micro_batch(sf_cnxn, table, df, file_name, props)
+                    except Exception as e:
+                        print(f"ERROR staging {table}: {e}")
+                        continue
+                    state.add(table, file_name, len(df), nbytes, list(df.columns), until)
+                watermarks[table] = until
+            stop.wait(max(0.0, settings["POLL_SECONDS"] - (time.time() - started)))
+    finally:
+        stop.set()
+        flusher.join()
+        flush_cnxn.close()
@@ -0,0 +1,313 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# SQLSTATEs for timeouts and serialisation failures, retried on the same connection.
+RETRYABLE_SQLSTATES = ("HYT00", "HYT01", "40001")
+# SQLSTATEs for dropped links and refused logins, which SuiteAnalytics also returns when
+# the account runs out of concurrent connections. A query on a dead connection fails the
+# same way every time, so these are only retried while opening a new connection.
+CONNECTION_SQLSTATES = ("08S01", "08001", "08004")
+RETRYABLE_MESSAGES = ("throttl", "concurrent", "too many", "rate limit", "timeout", "try again")
+
+
+def is_odbc_error(error):
+    """
+    Check whether an error is a pyodbc.Error, without importing pyodbc.
+
+    The extract, reconcile and daemon modules import this one, and loading pyodbc
+    needs the ODBC driver manager; see conn_util for the lazy driver imports.
+
+    Args:
+        error (Exception): The raised error.
+
+    Returns:
+        bool: True if the error's class derives from pyodbc.Error.
+    """
+    return any(cls.__module__ == "pyodbc" and cls.__name__ == "Error" for cls in type(error).__mro__)
+
+
+def get_sqlstate(error):
+    """
+    Read the SQLSTATE of an ODBC error.
+
+    Args:
+        error (Exception): The raised error.
+
+    Returns:
+        str: The SQLSTATE, or "" if there is none.
+    """
+    return str(error.args[0]) if is_odbc_error(error) and error.args else ""
+
+
+def is_retryable(error, connecting=False):
+    """
+    Check whether a NetSuite ODBC error is throttling or transient.
+
+    Args:
+        error (Exception): The raised error.
+        connecting (bool): Whether the operation opens a new connection, so that
+            connection-class errors are worth retrying.
+
+    Returns:
+        bool: True if the operation should be retried.
+    """
+    if not is_odbc_error(error):
+        return False
+    sqlstate = get_sqlstate(error)
+    if sqlstate in CONNECTION_SQLSTATES:
+        return connecting
+    message = " ".join(str(arg) for arg in error.args).lower()
+    return sqlstate in RETRYABLE_SQLSTATES or any(text in message for text in RETRYABLE_MESSAGES)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` acquisitions per second with bursts up to `burst`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, sleeping until one is available.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class NetSuiteGovernor:
+    """
+    Caps concurrent NetSuite queries, rate limits them and retries throttled or transient errors.
+
+    Args:
+        max_concurrent (int): The maximum number of queries in flight for the account.
+        rate (float): The sustained number of queries started per second.
+        burst (int): The number of queries that may start back to back.
+        max_retries (int): The number of retries after a retryable error.
+        base_delay (float): The base backoff in seconds, doubled on every retry.
+        max_delay (float): The upper bound of a single backoff in seconds.
+    """
+
+    def __init__(self, max_concurrent=4, rate=2.0, burst=4, max_retries=5, base_delay=2.0, max_delay=120.0):
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = {}
+        self.metrics_lock = threading.Lock()
+
+    def record(self, name, **values):
+        """
+        Add values to the metrics kept for a name.
+
+        Args:
+            name (str): The name the metrics are recorded under.
+            **values: The metric increments.
+
+        Returns:
+            None
+        """
+        with self.metrics_lock:
+            metrics = self.metrics.setdefault(
+                name, {"queries": 0, "retries": 0, "failures": 0, "queue_wait_seconds": 0.0}
+            )
+            for key, value in values.items():
+                metrics[key] += value
+
+    def backoff(self, attempt):
+        """
+        Compute a full-jitter exponential backoff delay.
+
+        Args:
+            attempt (int): The zero-based retry attempt.
+
+        Returns:
+            float: The number of seconds to sleep.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def run(self, name, fn, *args, **kwargs):
+        """
+        Run a NetSuite operation inside a concurrency slot, retrying retryable errors.
+
+        Connection-class errors (a dropped link) are not retried: fn is bound to its
+        connection, so every retry would fail the same way.
+
+        Args:
+            name (str): The name the metrics are recorded under, usually the table.
+            fn (callable): The operation, typically one query plus its fetch.
+
+        Returns:
+            object: The return value of fn.
+
+        Raises:
+            Exception: The last error once retries are exhausted, or any non-retryable error.
+        """
+        with self.hold(name, fn, *args, **kwargs) as result:
+            return result
+
+    def hold(self, name, fn, *args, **kwargs):
+        """
+        Run a NetSuite operation like run, keeping its slot until the with block ends.
+
+        For operations whose result still talks to NetSuite, e.g. a cursor that is
+        fetched batch by batch; the fetch counts against max_concurrent.
+
+        Args:
+            name (str): The name the metrics are recorded under, usually the table.
+            fn (callable): The operation, typically one query.
+
+        Returns:
+            contextmanager: Yields the return value of fn.
+        """
+        return self.slot(name, fn, args, kwargs, connecting=False)
+
+    def connect(self, fn, *args, **kwargs):
+        """
+        Open a NetSuite connection inside a concurrency slot, retrying refused or dropped logins.
+
+        Args:
+            fn (callable): The function opening the connection, e.g. pyodbc.connect.
+
+        Returns:
+            object: The new connection.
+
+        Raises:
+            Exception: The last error once retries are exhausted, or any non-retryable error.
+        """
+        with self.slot("connect", fn, args, kwargs, connecting=True) as cnxn:
+            return cnxn
+
+    @contextmanager
+    def slot(self, name, fn, args, kwargs, connecting):
+        """
+        Run fn with the governor's slot, rate limit and backoff; see run, hold and connect.
+
+        Args:
+            name (str): The name the metrics are recorded under.
+            fn (callable): The operation.
+            args (tuple): The positional arguments of fn.
+            kwargs (dict): The keyword arguments of fn.
+            connecting (bool): Whether fn opens a new connection.
+
+        Yields:
+            object: The return value of fn, with the slot held until the with block ends.
+        """
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            with self.slots:
+                self.bucket.acquire()
+                self.record(name, queries=1, queue_wait_seconds=time.monotonic() - queued)
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    if not is_retryable(e, connecting) or attempt >= self.max_retries:
+                        self.record(name, failures=1)
+                        raise
+                    error = e
+                else:
+                    yield result
+                    return
+            delay = self.backoff(attempt)
+            print(f"{name}: NetSuite throttled or unavailable, retrying in {delay:.1f}s - {error}")
+            self.record(name, retries=1)
+            time.sleep(delay)
+            attempt += 1
+
+    def print_metrics(self):
+        """
+        Print queries, retries, failures and queue-wait time per name.
+
+        Returns:
+            None
+        """
+        for name, metrics in sorted(self.metrics.items()):
+            print(
+                f"{name}: {metrics['queries']} queries, {metrics['retries']} retries, "
+                f"{metrics['failures']} failures, {metrics['queue_wait_seconds']:.2f}s queued"
+            )
+
+
+GOVERNOR = NetSuiteGovernor()
+# per-thread override, so concurrently loaded NetSuite accounts are limited independently
+THREAD_GOVERNOR = threading.local()
+
+
+def new_governor(netsuite):
+    """
+    Build a governor with limits from a NetSuite connection properties section.
+
+    Args:
+        netsuite (dict): The NetSuite connection parameters. Optional keys are
+            max_concurrent_queries, queries_per_second, query_burst and max_retries.
+
+    Returns:
+        NetSuiteGovernor: The new governor.
+    """
+    return NetSuiteGovernor(
+        max_concurrent=int(netsuite.get("max_concurrent_queries", 4)),
+        rate=float(netsuite.get("queries_per_second", 2.0)),
+        burst=int(netsuite.get("query_burst", 4)),
+        max_retries=int(netsuite.get("max_retries", 5)),
+    )
+
+
+def configure_governor(netsuite):
+    """
+    Replace the shared governor with limits from the [netsuite] connection properties.
+
+    Args:
+        netsuite (dict): The NetSuite connection parameters, see new_governor.
+
+    Returns:
+        NetSuiteGovernor: The configured governor.
+    """
+    global GOVERNOR
+    GOVERNOR = new_governor(netsuite)
+    return GOVERNOR
+
+
+def bind_governor(netsuite):
+    """
+    Give the calling thread its own governor, e.g. for one NetSuite account.
+
+    Args:
+        netsuite (dict): The account's NetSuite connection parameters, see new_governor.
+
+    Returns:
+        NetSuiteGovernor: The thread's governor.
+    """
+    THREAD_GOVERNOR.governor = new_governor(netsuite)
+    return THREAD_GOVERNOR.governor
+
+
+def get_governor():
+    """
+    Get the NetSuite governor of the calling thread, or the shared one.
+
+    Returns:
+        NetSuiteGovernor: The governor used for NetSuite queries on this thread.
+    """
+    return getattr(THREAD_GOVERNOR, "governor", GOVERNOR)
@@ -1,4 +1,8 @@
 import pandas as pd
+from catalog import key_columns
+
+FETCH_BATCH_ROWS = 50000
+EPOCH_TIMESTAMP = "1970-01-01 00:00:00"
 
 
 def transform_data(data, columns, table, PRIMARY_KEY_TABLES):
@@ -6,22 +10,33 @@ def transform_data(data, columns, table, PRIMARY_KEY_TABLES):
     Transform the fetched data from NetSuite before loading it into Snowflake.
 
     Args:
-        data (list): The fetched data rows from NetSuite.
+        data (list or DataFrame): The fetched data rows from NetSuite, or a DataFrame
+            from extract_frame.
         columns (list): The column names of the fetched data.
         table (str): The name of the table being processed.
-        PRIMARY_KEY_TABLES (dict): A dictionary mapping table names to their primary key column names.
+        PRIMARY_KEY_TABLES (dict): A dictionary mapping table names to their primary key column
+            name, or list of names for a composite key.
 
     Returns:
         DataFrame: The transformed data as a Pandas DataFrame.
 
     """
-    data = [list(each) for each in data]
-    df = pd.DataFrame(data=data, columns=columns)
-    df[PRIMARY_KEY_TABLES[table]] = df[PRIMARY_KEY_TABLES[table]].astype(int)
+    if isinstance(data, pd.DataFrame):
+        df = data
+    else:
+        data = [list(each) for each in data]
+        df = pd.DataFrame(data=data, columns=columns)
+    pk_cols = key_columns(PRIMARY_KEY_TABLES[table])
+    for pk_col in pk_cols:
+        # composite keys may mix in text columns, only numeric ones are cast
+        if len(pk_cols) > 1 and not pd.api.types.is_float_dtype(df[pk_col]):
+            continue
+        if not pd.api.types.is_int64_dtype(df[pk_col]):
+            df[pk_col] = df[pk_col].astype(int)
 
     for col in df.columns:
         if pd.api.types.is_datetime64_any_dtype(df[col]):
-            df[col].fillna("1970-01-01 00:00:00", inplace=True)
+            df[col].fillna(EPOCH_TIMESTAMP, inplace=True)
             df[col] = pd.to_datetime(df[col])
             df[col] = df[col].astype(str)
         elif pd.api.types.is_int64_dtype(df[col]):
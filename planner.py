@@ -0,0 +1,184 @@
+import math
+from datetime import datetime
+from catalog import get_table_setting
+from incremental_load_transient import check_date_last_modified, count_data_ns, fetch_control_table, should_window
+from run_stats import estimate_eta, get_throughput
+from sharded_merge import should_shard
+from warehouse_policy import WAREHOUSE_SIZES, get_active_policy, get_policy_size
+
+
+def get_landing_sizes(sf_cnxn, props):
+    """
+    Read the row counts and bytes of the landing tables from INFORMATION_SCHEMA.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        props (dict): The phase props holding LANDING_DB and LANDING_SCHEMA.
+
+    Returns:
+        dict: A dictionary mapping table names to (rows, bytes), or -1 if an error occurs.
+    """
+    try:
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(
+                f"SELECT TABLE_NAME, ROW_COUNT, BYTES FROM {props['LANDING_DB']}.INFORMATION_SCHEMA.TABLES "
+                "WHERE TABLE_SCHEMA = %s",
+                (props["LANDING_SCHEMA"],),
+            )
+            return {row[0]: (row[1], row[2]) for row in sf_cur.fetchall()}
+    except Exception as e:
+        print("Landing sizes not available:", e)
+        return -1
+
+
+def get_credits_per_hour(size):
+    """
+    Return the credits a standard warehouse of a size uses per hour.
+
+    Args:
+        size (str): The warehouse size, as in WAREHOUSE_SIZES.
+
+    Returns:
+        int: The credits per hour, or None for an unknown size.
+    """
+    return 2 ** WAREHOUSE_SIZES.index(size) if size in WAREHOUSE_SIZES else None
+
+
+def plan_table(ns_cnxn, table, since, phase_id, landing, throughput, props):
+    """
+    Estimate one table's extract without running it.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        table (str): The name of the table.
+        since (str): The table's watermark, or None for a full extract.
+        phase_id (int): 0 or 1.
+        landing (tuple): The landing table's (rows, bytes), or None.
+        throughput (tuple): The table's (rows per second, bytes per row, average seconds), or None.
+        props (dict): The phase props.
+
+    Returns:
+        dict: The table's plan with TABLE, STRATEGY, ROWS, BYTES, SECONDS, WAREHOUSE_SIZE and CREDITS.
+    """
+    bulk = phase_id == 0 or get_table_setting(table, "strategy") == "bulk"
+    until = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        rows = count_data_ns(ns_cnxn, table, None if bulk else since, None if bulk else until)
+    except Exception as e:
+        print(table, ":", e)
+        rows = -1
+
+    strategy = "bulk" if bulk else "incremental"
+    window_rows = rows
+    if not bulk and rows > 0 and should_window(props, since, until):
+        strategy += f", {math.ceil(rows / props['WINDOW_MAX_ROWS'])} window(s)"
+        window_rows = min(rows, props["WINDOW_MAX_ROWS"])
+    if not bulk and rows > 0 and should_shard(table, window_rows, props):
+        strategy += f", {get_table_setting(table, 'merge_shards')} MERGE shards"
+    elif not bulk and props.get("SCRIPTED_LOAD"):
+        strategy += ", scripted"
+
+    rows_per_second, bytes_per_row, average_seconds = throughput or (None, None, None)
+    landing_rows, landing_bytes = landing or (None, None)
+    if not bytes_per_row and landing_rows:
+        # compressed landing bytes, a lower bound for the in-memory size
+        bytes_per_row = landing_bytes / landing_rows
+    seconds = None
+    if rows >= 0:
+        if rows_per_second:
+            seconds = rows / rows_per_second
+        elif average_seconds is not None:
+            seconds = average_seconds
+
+    size, size_class = get_policy_size(get_active_policy(props) or {}, max(rows, 0))
+    credits_per_hour = get_credits_per_hour(size)
+    return {
+        "TABLE": table,
+        "STRATEGY": strategy,
+        "SINCE": None if bulk else since,
+        "ROWS": rows,
+        "BYTES": rows * bytes_per_row if bytes_per_row and rows >= 0 else None,
+        "LANDING_ROWS": landing_rows,
+        "LANDING_BYTES": landing_bytes,
+        "SECONDS": seconds,
+        "WAREHOUSE_SIZE": f"{size} ({size_class})" if size else None,
+        "CREDITS": seconds / 3600 * credits_per_hour if seconds is not None and credits_per_hour else None,
+    }
+
+
+def format_plan(entry):
+    """
+    Format one table's plan for printing.
+
+    Args:
+        entry (dict): The plan from plan_table.
+
+    Returns:
+        str: The line.
+    """
+    rows = "count failed" if entry["ROWS"] == -1 else f"{entry['ROWS']} rows"
+    size = f", ~{entry['BYTES'] / 2 ** 20:.1f} MiB" if entry["BYTES"] is not None else ""
+    since = f" since {entry['SINCE']}" if entry["SINCE"] else ""
+    landing = (
+        f", landing {entry['LANDING_ROWS']} rows / {(entry['LANDING_BYTES'] or 0) / 2 ** 20:.1f} MiB"
+        if entry["LANDING_ROWS"] is not None
+        else ", no landing table"
+    )
+    duration = f"~{entry['SECONDS'] / 60:.1f} min" if entry["SECONDS"] is not None else "no history"
+    warehouse = f" on {entry['WAREHOUSE_SIZE']}" if entry["WAREHOUSE_SIZE"] else ""
+    credits = f", <= {entry['CREDITS']:.3f} credits" if entry["CREDITS"] is not None else ""
+    return f"{entry['TABLE']}: {entry['STRATEGY']}{since}, {rows}{size}{landing}; {duration}{warehouse}{credits}"
+
+
+def plan_landing(ns_cnxn, sf_cnxn, KEY_TABLES, props, phase_id, workers=1):
+    """
+    Print what a NetSuite-to-Landing run would do, running only read-only estimation queries.
+
+    NetSuite gets one COUNT(*) per table over its watermark window (the whole table for
+    bulk loads), Snowflake one control table read and one INFORMATION_SCHEMA query, and
+    durations come from the local run statistics. Nothing is written, tagged or resized.
+    Credits are an upper bound: the whole duration at the policy's warehouse size.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        sf_cnxn: The Snowflake database connection.
+        KEY_TABLES (list): A list of table names.
+        props (dict): The phase props.
+        phase_id (int): 0 or 1.
+        workers (int): The number of tables loaded in parallel, for the ETA.
+
+    Returns:
+        list: One plan per table, see plan_table.
+    """
+    control_table_df = None
+    if phase_id == 1:
+        control_table_df = fetch_control_table(sf_cnxn, control_table_name=props["CONTROL_TABLE"])
+        if control_table_df is None:
+            return []
+    landing = get_landing_sizes(sf_cnxn, props)
+    landing = landing if landing != -1 else {}
+    throughput = get_throughput(phase_id, KEY_TABLES)
+
+    plan = []
+    for table in KEY_TABLES:
+        since = None
+        if control_table_df is not None:
+            since = check_date_last_modified(df=control_table_df, env=props["ENV"], table_name=table)
+            if since == -1:
+                continue
+        entry = plan_table(ns_cnxn, table, since, phase_id, landing.get(table), throughput.get(table), props)
+        print(format_plan(entry))
+        plan.append(entry)
+
+    expected = {entry["TABLE"]: entry["SECONDS"] for entry in plan if entry["SECONDS"] is not None}
+    total_rows = sum(entry["ROWS"] for entry in plan if entry["ROWS"] > 0)
+    total_bytes = sum(entry["BYTES"] or 0 for entry in plan)
+    total_credits = sum(entry["CREDITS"] or 0 for entry in plan)
+    eta = estimate_eta([entry["TABLE"] for entry in plan], expected, workers) if expected else None
+    print(
+        f"Plan: {len(plan)} table(s), {total_rows} rows, ~{total_bytes / 2 ** 20:.1f} MiB"
+        + (f", estimated {eta / 60:.1f} min" if eta is not None else ", no history for an estimate")
+        + (f", <= {total_credits:.3f} credits" if total_credits else "")
+        + f" ({len(expected)} table(s) with history)"
+    )
+    return plan
@@ -0,0 +1,203 @@
+import csv
+import json
+import weakref
+
+QUERY_TAG_APP = "netsuite-snowflake-elt"
+HISTORY_RESULT_LIMIT = 10000
+
+# the tag last set on each Snowflake session, so unchanged tags cost no round-trip
+SESSION_TAGS = weakref.WeakKeyDictionary()
+
+
+def get_query_tag(props, table=None):
+    """
+    Build the QUERY_TAG for a pipeline statement.
+
+    Args:
+        props (dict): The phase props, holding RUN_ID and PHASE (and ACCOUNT for multi-account runs).
+        table (str, optional): The table the statement works on.
+
+    Returns:
+        str: The tag, a JSON object.
+    """
+    tag = {
+        "app": QUERY_TAG_APP,
+        "run": props.get("RUN_ID"),
+        "phase": props.get("PHASE"),
+        "account": props.get("ACCOUNT"),
+        "table": table,
+    }
+    return json.dumps({key: value for key, value in tag.items() if value is not None})
+
+
+def tag_session(sf_cnxn, props, table=None):
+    """
+    Set QUERY_TAG on the Snowflake session so the following statements are attributed.
+
+    The tag names the table only, so a table's statements share one ALTER SESSION round
+    trip; their stage is Snowflake's QUERY_TYPE, see fetch_query_history. Tagging never
+    fails a load; an error is printed and the statements run untagged.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        props (dict): The phase props, see get_query_tag.
+        table (str, optional): The table the next statements work on.
+
+    Returns:
+        None
+    """
+    tag = get_query_tag(props, table)
+    try:
+        if SESSION_TAGS.get(sf_cnxn) == tag:
+            return
+    except TypeError:
+        pass
+    try:
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute("ALTER SESSION SET QUERY_TAG = %s", (tag,))
+        try:
+            SESSION_TAGS[sf_cnxn] = tag
+        except TypeError:
+            pass
+    except Exception as e:
+        print("QUERY_TAG not set:", e)
+
+
+def fetch_query_history(sf_cnxn, run_id, started_at, database):
+    """
+    Fetch the QUERY_HISTORY rows of one run's tagged statements.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        run_id (str): The run identifier in the tags.
+        started_at (float): The run's start as a Unix timestamp, to bound the history scan.
+        database (str): The database whose INFORMATION_SCHEMA is queried; the session
+            may have no current database.
+
+    Returns:
+        list: One dictionary per statement with TABLE, STAGE (the lower-case QUERY_TYPE,
+            e.g. "merge", "copy" or "insert"), ELAPSED_MS, QUEUED_MS, BYTES_SCANNED,
+            ROWS_PRODUCED and WAREHOUSE_NAME, or -1 if an error occurs.
+    """
+    query = (
+        "SELECT TRY_PARSE_JSON(QUERY_TAG):table::VARCHAR AS TABLE_NAME, "
+        "LOWER(QUERY_TYPE) AS STAGE, "
+        "TOTAL_ELAPSED_TIME, QUEUED_PROVISIONING_TIME + QUEUED_REPAIR_TIME + QUEUED_OVERLOAD_TIME, "
+        "BYTES_SCANNED, ROWS_PRODUCED, WAREHOUSE_NAME "
+        f"FROM TABLE({database}.INFORMATION_SCHEMA.QUERY_HISTORY("
+        f"END_TIME_RANGE_START => TO_TIMESTAMP_LTZ({int(started_at)}), RESULT_LIMIT => {HISTORY_RESULT_LIMIT})) "
+        "WHERE TRY_PARSE_JSON(QUERY_TAG):run::VARCHAR = %s"
+    )
+    try:
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute("ALTER SESSION UNSET QUERY_TAG")
+            sf_cur.execute(query, (run_id,))
+            rows = sf_cur.fetchall()
+        SESSION_TAGS.pop(sf_cnxn, None)
+    except Exception as e:
+        print("Query history not harvested:", e)
+        return -1
+
+    keys = ["TABLE", "STAGE", "ELAPSED_MS", "QUEUED_MS", "BYTES_SCANNED", "ROWS_PRODUCED", "WAREHOUSE_NAME"]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def build_cost_report(history, stats=None):
+    """
+    Aggregate query history per table and stage and join it with the local timings.
+
+    Args:
+        history (list): The rows returned by fetch_query_history.
+        stats (dict, optional): The phase's per-table run statistics (seconds, rows, bytes).
+
+    Returns:
+        list: One dictionary per (table, stage) with QUERIES, ELAPSED_S, QUEUED_S,
+            BYTES_SCANNED, ROWS_PRODUCED and the table's LOCAL_SECONDS, sorted by elapsed time.
+    """
+    stats = stats if isinstance(stats, dict) else {}
+    report = {}
+    for row in history:
+        key = (row["TABLE"] or "-", row["STAGE"] or "-")
+        entry = report.setdefault(
+            key,
+            {
+                "TABLE": key[0],
+                "STAGE": key[1],
+                "QUERIES": 0,
+                "ELAPSED_S": 0.0,
+                "QUEUED_S": 0.0,
+                "BYTES_SCANNED": 0,
+                "ROWS_PRODUCED": 0,
+                "LOCAL_SECONDS": (stats.get(key[0]) or {}).get("seconds"),
+            },
+        )
+        entry["QUERIES"] += 1
+        entry["ELAPSED_S"] += (row["ELAPSED_MS"] or 0) / 1000
+        entry["QUEUED_S"] += (row["QUEUED_MS"] or 0) / 1000
+        entry["BYTES_SCANNED"] += row["BYTES_SCANNED"] or 0
+        entry["ROWS_PRODUCED"] += row["ROWS_PRODUCED"] or 0
+    return sorted(report.values(), key=lambda entry: -entry["ELAPSED_S"])
+
+
+def print_cost_report(report):
+    """
+    Print a cost report.
+
+    Args:
+        report (list): The rows returned by build_cost_report.
+
+    Returns:
+        None
+    """
+    for entry in report:
+        local = f", {entry['LOCAL_SECONDS']:.1f}s local" if entry["LOCAL_SECONDS"] is not None else ""
+        print(
+            f"{entry['TABLE']} [{entry['STAGE']}]: {entry['QUERIES']} queries, "
+            f"{entry['ELAPSED_S']:.1f}s in Snowflake ({entry['QUEUED_S']:.1f}s queued), "
+            f"{entry['BYTES_SCANNED'] / 2 ** 20:.1f} MiB scanned, {entry['ROWS_PRODUCED']} rows{local}"
+        )
+
+
+def write_cost_report(path, report):
+    """
+    Write a cost report as CSV.
+
+    Args:
+        path (str): The output file.
+        report (list): The rows returned by build_cost_report.
+
+    Returns:
+        None
+    """
+    if not report:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(report[0]))
+        writer.writeheader()
+        writer.writerows(report)
+
+
+def harvest_costs(sf_cnxn, props, started_at, stats=None, path=None):
+    """
+    Harvest a run's query history into a cost report, print it and optionally save it.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        props (dict): The phase props, holding RUN_ID and LANDING_DB (STAGING_DB for phase 3).
+        started_at (float): The run's start as a Unix timestamp.
+        stats (dict, optional): The phase's per-table run statistics.
+        path (str, optional): A CSV file to write the report to.
+
+    Returns:
+        list: The cost report, or -1 if the history could not be read.
+    """
+    database = props.get("LANDING_DB") or props["STAGING_DB"]
+    history = fetch_query_history(sf_cnxn, props["RUN_ID"], started_at, database)
+    if history == -1:
+        return -1
+    report = build_cost_report(history, stats)
+    print(f"\nSnowflake cost report for run {props['RUN_ID']}:")
+    print_cost_report(report)
+    if path:
+        write_cost_report(path, report)
+    return report
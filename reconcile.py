@@ -0,0 +1,285 @@
+import math
+from snowflake.connector.pandas_tools import write_pandas
+from incremental_load_transient import merge_snowflake
+from ns_to_sf_transform import transform_data
+from extract import extract, to_dataframe
+from catalog import get_table_setting
+from column_projection import get_table_columns
+from ns_governor import get_governor
+from query_tags import tag_session
+from transient_landing_tables import create_run_table, drop_run_table, new_run_id
+
+RANGE_BUCKETS = 16
+LEAF_ROWS = 5000
+# key ranges per repair DELETE, keeping each statement's OR predicate small
+DELETE_RANGES_PER_STATEMENT = 100
+
+# The same aggregate is valid SQL on SuiteAnalytics (Oracle dialect) and Snowflake.
+# NULLs count as 1970-01-01 00:00:00, which is what transform_data writes to landing.
+DLM_CHECKSUM = "NVL(TO_NUMBER(TO_CHAR(DATE_LAST_MODIFIED, 'YYYYMMDDHH24MISS')), 19700101000000)"
+
+
+def get_key_bounds(cnxn, table_name, pk_col):
+    """
+    Fetch the minimum and maximum primary key of a table.
+
+    Args:
+        cnxn: A NetSuite or Snowflake database connection.
+        table_name (str): The (qualified) name of the table.
+        pk_col (str): The primary key column.
+
+    Returns:
+        tuple: (min_key, max_key), or (None, None) for an empty table.
+    """
+    with cnxn.cursor() as cur:
+        cur.execute(f"SELECT MIN({pk_col}), MAX({pk_col}) FROM {table_name}")
+        lo, hi = cur.fetchone()
+    if lo is None:
+        return None, None
+    return int(lo), int(hi)
+
+
+def range_aggregates(cnxn, table_name, pk_col, lo, hi, width):
+    """
+    Compute row count and DATE_LAST_MODIFIED checksum per sub-range of [lo, hi).
+
+    Args:
+        cnxn: A NetSuite or Snowflake database connection.
+        table_name (str): The (qualified) name of the table.
+        pk_col (str): The primary key column.
+        lo (int): Inclusive lower key bound.
+        hi (int): Exclusive upper key bound.
+        width (int): The width of each sub-range.
+
+    Returns:
+        dict: A dictionary mapping bucket number to a (count, checksum) tuple.
+    """
+    query = (
+        f"SELECT FLOOR(({pk_col} - {lo}) / {width}) AS BUCKET, COUNT(*), SUM({DLM_CHECKSUM}) "
+        f"FROM {table_name} WHERE {pk_col} >= {lo} AND {pk_col} < {hi} "
+        f"GROUP BY FLOOR(({pk_col} - {lo}) / {width})"
+    )
+    with cnxn.cursor() as cur:
+        cur.execute(query)
+        rows = cur.fetchall()
+    return {int(row[0]): (int(row[1]), int(row[2] or 0)) for row in rows}
+
+
+def merge_ranges(ranges):
+    """
+    Merge overlapping and adjacent key ranges.
+
+    Args:
+        ranges (list): A list of (lo, hi) key ranges.
+
+    Returns:
+        list: The merged ranges, sorted.
+    """
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(hi, merged[-1][1]))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def find_drifted_ranges(ns_cnxn, sf_cnxn, table, landing_table, pk_col, lo, hi, buckets=RANGE_BUCKETS):
+    """
+    Recursively narrow [lo, hi) down to the key ranges whose aggregates differ.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the table in NetSuite.
+        landing_table (str): The fully qualified landing table name.
+        pk_col (str): The primary key column.
+        lo (int): Inclusive lower key bound.
+        hi (int): Exclusive upper key bound.
+        buckets (int): The number of sub-ranges each range is split into.
+
+    Returns:
+        list: A sorted list of (lo, hi) key ranges to re-extract, adjacent ranges merged.
+    """
+    drifted = []
+    pending = [(lo, hi)]
+
+    while pending:
+        range_lo, range_hi = pending.pop()
+        width = max(1, math.ceil((range_hi - range_lo) / buckets))
+        ns_aggs = get_governor().run(
+            table, range_aggregates, ns_cnxn, table, pk_col, range_lo, range_hi, width
+        )
+        sf_aggs = range_aggregates(sf_cnxn, landing_table, pk_col, range_lo, range_hi, width)
+
+        for bucket in set(ns_aggs) | set(sf_aggs):
+            ns_agg = ns_aggs.get(bucket, (0, 0))
+            sf_agg = sf_aggs.get(bucket, (0, 0))
+            if ns_agg == sf_agg:
+                continue
+
+            bucket_lo = range_lo + bucket * width
+            bucket_hi = min(bucket_lo + width, range_hi)
+            if width == 1 or max(ns_agg[0], sf_agg[0]) <= LEAF_ROWS:
+                drifted.append((bucket_lo, bucket_hi))
+            else:
+                pending.append((bucket_lo, bucket_hi))
+
+    return merge_ranges(drifted)
+
+
+def fetch_ranges_ns(ns_cnxn, table, pk_col, ranges, select_columns=None):
+    """
+    Fetch the rows of the given key ranges from NetSuite.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        table (str): The name of the table in NetSuite.
+        pk_col (str): The primary key column.
+        ranges (list): A list of (lo, hi) key ranges.
+        select_columns (list, optional): The columns to extract. Defaults to every column.
+
+    Returns:
+        tuple: A list of column names and a DataFrame of the fetched rows.
+    """
+    batches = []
+    for lo, hi in ranges:
+        batches.extend(
+            extract(ns_cnxn, table, columns=select_columns, where=f"{pk_col} >= {lo} AND {pk_col} < {hi}")
+        )
+    df = to_dataframe(batches)
+    return list(df.columns), df
+
+
+def repair_ranges(ns_cnxn, sf_cnxn, table, pk_col, ranges, PRIMARY_KEY_TABLES, props):
+    """
+    Re-extract the drifted key ranges and MERGE them into landing through a run table.
+
+    Landing rows inside the ranges that no longer exist in NetSuite are deleted as well,
+    so a repaired range matches on the next check. The deletes run in statements of at
+    most DELETE_RANGES_PER_STATEMENT ranges.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the table.
+        pk_col (str): The primary key column.
+        ranges (list): A list of (lo, hi) key ranges.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of properties.
+
+    Returns:
+        None
+    """
+    landing_table = f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table}"
+    ranges = merge_ranges(ranges)
+    run_table = create_run_table(sf_cnxn, table, props)
+
+    try:
+        columns, data = fetch_ranges_ns(
+            ns_cnxn, table, pk_col, ranges, get_table_columns(table, PRIMARY_KEY_TABLES, props)
+        )
+        if len(data) > 0:
+            df = transform_data(data, columns, table, PRIMARY_KEY_TABLES)
+            write_pandas(
+                conn=sf_cnxn,
+                df=df,
+                table_name=run_table.split(".")[-1],
+                quote_identifiers=False,
+                database=props["LANDING_DB"],
+                schema=props["TRANSIENT_SCHEMA"],
+            )
+            merge_snowflake(
+                sf_cnxn,
+                sf_data=df,
+                table=table,
+                landing_db=props["LANDING_DB"],
+                landing_schema=props["LANDING_SCHEMA"],
+                source_table=run_table,
+                PRIMARY_KEY_TABLES=PRIMARY_KEY_TABLES,
+            )
+
+        with sf_cnxn.cursor() as sf_cur:
+            for start in range(0, len(ranges), DELETE_RANGES_PER_STATEMENT):
+                range_filter = " OR ".join(
+                    [
+                        f"(TGT.{pk_col} >= {lo} AND TGT.{pk_col} < {hi})"
+                        for lo, hi in ranges[start:start + DELETE_RANGES_PER_STATEMENT]
+                    ]
+                )
+                sf_cur.execute(
+                    f"DELETE FROM {landing_table} TGT WHERE ({range_filter}) "
+                    f"AND NOT EXISTS (SELECT 1 FROM {run_table} SRC WHERE SRC.{pk_col} = TGT.{pk_col})"
+                )
+        sf_cnxn.commit()
+    finally:
+        drop_run_table(sf_cnxn, run_table)
+
+
+def reconcile(ns_cnxn, sf_cnxn, KEY_TABLES, PRIMARY_KEY_TABLES, props):
+    """
+    Compare landing with NetSuite by key-range checksums and repair only the drifted ranges.
+
+    Each table's key space is split into its catalog "partitions" ranges and compared on
+    COUNT(*) and a sum over DATE_LAST_MODIFIED. Only mismatching ranges are split
+    further, until they hold at most LEAF_ROWS rows, and only those are re-extracted.
+
+    Args:
+        ns_cnxn: The NetSuite database connection.
+        sf_cnxn: The Snowflake database connection.
+        KEY_TABLES (list): A list of table names to reconcile.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of properties. Set RECONCILE_REPAIR to False to only report.
+
+    Returns:
+        dict: A dictionary mapping table names to their drifted key ranges.
+    """
+    props = dict(props)
+    props.setdefault("TRANSIENT_SCHEMA", "FINANCE_TRANSIENT")
+    props.setdefault("RUN_ID", new_run_id())
+    repair = props.get("RECONCILE_REPAIR", True)
+    report = {}
+
+    for table in KEY_TABLES:
+        if table not in PRIMARY_KEY_TABLES:
+            print(f"{table}: No primary key configured, skipping reconciliation")
+            continue
+        if not isinstance(PRIMARY_KEY_TABLES[table], str):
+            print(f"{table}: Composite primary key, skipping reconciliation")
+            continue
+        pk_col = PRIMARY_KEY_TABLES[table]
+        landing_table = f"{props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table}"
+
+        try:
+            tag_session(sf_cnxn, props, table)
+            ns_lo, ns_hi = get_governor().run(table, get_key_bounds, ns_cnxn, table, pk_col)
+            sf_lo, sf_hi = get_key_bounds(sf_cnxn, landing_table, pk_col)
+            bounds = [b for b in (ns_lo, ns_hi, sf_lo, sf_hi) if b is not None]
+            if not bounds:
+                print(f"{table}: Empty in NetSuite and Landing")
+                continue
+
+            ranges = find_drifted_ranges(
+                ns_cnxn,
+                sf_cnxn,
+                table,
+                landing_table,
+                pk_col,
+                min(bounds),
+                max(bounds) + 1,
+                get_table_setting(table, "partitions"),
+            )
+            report[table] = ranges
+            if not ranges:
+                print(f"{table}: Landing matches NetSuite")
+                continue
+
+            print(f"{table}: {len(ranges)} drifted key ranges found")
+            if repair:
+                repair_ranges(ns_cnxn, sf_cnxn, table, pk_col, ranges, PRIMARY_KEY_TABLES, props)
+                print(f"{table}: Drifted key ranges re-extracted and merged")
+        except Exception as e:
+            print(f"ERROR in {table}: {e}")
+            continue
+
+    return report
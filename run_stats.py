@@ -0,0 +1,295 @@
+import heapq
+import os
+import sqlite3
+import time
+
+DEFAULT_STATS_DB = "run_stats.db"
+HISTORY_RUNS = 10
+# columns added to RUN_STATS after its first release, added to older stores on open
+RUN_STATS_ADDED_COLUMNS = {"STATEMENTS": "INTEGER", "SNOWFLAKE_MS": "INTEGER"}
+
+
+def connect_stats(path=DEFAULT_STATS_DB):
+    """
+    Open the local run statistics store, creating it if needed.
+
+    Args:
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        sqlite3.Connection: The connection.
+    """
+    cnxn = sqlite3.connect(path, timeout=30)
+    cnxn.execute(
+        "CREATE TABLE IF NOT EXISTS RUN_STATS ("
+        "RUN_ID TEXT, PHASE INTEGER, TABLE_NAME TEXT, STARTED_AT REAL, SECONDS REAL, "
+        "ROWS_LOADED INTEGER, BYTES_LOADED INTEGER, STATEMENTS INTEGER, SNOWFLAKE_MS INTEGER)"
+    )
+    existing = {row[1] for row in cnxn.execute("PRAGMA table_info(RUN_STATS)")}
+    for column, column_type in RUN_STATS_ADDED_COLUMNS.items():
+        if column not in existing:
+            cnxn.execute(f"ALTER TABLE RUN_STATS ADD COLUMN {column} {column_type}")
+    cnxn.execute("CREATE INDEX IF NOT EXISTS RUN_STATS_IDX ON RUN_STATS (PHASE, TABLE_NAME, STARTED_AT)")
+    cnxn.execute(
+        "CREATE TABLE IF NOT EXISTS WAREHOUSE_DECISIONS ("
+        "RUN_ID TEXT, PHASE INTEGER, TABLE_NAME TEXT, STAGE TEXT, WAREHOUSE TEXT, WAREHOUSE_SIZE TEXT, "
+        "SIZE_CLASS TEXT, DECISION TEXT, ROWS_PROCESSED INTEGER, SECONDS REAL, RECORDED_AT REAL)"
+    )
+    cnxn.execute(
+        "CREATE TABLE IF NOT EXISTS CLUSTERING_SNAPSHOTS ("
+        "TABLE_NAME TEXT, CLUSTER_BY TEXT, TOTAL_PARTITIONS INTEGER, CONSTANT_PARTITIONS INTEGER, "
+        "AVERAGE_OVERLAPS REAL, AVERAGE_DEPTH REAL, RECORDED_AT REAL)"
+    )
+    cnxn.execute(
+        "CREATE TABLE IF NOT EXISTS MERGE_SHARDS ("
+        "RUN_ID TEXT, TABLE_NAME TEXT, SHARD INTEGER, SHARDS INTEGER, LOWER_BOUND TEXT, UPPER_BOUND TEXT, "
+        "STATUS TEXT, ATTEMPT INTEGER, ROWS_MERGED INTEGER, ERROR TEXT, RECORDED_AT REAL)"
+    )
+    return cnxn
+
+
+def connect_stats_readonly(path=DEFAULT_STATS_DB):
+    """
+    Open the local run statistics store for reading, without creating or changing it.
+
+    Args:
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        sqlite3.Connection: The read-only connection, or None if the store does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def new_table_stats():
+    """
+    Start the statistics of one table in one run.
+
+    Returns:
+        dict: A dictionary with started, seconds, rows and bytes.
+    """
+    return {"started": time.time(), "seconds": None, "rows": 0, "bytes": 0}
+
+
+def finish_table_stats(table_stats):
+    """
+    Record the elapsed time of a table's statistics.
+
+    Args:
+        table_stats (dict): The statistics returned by new_table_stats.
+
+    Returns:
+        dict: The same statistics, with seconds set.
+    """
+    table_stats["seconds"] = round(time.time() - table_stats["started"], 3)
+    return table_stats
+
+
+def record_stats(run_id, phase, stats, path=DEFAULT_STATS_DB):
+    """
+    Store the per-table statistics of one run.
+
+    Args:
+        run_id (str): The run identifier.
+        phase (int): The phase the statistics belong to.
+        stats (dict): A dictionary mapping table names to dictionaries with
+            seconds, rows and bytes (and optionally started, statements and snowflake_ms).
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        None
+    """
+    if not isinstance(stats, dict) or not stats:
+        return
+    try:
+        cnxn = connect_stats(path)
+        with cnxn:
+            cnxn.executemany(
+                "INSERT INTO RUN_STATS (RUN_ID, PHASE, TABLE_NAME, STARTED_AT, SECONDS, ROWS_LOADED, "
+                "BYTES_LOADED, STATEMENTS, SNOWFLAKE_MS) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_id,
+                        phase,
+                        table,
+                        table_stats.get("started", time.time()),
+                        table_stats.get("seconds"),
+                        table_stats.get("rows"),
+                        table_stats.get("bytes"),
+                        table_stats.get("statements"),
+                        table_stats.get("snowflake_ms"),
+                    )
+                    for table, table_stats in stats.items()
+                ],
+            )
+        cnxn.close()
+    except Exception as e:
+        print("Run statistics not recorded:", e)
+
+
+def record_warehouse_decision(run_id, phase, table, stage, warehouse, size, size_class, decision, rows, seconds, path=DEFAULT_STATS_DB):
+    """
+    Log a warehouse policy decision with the timing of the stage it applied to.
+
+    Args:
+        run_id (str): The run identifier.
+        phase (int): The phase.
+        table (str): The table, or None for phase-wide stages.
+        stage (str): The stage.
+        warehouse (str): The warehouse the stage ran on.
+        size (str): The size the policy asked for, or None.
+        size_class (str): "default" or "large".
+        decision (str): What was changed, e.g. "resized XSMALL -> MEDIUM".
+        rows (int): The rows the stage processed, if known.
+        seconds (float): The stage's duration, resize time included.
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        None
+    """
+    try:
+        cnxn = connect_stats(path)
+        with cnxn:
+            cnxn.execute(
+                "INSERT INTO WAREHOUSE_DECISIONS VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, phase, table, stage, warehouse, size, size_class, decision, rows, round(seconds, 3), time.time()),
+            )
+        cnxn.close()
+    except Exception as e:
+        print("Warehouse decision not recorded:", e)
+
+
+def get_expected_seconds(phase, tables=None, path=DEFAULT_STATS_DB, history=HISTORY_RUNS):
+    """
+    Estimate each table's duration from the average of its most recent runs in a phase.
+
+    Read-only, so a --plan run leaves no store behind.
+
+    Args:
+        phase (int): The phase.
+        tables (list, optional): The table names. Defaults to every table with history.
+        path (str): The path of the SQLite database file.
+        history (int): The number of recent runs to average.
+
+    Returns:
+        dict: A dictionary mapping table names with history to their expected seconds.
+    """
+    try:
+        cnxn = connect_stats_readonly(path)
+        if cnxn is None:
+            return {}
+        rows = cnxn.execute(
+            "SELECT TABLE_NAME, AVG(SECONDS) FROM ("
+            "SELECT TABLE_NAME, SECONDS, ROW_NUMBER() OVER (PARTITION BY TABLE_NAME ORDER BY STARTED_AT DESC) AS RN "
+            "FROM RUN_STATS WHERE PHASE = ? AND SECONDS IS NOT NULL) WHERE RN <= ? GROUP BY TABLE_NAME",
+            (phase, history),
+        ).fetchall()
+        cnxn.close()
+    except Exception as e:
+        print("Run statistics not available:", e)
+        return {}
+    expected = dict(rows)
+    if tables is not None:
+        expected = {table: expected[table] for table in tables if table in expected}
+    return expected
+
+
+def get_throughput(phase, tables=None, path=DEFAULT_STATS_DB, history=HISTORY_RUNS):
+    """
+    Read each table's recent load throughput, without creating or changing the store.
+
+    Args:
+        phase (int): The phase.
+        tables (list, optional): The table names. Defaults to every table with history.
+        path (str): The path of the SQLite database file.
+        history (int): The number of recent runs to aggregate.
+
+    Returns:
+        dict: A dictionary mapping table names to (rows per second, bytes per row, average
+            seconds per run); the rates are None when no rows were recorded.
+    """
+    try:
+        cnxn = connect_stats_readonly(path)
+        if cnxn is None:
+            return {}
+        rows = cnxn.execute(
+            "SELECT TABLE_NAME, SUM(ROWS_LOADED), SUM(BYTES_LOADED), SUM(SECONDS), AVG(SECONDS) FROM ("
+            "SELECT TABLE_NAME, ROWS_LOADED, BYTES_LOADED, SECONDS, "
+            "ROW_NUMBER() OVER (PARTITION BY TABLE_NAME ORDER BY STARTED_AT DESC) AS RN "
+            "FROM RUN_STATS WHERE PHASE = ? AND SECONDS IS NOT NULL) WHERE RN <= ? GROUP BY TABLE_NAME",
+            (phase, history),
+        ).fetchall()
+        cnxn.close()
+    except Exception as e:
+        print("Run statistics not available:", e)
+        return {}
+    throughput = {
+        table: (
+            total_rows / total_seconds if total_rows and total_seconds else None,
+            total_bytes / total_rows if total_rows and total_bytes else None,
+            avg_seconds,
+        )
+        for table, total_rows, total_bytes, total_seconds, avg_seconds in rows
+    }
+    if tables is not None:
+        throughput = {table: throughput[table] for table in tables if table in throughput}
+    return throughput
+
+
+def order_longest_first(tables, expected):
+    """
+    Order tables by expected duration, longest first, so big tables never start last.
+
+    Tables without history go first, since they may well be the biggest.
+
+    Args:
+        tables (list): The table names.
+        expected (dict): A dictionary mapping table names to expected seconds.
+
+    Returns:
+        list: The reordered table names.
+    """
+    return sorted(tables, key=lambda table: -expected.get(table, float("inf")))
+
+
+def estimate_eta(tables, expected, workers=1):
+    """
+    Estimate the wall-clock duration of a run by simulating longest-first scheduling.
+
+    Args:
+        tables (list): The table names, in the order they will start.
+        expected (dict): A dictionary mapping table names to expected seconds.
+        workers (int): The number of tables loaded in parallel.
+
+    Returns:
+        float: The estimated seconds, counting tables without history as the average table.
+    """
+    default = sum(expected.values()) / len(expected) if expected else 0.0
+    finish_times = [0.0] * max(1, workers)
+    for table in tables:
+        earliest = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, earliest + expected.get(table, default))
+    return max(finish_times)
+
+
+def plan_run(phase, tables, workers=1, path=DEFAULT_STATS_DB):
+    """
+    Reorder a run's tables longest-first and print its ETA.
+
+    Args:
+        phase (int): The phase.
+        tables (list): The table names.
+        workers (int): The number of tables loaded in parallel.
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        list: The reordered table names.
+    """
+    expected = get_expected_seconds(phase, tables, path)
+    ordered = order_longest_first(tables, expected)
+    if expected:
+        eta = estimate_eta(ordered, expected, workers)
+        print(f"Phase {phase}: {len(ordered)} table(s), estimated {eta / 60:.1f} min ({len(expected)} with history)")
+    return ordered
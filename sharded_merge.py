@@ -0,0 +1,209 @@
+import decimal
+import time
+from catalog import get_table_setting
+from conn_util import execute_async_statements
+from run_stats import DEFAULT_STATS_DB, connect_stats
+
+DEFAULT_MERGE_SHARDS = {"MIN_ROWS": 1000000, "CONCURRENCY": 1, "RETRIES": 2}
+
+
+def get_merge_shard_settings(props):
+    """
+    Read a phase's MERGE_SHARDS settings, defaults applied.
+
+    Args:
+        props (dict): The phase props.
+
+    Returns:
+        dict: MIN_ROWS (the smallest batch that is sharded), CONCURRENCY (the shards in
+            flight at a time) and RETRIES (the extra attempts of a failed shard).
+    """
+    return {**DEFAULT_MERGE_SHARDS, **(props.get("MERGE_SHARDS") or {})}
+
+
+def should_shard(table, rows, props):
+    """
+    Check whether a batch is merged in key-range shards.
+
+    Args:
+        table (str): The name of the table.
+        rows (int): The number of rows in the batch.
+        props (dict): The phase props.
+
+    Returns:
+        bool: True if the table has merge_shards above 1 in the catalog and the batch
+            has at least MIN_ROWS rows.
+    """
+    return get_table_setting(table, "merge_shards") > 1 and rows >= get_merge_shard_settings(props)["MIN_ROWS"]
+
+
+def to_sql_literal(value):
+    """
+    Render a key value as a SQL literal.
+
+    Args:
+        value (object): The value, as fetched from Snowflake.
+
+    Returns:
+        str: The literal.
+    """
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def get_shard_bounds(sf_cnxn, source_table, key, shards):
+    """
+    Split a batch's keys into ranges of about equal row counts.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        source_table (str): The table holding the batch.
+        key (str): The key column to shard on.
+        shards (int): The number of shards.
+
+    Returns:
+        list: The distinct upper bounds of the ranges, ascending.
+    """
+    with sf_cnxn.cursor() as sf_cur:
+        sf_cur.execute(
+            f"SELECT MAX({key}) FROM (SELECT {key}, NTILE({int(shards)}) OVER (ORDER BY {key}) AS SHARD "
+            f"FROM {source_table} WHERE {key} IS NOT NULL) GROUP BY SHARD ORDER BY SHARD"
+        )
+        bounds = [row[0] for row in sf_cur.fetchall()]
+    return [bound for i, bound in enumerate(bounds) if i == 0 or bound != bounds[i - 1]]
+
+
+def get_shard_ranges(bounds):
+    """
+    Turn the upper bounds into (lower, upper] ranges covering every key.
+
+    The first range is open below (and takes NULL keys), the last is open above, so rows
+    outside the sampled bounds are never dropped.
+
+    Args:
+        bounds (list): The upper bounds from get_shard_bounds.
+
+    Returns:
+        list: A list of (lower, upper) tuples; None marks an open end.
+    """
+    if len(bounds) < 2:
+        return [(None, None)]
+    lowers = [None] + bounds[:-1]
+    uppers = bounds[:-1] + [None]
+    return list(zip(lowers, uppers))
+
+
+def get_range_predicate(column, lower, upper):
+    """
+    Build the predicate selecting one key range.
+
+    Args:
+        column (str): The (qualified) key column.
+        lower (object): The exclusive lower bound, or None.
+        upper (object): The inclusive upper bound, or None.
+
+    Returns:
+        str: The predicate, or None for the whole table.
+    """
+    predicates = []
+    if lower is not None:
+        predicates.append(f"{column} > {to_sql_literal(lower)}")
+    if upper is not None:
+        predicates.append(f"{column} <= {to_sql_literal(upper)}")
+    if not predicates:
+        return None
+    predicate = " AND ".join(predicates)
+    return f"{predicate} OR {column} IS NULL" if lower is None else predicate
+
+
+def record_merge_shard(run_id, table, shard, shards, lower, upper, status, attempt, merged, error=None, path=DEFAULT_STATS_DB):
+    """
+    Log the outcome of one attempt at one MERGE shard.
+
+    Args:
+        run_id (str): The run identifier.
+        table (str): The table name.
+        shard (int): The shard number, from 1.
+        shards (int): The number of shards.
+        lower (object): The exclusive lower key bound, or None.
+        upper (object): The inclusive upper key bound, or None.
+        status (str): "merged" or "failed".
+        attempt (int): The attempt number, from 1.
+        merged (int): The rows inserted or updated, if merged.
+        error (str, optional): The error message, if failed.
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        None
+    """
+    try:
+        cnxn = connect_stats(path)
+        with cnxn:
+            cnxn.execute(
+                "INSERT INTO MERGE_SHARDS VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    table,
+                    shard,
+                    shards,
+                    None if lower is None else str(lower),
+                    None if upper is None else str(upper),
+                    status,
+                    attempt,
+                    merged,
+                    error,
+                    time.time(),
+                ),
+            )
+        cnxn.close()
+    except Exception as e:
+        print("Merge shard not recorded:", e)
+
+
+def run_shards(sf_cnxn, table, shards, props):
+    """
+    Run the MERGE shards of one batch, retrying failed shards on their own.
+
+    Shards run as asynchronous queries on the session, at most CONCURRENCY at a time.
+    Snowflake serialises DML on one table, so concurrency mainly overlaps compilation
+    and pruning; the gain of sharding is that every shard is a short statement that
+    commits on its own, and only a failed shard is run again. Every attempt is printed
+    and logged in MERGE_SHARDS.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the table.
+        shards (list): A list of (query, lower, upper) tuples, one per shard.
+        props (dict): The phase props.
+
+    Returns:
+        tuple: The rows inserted or updated and the number of MERGE statements issued.
+
+    Raises:
+        RuntimeError: If shards still fail after RETRIES further attempts; the shards
+            that merged stay merged, and MERGE is idempotent, so the batch can be rerun.
+    """
+    settings = get_merge_shard_settings(props)
+    pending = dict(enumerate(shards, start=1))
+    merged = statements = 0
+    for attempt in range(1, int(settings["RETRIES"]) + 2):
+        if not pending:
+            break
+        results, failures = execute_async_statements(
+            sf_cnxn, [(shard, query) for shard, (query, _, _) in pending.items()], int(settings["CONCURRENCY"])
+        )
+        statements += len(pending)
+        for shard, row in results.items():
+            _, lower, upper = pending.pop(shard)
+            rows = sum(row or ())
+            merged += rows
+            print(f"{table}: Shard {shard}/{len(shards)} ({lower}, {upper}] merged {row}")
+            record_merge_shard(props.get("RUN_ID"), table, shard, len(shards), lower, upper, "merged", attempt, rows)
+        for shard, error in failures.items():
+            _, lower, upper = pending[shard]
+            print(f"{table}: Shard {shard}/{len(shards)} ({lower}, {upper}] failed (attempt {attempt}) - {error}")
+            record_merge_shard(props.get("RUN_ID"), table, shard, len(shards), lower, upper, "failed", attempt, None, error)
+    if pending:
+        raise RuntimeError(f"{table}: {len(pending)} of {len(shards)} MERGE shard(s) failed: {sorted(pending)}")
+    return merged, statements
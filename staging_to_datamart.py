@@ -1,5 +1,8 @@
 from collections import OrderedDict
 from datetime import datetime
+from accounts import ACCOUNT_COLUMN, ensure_account_column
+from run_stats import finish_table_stats, new_table_stats
+from query_tags import tag_session
 
 
 def get_target_info(sf_cnxn, DATAMART_DB, DATAMART_SCHEMA):
@@ -38,6 +41,7 @@ def upsert_data(
     STAGING_SCHEMA,
     source_view,
     column_list,
+    keys=("DW_KEY_ID",),
 ):
     """
     Upserts data from the staging table to the target table in the datamart.
@@ -51,6 +55,7 @@ def upsert_data(
         STAGING_SCHEMA (str): The name of the staging schema.
         source_view (str): The name of the source view in the staging schema.
         column_list (list): A list of column names to be upserted.
+        keys (tuple): The columns the rows are matched on.
 
     Returns:
         res: The result of the upsert operation.
@@ -64,7 +69,7 @@ def upsert_data(
                     SELECT {', '.join([f'{col} as {col}' for col in column_list])} 
                     FROM {STAGING_DB}.{STAGING_SCHEMA}.{source_view}
                     ) AS source
-                ON target.DW_KEY_ID = source.DW_KEY_ID
+                ON {' AND '.join([f'target.{key} = source.{key}' for key in keys])}
                 WHEN MATCHED THEN
                     UPDATE SET {', '.join([f'target.{col}=source.{col}' for col in column_list])}
                 WHEN NOT MATCHED THEN
@@ -119,17 +124,23 @@ def get_common_columns(sf_cnxn, source, target, STAGING_DB, DATAMART_DB):
         return -1
 
 
-def staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS):
+def staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS, tables=None):
     """
     Transfers data from staging to the datamart for the specified source view and target tables.
 
+    With ACCOUNT_COLUMN in props (several NetSuite accounts share the staging tables),
+    the target tables get accounts.ACCOUNT_COLUMN and rows are matched on it as well as
+    DW_KEY_ID, since internal IDs collide across accounts.
+
     Args:
         sf_cnxn: The Snowflake database connection object.
         props (dict): A dictionary containing various properties.
         SOURCE_VIEW_KEYS (dict): A dictionary containing the source view names as keys and target table names as values.
+        tables (list, optional): Only upsert from the VW_STG_<table> views of these tables.
 
     Returns:
-        int: -1 if an error occurred, otherwise None.
+        int or dict: -1 if an error occurred, otherwise a dictionary mapping each upserted
+            table (the VW_STG_ suffix) to its run statistics (started, seconds, rows).
 
     """
     STAGING_DB = props["STAGING_DB"]
@@ -137,6 +148,7 @@ def staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS):
     DATAMART_DB = props["DATAMART_DB"]
     DATAMART_SCHEMA = props["DATAMART_SCHEMA"]
 
+    tag_session(sf_cnxn, props)
     TARGET_TABLE_KEYS = get_target_info(sf_cnxn, DATAMART_DB, DATAMART_SCHEMA)
 
     if TARGET_TABLE_KEYS == -1:
@@ -146,8 +158,23 @@ def staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS):
     SOURCE_VIEW_KEYS = OrderedDict(sorted(SOURCE_VIEW_KEYS.items()))
     SOURCE_TARGET_SET = dict(zip(TARGET_TABLE_KEYS, SOURCE_VIEW_KEYS.keys()))
 
+    if tables:
+        # filter after pairing, the pairing relies on both full sorted lists
+        SOURCE_TARGET_SET = {
+            target: source
+            for target, source in SOURCE_TARGET_SET.items()
+            if source in [f"VW_STG_{table}" for table in tables]
+        }
+
+    if props.get("ACCOUNT_COLUMN"):
+        ensure_account_column(sf_cnxn, [f"{DATAMART_DB}.{DATAMART_SCHEMA}.{target}" for target in SOURCE_TARGET_SET])
+
+    stats = {}
     for target_table, source_view in SOURCE_TARGET_SET.items():
+        table_stats = new_table_stats()
+        tag_table = source_view.replace("VW_STG_", "", 1)
         try:
+            tag_session(sf_cnxn, props, tag_table)
             column_list = get_common_columns(
                 sf_cnxn, source_view, target_table, STAGING_DB, DATAMART_DB
             )
@@ -155,6 +182,7 @@ def staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS):
                 print(f"{source_view}, {target_table}: Columns List Fetching Failed!!!")
                 continue
             column_list.remove("DW_INSERT_DT")
+            keys = ("DW_KEY_ID", ACCOUNT_COLUMN) if ACCOUNT_COLUMN in column_list else ("DW_KEY_ID",)
 
             res = upsert_data(
                 sf_cnxn,
@@ -165,6 +193,7 @@ def staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS):
                 STAGING_SCHEMA,
                 source_view,
                 column_list,
+                keys,
             )
             if res == -1:
                 print(
@@ -176,9 +205,14 @@ def staging_to_datamart(sf_cnxn, props, SOURCE_VIEW_KEYS):
                     f"Upsert from {STAGING_DB}.{STAGING_SCHEMA}.{source_view} to {DATAMART_DB}.{DATAMART_SCHEMA}.{target_table} Completed!!"
                 )
                 print(f"{res[0]} rows Inserted and {res[1]} rows Updated")
+                table_stats["rows"] = res[0] + res[1]
+                table_stats["bytes"] = None
+                stats[tag_table] = finish_table_stats(table_stats)
         except Exception as e:
             print(
                 f"{STAGING_DB}.{STAGING_SCHEMA}.{source_view}, {DATAMART_DB}.{DATAMART_SCHEMA}.{target_table}:",
                 e,
             )
             continue
+
+    return stats
@@ -1,66 +1,32 @@
-NETSUITE_TABLES = [
-    "ACCOUNTING_PERIODS",
-    "ACCOUNTS",
-    "CURRENCIES",
-    "CUSTOMERS",
-    "SUBSIDIARIES",
-    "TRANSACTIONS",
-    "TRANSACTION_LINES",
-    "DEPARTMENTS",
-    "INVOICES",
-    "VENDORS",
-    "ENTITY",
-    "ITEMS"
-]
+from catalog import get_catalog
 
-PRIMARY_KEY_TABLES = {
-    "ACCOUNTING_PERIODS": "ACCOUNTING_PERIOD_ID",
-    "ACCOUNTS": "ACCOUNT_ID",
-    "CURRENCIES": "CURRENCY_ID",
-    "SUBSIDIARIES": "SUBSIDIARY_ID",
-    "TRANSACTIONS": "TRANSACTION_ID",
-    "TRANSACTION_LINES": "TRANSACTION_LINE_ID",
-    "DEPARTMENTS": "DEPARTMENT_ID",
-    "VENDORS": "VENDOR_ID",
-    "ENTITY": "ENTITY_ID",
-    "ITEMS": "ITEM_ID",
-    "CUSTOMERS": "CUSTOMER_ID",
-}
-
-SF_DATATYPES = {
-    "VARCHAR2": "VARCHAR",
-    "NUMBER": "NUMBER",
-    "STRING": "VARCHAR",
-    "TIMESTAMP": "TIMESTAMP_NTZ(9)",
-    "DATE": "TIMESTAMP_NTZ(9)",
-    "INT": "NUMBER",
-}
-
-SOURCE_VIEW_KEYS = {
-    "VW_STG_ACCOUNTING_PERIODS": "ACCOUNTING_PERIOD_ID",
-    "VW_STG_ACCOUNTS": "ACCOUNT_ID",
-    "VW_STG_CURRENCIES": "CURRENCY_ID",
-    "VW_STG_COA": "DW_KEY_ID",
-    "VW_STG_SUBSIDIARIES": "SUBSIDIARY_ID",
-    "VW_STG_DEPARTMENTS": "DEPARTMENT_ID",
-    "VW_STG_VENDORS": "VENDOR_ID",
-    "VW_STG_ENTITY": "ENTITY_ID",
-    "VW_STG_ITEMS": "ITEM_ID",
-    "VW_STG_CUSTOMERS": "CUSTOMER_ID",
-}
+# Table lists, keys, data types and phase props live in catalog.json (see catalog.py).
+# Set ELT_ENV (or main.py --env) to pick an environment and ELT_CATALOG to use another file.
 
 
 def getNetsuiteTables():
-    return NETSUITE_TABLES
+    return get_catalog()["NETSUITE_TABLES"]
 
 
 def getPrimaryKeyTables():
-    return PRIMARY_KEY_TABLES
+    return get_catalog()["PRIMARY_KEY_TABLES"]
 
 
 def getDataTypes():
-    return SF_DATATYPES
+    return get_catalog()["SF_DATATYPES"]
 
 
 def getSourceViewKeys():
-    return SOURCE_VIEW_KEYS
+    return get_catalog()["SOURCE_VIEW_KEYS"]
+
+
+def getColumnAllowlists():
+    return get_catalog()["COLUMN_ALLOWLISTS"]
+
+
+def getPhaseProps():
+    return get_catalog()["PHASE_PROPS"]
+
+
+def getTableSettings():
+    return get_catalog()["TABLES"]
@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# the pipeline modules are flat scripts in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def unthrottled_governor(monkeypatch):
+    """Run NetSuite queries through a governor without the production rate limit."""
+    import ns_governor
+
+    governor = ns_governor.NetSuiteGovernor(rate=1000, burst=1000)
+    monkeypatch.setattr(ns_governor.THREAD_GOVERNOR, "governor", governor, raising=False)
+    return governor
@@ -0,0 +1,452 @@
+"""
+Stand-ins for Snowflake connections, so the pipeline's SQL handling can be tested offline.
+"""
+import re
+
+
+class OdbcError(Exception):
+    """
+    Stands in for pyodbc.Error, which the governor recognises by module and class name.
+    """
+
+
+OdbcError.__module__, OdbcError.__name__ = "pyodbc", "Error"
+
+
+def odbc_error(sqlstate, message=""):
+    """
+    Build a pyodbc-style error, whose args are the SQLSTATE and the driver message.
+
+    Args:
+        sqlstate (str): The SQLSTATE.
+        message (str): The driver message.
+
+    Returns:
+        Exception: The error.
+    """
+    return type("OperationalError", (OdbcError,), {"__module__": "pyodbc"})(sqlstate, message)
+
+
+class FakeClock:
+    """
+    A monotonic clock whose sleep advances it, to test rate limits and backoff without waiting.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeCursor:
+    """
+    A cursor that records its statements on the connection and returns the connection's answers.
+    """
+
+    def __init__(self, cnxn):
+        self.cnxn = cnxn
+        self.rows = []
+        self.description = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query, params=None):
+        self.cnxn.executed.append((" ".join(query.split()), params))
+        result = self.cnxn.respond(query, params)
+        self.description, self.rows = result[:2]
+        self.rowcount = result[2] if len(result) > 2 else len(self.rows)
+        return self
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeSnowflakeConnection:
+    """
+    A snowflake.connector connection that runs nothing; subclasses answer the queries they emulate.
+    """
+
+    def __init__(self):
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+    def respond(self, query, params):
+        """
+        Answer a statement.
+
+        Args:
+            query (str): The statement.
+            params (tuple): Its bind parameters, or None.
+
+        Returns:
+            tuple: The cursor description (column tuples), the result rows and optionally
+                the rowcount, which defaults to the number of rows.
+        """
+        return [], []
+
+    def statements(self, text):
+        """
+        List the executed statements containing a text.
+
+        Args:
+            text (str): The text to look for.
+
+        Returns:
+            list: The matching statements, whitespace collapsed.
+        """
+        return [query for query, _ in self.executed if text in query]
+
+
+class AsyncCursor(FakeCursor):
+    """
+    A cursor that also submits asynchronous queries to an AsyncConnection.
+    """
+
+    sfqid = None
+
+    def execute_async(self, query):
+        self.sfqid = self.cnxn.submit(query)
+        return self
+
+    def get_results_from_sfqid(self, sfqid):
+        self.rows = list(self.cnxn.finished[sfqid])
+
+
+class AsyncConnection(FakeSnowflakeConnection):
+    """
+    Runs asynchronous queries that finish after a number of status polls.
+
+    Args:
+        fail (dict, optional): Maps a query substring to how many times matching queries
+            fail when they finish; -1 fails them every time.
+        reject (tuple, optional): Query substrings whose submission raises.
+        polls (int): The status polls a query stays RUNNING for.
+        result (tuple): The single result row of every query.
+    """
+
+    def __init__(self, fail=None, reject=(), polls=1, result=(1, 0)):
+        super().__init__()
+        self.fail = dict(fail or {})
+        self.reject = reject
+        self.polls = polls
+        self.result = result
+        self.running = {}
+        self.finished = {}
+        self.failed = {}
+        self.max_in_flight = 0
+
+    def cursor(self):
+        return AsyncCursor(self)
+
+    def submit(self, query):
+        self.executed.append((" ".join(query.split()), None))
+        if any(text in query for text in self.reject):
+            raise RuntimeError("SQL compilation error")
+        sfqid = f"q{len(self.executed)}"
+        self.running[sfqid] = [query, self.polls]
+        self.max_in_flight = max(self.max_in_flight, len(self.running))
+        return sfqid
+
+    def get_query_status(self, sfqid):
+        if sfqid in self.running:
+            entry = self.running[sfqid]
+            entry[1] -= 1
+            if entry[1] >= 0:
+                return "RUNNING"
+            del self.running[sfqid]
+            for text, times in self.fail.items():
+                if text in entry[0] and times != 0:
+                    self.fail[text] = times - 1
+                    self.failed[sfqid] = f"{text} failed"
+                    return "FAILED_WITH_ERROR"
+            self.finished[sfqid] = [self.result]
+        return "FAILED_WITH_ERROR" if sfqid in self.failed else "SUCCESS"
+
+    def is_still_running(self, status):
+        return status == "RUNNING"
+
+    def get_query_status_throw_if_error(self, sfqid):
+        if sfqid in self.failed:
+            raise RuntimeError(self.failed[sfqid])
+
+
+class QueryHistoryConnection(FakeSnowflakeConnection):
+    """
+    Answers INFORMATION_SCHEMA.QUERY_HISTORY with canned rows, filtered on the run in the QUERY_TAG.
+
+    Args:
+        history (list): One dictionary per statement with run, table, stage, elapsed_ms,
+            queued_ms, bytes_scanned, rows_produced and warehouse.
+    """
+
+    COLUMNS = ["table", "stage", "elapsed_ms", "queued_ms", "bytes_scanned", "rows_produced", "warehouse"]
+
+    def __init__(self, history):
+        super().__init__()
+        self.history = history
+
+    def respond(self, query, params):
+        if "INFORMATION_SCHEMA.QUERY_HISTORY" not in query:
+            return [], []
+        rows = [
+            tuple(entry.get(column) for column in self.COLUMNS)
+            for entry in self.history
+            if entry["run"] == params[0]
+        ]
+        return [(column.upper(),) for column in self.COLUMNS], rows
+
+
+class ModifiedRowsConnection(FakeSnowflakeConnection):
+    """
+    A NetSuite connection answering COUNT(*) over DATE_LAST_MODIFIED windows of canned rows.
+
+    Args:
+        modified (list): The DATE_LAST_MODIFIED of every row, as "YYYY-MM-DD HH:MM:SS".
+    """
+
+    def __init__(self, modified):
+        super().__init__()
+        self.modified = modified
+
+    def respond(self, query, params):
+        since = re.search(r"DATE_LAST_MODIFIED > '([^']+)'", query)
+        until = re.search(r"DATE_LAST_MODIFIED <= '([^']+)'", query)
+        rows = [
+            value
+            for value in self.modified
+            if (not since or value > since.group(1)) and (not until or value <= until.group(1))
+        ]
+        return [("COUNT(*)",)], [(len(rows),)]
+
+
+class KeyRangeConnection(FakeSnowflakeConnection):
+    """
+    Answers reconcile's key bound and per-bucket aggregate queries over canned rows.
+
+    Args:
+        rows (dict): A dictionary mapping primary keys to their DATE_LAST_MODIFIED checksum.
+    """
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+
+    def respond(self, query, params):
+        match = re.search(r"FLOOR\(\(\w+ - (-?\d+)\) / (\d+)\).*>= (-?\d+) AND \w+ < (-?\d+)", query)
+        if match:
+            base, width, lo, hi = (int(group) for group in match.groups())
+            buckets = {}
+            for key, checksum in self.rows.items():
+                if lo <= key < hi:
+                    count, total = buckets.get((key - base) // width, (0, 0))
+                    buckets[(key - base) // width] = (count + 1, total + checksum)
+            return [("BUCKET",), ("COUNT(*)",), ("SUM",)], [(bucket, *agg) for bucket, agg in buckets.items()]
+        if query.startswith("SELECT MIN("):
+            return [("MIN",), ("MAX",)], [(min(self.rows, default=None), max(self.rows, default=None))]
+        return [], []
+
+
+class WarehouseConnection(FakeSnowflakeConnection):
+    """
+    Emulates one warehouse's size and auto-suspend for SHOW WAREHOUSES and ALTER WAREHOUSE.
+
+    Args:
+        warehouse (str): The session's warehouse.
+        size (str): Its size, as SHOW WAREHOUSES prints it.
+        auto_suspend (int): Its auto-suspend seconds.
+    """
+
+    def __init__(self, warehouse="WH", size="X-Small", auto_suspend=600):
+        super().__init__()
+        self.warehouse = warehouse
+        self.size = size
+        self.auto_suspend = auto_suspend
+
+    def respond(self, query, params):
+        if query == "SELECT CURRENT_WAREHOUSE()":
+            return [("CURRENT_WAREHOUSE()",)], [(self.warehouse,)]
+        if query.startswith("SHOW WAREHOUSES"):
+            return [("name",), ("size",), ("auto_suspend",)], [(self.warehouse, self.size, self.auto_suspend)]
+        match = re.match(r"ALTER WAREHOUSE \S+ SET WAREHOUSE_SIZE = '(\w+)' WAIT_FOR_COMPLETION = TRUE(?: AUTO_SUSPEND = (\d+))?$", query)
+        if match:
+            self.size = match.group(1)
+            if match.group(2):
+                self.auto_suspend = int(match.group(2))
+        return [], []
+
+
+class StreamConnection(FakeSnowflakeConnection):
+    """
+    Emulates landing objects with STREAMs on them and the staging tables loaded from the streams.
+
+    A stream's offset is a position in its source's change log. Reading the stream returns
+    the net changes since the offset, an update as a DELETE + INSERT pair with
+    METADATA$ISUPDATE set. The offset advances only when a DML statement that read the
+    stream commits: at COMMIT inside an explicit transaction, at once outside one.
+    ROLLBACK discards the staging changes and keeps the offset.
+
+    Args:
+        schema (str): The landing schema, DB.SCHEMA, the streams are shown in.
+    """
+
+    def __init__(self, schema):
+        super().__init__()
+        self.schema = schema.upper()
+        self.logs = {}
+        self.streams = {}
+        self.staging = {}
+        self.transaction = None
+        self.fail_on = None
+
+    def change(self, source, key, row):
+        """
+        Apply a change to a landing object, as phase 1 would.
+
+        Args:
+            source (str): The fully qualified landing table or view.
+            key (object): The row's primary key.
+            row (dict): The new row image, or None to delete the row.
+
+        Returns:
+            None
+        """
+        self.logs.setdefault(source.upper(), []).append((key, row))
+
+    def state(self, source, end=None):
+        """
+        Replay a landing object's change log.
+
+        Args:
+            source (str): The fully qualified landing object.
+            end (int, optional): Replay only the first end changes.
+
+        Returns:
+            dict: The rows by key.
+        """
+        rows = {}
+        for key, row in self.logs.get(source, [])[:end]:
+            if row is None:
+                rows.pop(key, None)
+            else:
+                rows[key] = row
+        return rows
+
+    def stream_rows(self, stream):
+        """
+        Read the net changes in a stream since its offset.
+
+        Args:
+            stream (str): The fully qualified stream name.
+
+        Returns:
+            list: (METADATA$ACTION, METADATA$ISUPDATE, row) tuples.
+        """
+        source, offset = self.streams[stream]["source"], self.streams[stream]["offset"]
+        before, after = self.state(source, offset), self.state(source)
+        changes = []
+        for key in sorted(set(before) | set(after)):
+            if before.get(key) == after.get(key):
+                continue
+            update = key in before and key in after
+            if key in before:
+                changes.append(("DELETE", update, before[key]))
+            if key in after:
+                changes.append(("INSERT", update, after[key]))
+        return changes
+
+    def make_stale(self, stream):
+        """Mark a stream stale, as when its offset falls outside the source's retention."""
+        self.streams[stream.upper()]["stale"] = True
+
+    def has_data(self, stream):
+        """Check a stream for unconsumed changes, as SYSTEM$STREAM_HAS_DATA does."""
+        return bool(self.stream_rows(stream.upper()))
+
+    def respond(self, query, params):
+        query = " ".join(query.split())
+        if self.fail_on and self.fail_on in query:
+            self.fail_on = None
+            raise RuntimeError(f"Emulated failure of: {query}")
+
+        if query.startswith("SHOW STREAMS IN SCHEMA"):
+            rows = [
+                (name.split(".")[-1], str(stream["stale"]).lower())
+                for name, stream in self.streams.items()
+                if name.startswith(self.schema + ".")
+            ]
+            return [("name",), ("stale",)], rows
+
+        match = re.match(r"CREATE OR REPLACE STREAM (\S+) ON (?:TABLE|VIEW) (\S+)$", query)
+        if match:
+            stream, source = match.group(1).upper(), match.group(2).upper()
+            self.streams[stream] = {"source": source, "offset": len(self.logs.get(source, [])), "stale": False}
+            return [], []
+
+        match = re.match(r"SELECT SYSTEM\$STREAM_HAS_DATA\('(\S+)'\)$", query)
+        if match:
+            return [("SYSTEM$STREAM_HAS_DATA",)], [(self.has_data(match.group(1)),)]
+
+        if query == "BEGIN TRANSACTION":
+            self.transaction = {"staging": dict(self.staging), "consumed": {}}
+            return [], []
+        if query == "COMMIT":
+            if self.transaction:
+                self.staging = self.transaction["staging"]
+                self.consume(self.transaction["consumed"])
+            self.transaction = None
+            return [], []
+        if query == "ROLLBACK":
+            self.transaction = None
+            return [], []
+
+        staging = self.transaction["staging"] if self.transaction else self.staging
+        match = re.match(r"TRUNCATE TABLE (\S+)$", query)
+        if match:
+            staging[match.group(1).upper()] = []
+            return [], []
+
+        match = re.match(r"INSERT INTO (\S+) SELECT .* FROM (\S+) WHERE METADATA\$ACTION = 'INSERT'$", query)
+        if match:
+            target, stream = match.group(1).upper(), match.group(2).upper()
+            rows = [row for action, _, row in self.stream_rows(stream) if action == "INSERT"]
+            staging[target] = staging.get(target, []) + rows
+            consumed = {stream: len(self.logs.get(self.streams[stream]["source"], []))}
+            if self.transaction:
+                self.transaction["consumed"].update(consumed)
+            else:
+                self.consume(consumed)
+            return [("number of rows inserted",)], [(len(rows),)], len(rows)
+
+        return [], []
+
+    def consume(self, offsets):
+        """Advance the offsets of the streams a committed statement read."""
+        for stream, offset in offsets.items():
+            self.streams[stream]["offset"] = offset
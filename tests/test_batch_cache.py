@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import pandas as pd
+from batch_cache import (
+    MANIFEST_FILE,
+    get_pending_batches,
+    load_batch,
+    mark_committed,
+    put_batch,
+    read_manifest,
+)
+
+
+def frame(value, rows=100):
+    return pd.DataFrame({"ID": range(rows), "VALUE": [value] * rows})
+
+
+def parquet_files(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".parquet"))
+
+
+def test_batches_are_replayed_in_watermark_order_until_committed(tmp_path):
+    cache_dir = str(tmp_path)
+    second = put_batch(cache_dir, "ACCOUNTS", "2024-01-02", "2024-01-03", frame("b"))
+    first = put_batch(cache_dir, "ACCOUNTS", "2024-01-01", "2024-01-02", frame("a"))
+    put_batch(cache_dir, "VENDORS", "2024-01-01", "2024-01-02", frame("v"))
+
+    assert [key for key, _ in get_pending_batches(cache_dir, "ACCOUNTS")] == [first, second]
+    assert load_batch(cache_dir, first)["VALUE"].tolist() == ["a"] * 100
+
+    mark_committed(cache_dir, first)
+    assert [key for key, _ in get_pending_batches(cache_dir, "ACCOUNTS")] == [second]
+
+
+def test_identical_batches_share_one_file(tmp_path):
+    cache_dir = str(tmp_path)
+    put_batch(cache_dir, "ACCOUNTS", "2024-01-01", "2024-01-02", frame("a"))
+    put_batch(cache_dir, "ACCOUNTS", "2024-01-02", "2024-01-03", frame("a"))
+    assert len(parquet_files(cache_dir)) == 1
+    assert len(read_manifest(cache_dir)) == 2
+
+
+def test_eviction_drops_least_recently_used_committed_batches_only(tmp_path):
+    cache_dir = str(tmp_path)
+    keys = [put_batch(cache_dir, "ACCOUNTS", f"2024-01-0{day}", f"2024-01-0{day + 1}", frame(str(day))) for day in (1, 2, 3)]
+    size = read_manifest(cache_dir)[keys[0]]["bytes"]
+    for key in keys[:2]:
+        mark_committed(cache_dir, key)
+    load_batch(cache_dir, keys[0])
+
+    # room for three batches: the least recently used committed one makes way
+    assert put_batch(cache_dir, "ACCOUNTS", "2024-01-04", "2024-01-05", frame("4"), int(size * 3.5))
+    manifest = read_manifest(cache_dir)
+    assert keys[1] not in manifest and keys[0] in manifest and keys[2] in manifest
+    assert len(parquet_files(cache_dir)) == 3
+
+
+def test_batch_is_not_cached_when_only_uncommitted_batches_are_left(tmp_path):
+    cache_dir = str(tmp_path)
+    key = put_batch(cache_dir, "ACCOUNTS", "2024-01-01", "2024-01-02", frame("a"))
+    size = read_manifest(cache_dir)[key]["bytes"]
+
+    assert put_batch(cache_dir, "ACCOUNTS", "2024-01-02", "2024-01-03", frame("b"), int(size * 1.5)) is None
+    assert list(read_manifest(cache_dir)) == [key]
+    assert len(parquet_files(cache_dir)) == 1
+
+
+def put_batches(cache_dir, worker):
+    for batch in range(10):
+        put_batch(cache_dir, f"TABLE_{worker}", f"{batch}", f"{batch + 1}", frame(f"{worker}-{batch}", 10))
+
+
+def test_concurrent_processes_keep_every_batch_in_the_manifest(tmp_path):
+    cache_dir = str(tmp_path)
+    workers = [multiprocessing.Process(target=put_batches, args=(cache_dir, worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(read_manifest(cache_dir)) == 40
+    assert len(parquet_files(cache_dir)) == 40
+    assert sorted(os.listdir(cache_dir)) == sorted(parquet_files(cache_dir) + [MANIFEST_FILE, "manifest.lock"])
@@ -0,0 +1,96 @@
+import json
+import pytest
+from catalog import CATALOG_FILE, TABLE_DEFAULTS, load_catalog, validate_table, validate_warehouse_policy
+
+
+@pytest.fixture
+def write_catalog(tmp_path):
+    with open(CATALOG_FILE) as f:
+        raw = json.load(f)
+
+    def write(edit):
+        catalog = json.loads(json.dumps(raw))
+        edit(catalog)
+        path = tmp_path / "catalog.json"
+        path.write_text(json.dumps(catalog))
+        return str(path)
+
+    return write
+
+
+def table_errors(**settings):
+    errors = []
+    validate_table("accounts", {**TABLE_DEFAULTS, **settings}, errors)
+    return errors
+
+
+def test_shipped_catalog_is_valid():
+    catalog = load_catalog()
+
+    assert catalog["NETSUITE_TABLES"]
+    priorities = [catalog["TABLES"][table]["priority"] for table in catalog["NETSUITE_TABLES"]]
+    assert priorities == sorted(priorities)
+    assert all(table in catalog["TABLES"] for table in catalog["PRIMARY_KEY_TABLES"])
+
+
+def test_table_defaults_are_valid():
+    assert table_errors() == []
+    assert table_errors(primary_key=["TRANSACTION_ID", "LINE_ID"], merge_shards=4, search_optimization=True) == []
+
+
+def test_table_settings_are_type_checked():
+    errors = table_errors(batch_size=True, priority="1", colour="red")
+
+    assert "tables.accounts.batch_size: invalid value True" in errors
+    assert "tables.accounts.priority: invalid value '1'" in errors
+    assert "tables.accounts: unknown setting 'colour'" in errors
+
+
+def test_table_settings_are_range_and_dependency_checked():
+    errors = table_errors(strategy="full", partitions=0, merge_shards=2, search_optimization=True, cluster_by=[])
+
+    assert len(errors) == 5
+    assert errors[0].startswith("tables.accounts.strategy: must be one of")
+    assert "tables.accounts.partitions: must be at least 1" in errors
+    assert "tables.accounts.merge_shards: needs a primary_key" in errors
+    assert "tables.accounts.search_optimization: needs a primary_key" in errors
+    assert table_errors(primary_key=[]) == [
+        "tables.accounts.primary_key: must be a column name or a non-empty list of column names"
+    ]
+
+
+def test_warehouse_policy_is_checked():
+    errors = []
+    validate_warehouse_policy("p", {"ENABLED": "yes", "SIZE": "huge", "BASELINE_SIZE": "x-small", "AUTO_SUSPEND": -1}, errors)
+
+    assert errors == [
+        "p.WAREHOUSE_POLICY.ENABLED: must be true or false",
+        "p.WAREHOUSE_POLICY.SIZE: unknown warehouse size 'huge'",
+        "p.WAREHOUSE_POLICY.AUTO_SUSPEND: must be a non-negative integer",
+    ]
+    validate_warehouse_policy("p", None, errors)
+    validate_warehouse_policy("p", [], errors)
+    assert errors[-1] == "p.WAREHOUSE_POLICY: must be an object"
+
+
+def test_load_catalog_reports_every_problem(write_catalog):
+    def edit(catalog):
+        phases = catalog["environments"][catalog["default_environment"]]["phases"]
+        del phases["3"]
+        phases["2"]["CHANGE_CAPTURE"] = "trigger"
+        catalog["tables"]["ACCOUNTS"] = "yes"
+        del catalog["datatypes"]
+
+    with pytest.raises(ValueError) as error:
+        load_catalog(write_catalog(edit))
+
+    message = str(error.value)
+    assert "phases.3: missing" in message
+    assert "phases.2.CHANGE_CAPTURE: must be one of" in message
+    assert "tables.ACCOUNTS: must be an object" in message
+    assert "datatypes: missing" in message
+
+
+def test_load_catalog_rejects_an_unknown_environment(write_catalog):
+    with pytest.raises(ValueError, match="unknown environment 'nowhere'"):
+        load_catalog(write_catalog(lambda catalog: None), "nowhere")
@@ -0,0 +1,72 @@
+import json
+from clustering import apply_clustering, clustering_report
+from fakes import FakeSnowflakeConnection
+from load_tables import get_ddl_query, get_search_optimization_query
+
+PROPS = {"LANDING_DB": "LANDING", "LANDING_SCHEMA": "FINANCE"}
+PRIMARY_KEY_TABLES = {"ACCOUNTS": "ACCOUNT_ID", "TRANSACTION_LINES": ["TRANSACTION_ID", "TRANSACTION_LINE_ID"]}
+ROWS = [
+    ("TRANSACTION_LINES", "TRANSACTION_ID", "INTEGER", None, 39, 0),
+    ("TRANSACTION_LINES", "TRANSACTION_LINE_ID", "INTEGER", None, 10, 0),
+    ("TRANSACTION_LINES", "MEMO", "VARCHAR2", None, 4000, None),
+]
+SF_DATATYPES = {"INTEGER": "NUMBER", "VARCHAR2": "VARCHAR"}
+
+
+class ClusteringConnection(FakeSnowflakeConnection):
+    """
+    Answers SYSTEM$CLUSTERING_INFORMATION from a queue of depths per table; tables without one fail.
+    """
+
+    def __init__(self, depths):
+        super().__init__()
+        self.depths = depths
+
+    def respond(self, query, params):
+        if "SYSTEM$CLUSTERING_INFORMATION" not in query:
+            return [], []
+        table = params[0].split(".")[-1]
+        if table not in self.depths:
+            raise RuntimeError("Table does not exist")
+        depth = self.depths[table].pop(0)
+        info = {"total_partition_count": 10, "total_constant_partition_count": 2, "average_overlaps": depth - 1, "average_depth": depth}
+        return [("INFO",)], [(json.dumps(info),)]
+
+
+def test_ddl_appends_the_clustering_key():
+    query = get_ddl_query(ROWS, "LANDING", "FINANCE", PRIMARY_KEY_TABLES, SF_DATATYPES, cluster_by=["TO_DATE(DATE_LAST_MODIFIED)"])
+
+    assert "TRANSACTION_ID NUMBER(38,0)," in query and "MEMO VARCHAR(4000)," in query
+    assert query.endswith("PRIMARY KEY (TRANSACTION_ID, TRANSACTION_LINE_ID))\nCLUSTER BY (TO_DATE(DATE_LAST_MODIFIED));")
+    assert get_ddl_query(ROWS, "LANDING", "FINANCE", PRIMARY_KEY_TABLES, SF_DATATYPES).endswith("TRANSACTION_LINE_ID));")
+
+
+def test_search_optimization_covers_every_key_column():
+    assert get_search_optimization_query("TRANSACTION_LINES", "LANDING", "FINANCE", PRIMARY_KEY_TABLES) == (
+        "ALTER TABLE LANDING.FINANCE.TRANSACTION_LINES ADD SEARCH OPTIMIZATION ON EQUALITY(TRANSACTION_ID, TRANSACTION_LINE_ID)"
+    )
+
+
+def test_clustering_is_only_applied_to_tables_with_a_key():
+    sf_cnxn = FakeSnowflakeConnection()
+    apply_clustering(sf_cnxn, ["ACCOUNTS", "TRANSACTION_LINES"], PRIMARY_KEY_TABLES, PROPS)
+
+    assert [query for query, _ in sf_cnxn.executed] == [
+        "ALTER TABLE LANDING.FINANCE.TRANSACTION_LINES CLUSTER BY (TO_DATE(DATE_LAST_MODIFIED))"
+    ]
+
+
+def test_report_compares_with_the_previous_snapshot(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    sf_cnxn = ClusteringConnection({"ACCOUNTS": [3.0], "TRANSACTION_LINES": [8.0, 2.0]})
+
+    report = clustering_report(sf_cnxn, ["ACCOUNTS", "TRANSACTION_LINES", "MISSING"], PROPS)
+    first = capsys.readouterr().out
+    clustering_report(sf_cnxn, ["TRANSACTION_LINES"], PROPS)
+    second = capsys.readouterr().out
+
+    assert list(report) == ["ACCOUNTS", "TRANSACTION_LINES"]
+    assert sf_cnxn.executed[0][1] == ("LANDING.FINANCE.ACCOUNTS", "(DATE_LAST_MODIFIED)")
+    assert "MISSING: Clustering information not available" in first and "was" not in first
+    assert "TRANSACTION_LINES [TO_DATE(DATE_LAST_MODIFIED)]: 10 partitions" in second
+    assert "average depth 2.0, average overlaps 1.0 (was 8.0 depth, 7.0 overlaps)" in second
@@ -0,0 +1,30 @@
+from column_projection import get_select_list, get_table_columns
+
+PRIMARY_KEY_TABLES = {"ACCOUNTS": "ACCOUNT_ID", "TRANSACTION_LINES": ["TRANSACTION_ID", "TRANSACTION_LINE_ID"]}
+
+
+def test_tables_without_an_allowlist_extract_every_column():
+    assert get_table_columns("ACCOUNTS", PRIMARY_KEY_TABLES, {}) is None
+    assert get_table_columns("ACCOUNTS", PRIMARY_KEY_TABLES, {"COLUMN_ALLOWLISTS": {"ACCOUNTS": []}}) is None
+    assert get_select_list(None) == "*"
+
+
+def test_allowlist_keeps_the_key_and_watermark_columns():
+    props = {"COLUMN_ALLOWLISTS": {"ACCOUNTS": ["name", "Balance"]}}
+    columns = get_table_columns("ACCOUNTS", PRIMARY_KEY_TABLES, props)
+
+    assert sorted(columns) == ["ACCOUNT_ID", "BALANCE", "DATE_LAST_MODIFIED", "NAME"]
+    assert columns[-2:] == ["NAME", "BALANCE"]
+    assert get_select_list(columns).count(", ") == 3
+
+
+def test_allowlist_keeps_composite_keys_without_duplicates():
+    props = {"COLUMN_ALLOWLISTS": {"TRANSACTION_LINES": ["TRANSACTION_ID", "AMOUNT", "DATE_LAST_MODIFIED"]}}
+    columns = get_table_columns("TRANSACTION_LINES", PRIMARY_KEY_TABLES, props)
+
+    assert sorted(columns) == ["AMOUNT", "DATE_LAST_MODIFIED", "TRANSACTION_ID", "TRANSACTION_LINE_ID"]
+
+
+def test_tables_without_a_primary_key_only_add_the_watermark():
+    props = {"COLUMN_ALLOWLISTS": {"NOTES": ["NOTE"]}}
+    assert get_table_columns("NOTES", PRIMARY_KEY_TABLES, props) == ["DATE_LAST_MODIFIED", "NOTE"]
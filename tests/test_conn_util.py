@@ -0,0 +1,88 @@
+import struct
+import threading
+import pytest
+from conn_util import SnowflakeSessionPool, decode_date, decode_timestamp, execute_async_statements
+from fakes import AsyncConnection, WarehouseConnection
+
+
+class ClosingConnection(WarehouseConnection):
+    def __init__(self):
+        super().__init__()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_decode_timestamp_struct_and_text():
+    value = struct.pack("=hHHHHHI", 2024, 1, 31, 13, 5, 9, 500000000)
+    assert decode_timestamp(value) == "2024-01-31 13:05:09"
+    assert decode_timestamp(struct.pack("=hHHHHHI", 1, 1, 1, 0, 0, 0, 0)) == "0001-01-01 00:00:00"
+    assert decode_timestamp(b"2024-01-31 13:05:09.123") == "2024-01-31 13:05:09"
+    assert decode_timestamp("2024-01-31 13:05:09".encode("utf-16-le")) == "2024-01-31 13:05:09"
+    assert decode_timestamp(None) is None
+
+
+def test_decode_date_struct_and_text():
+    assert decode_date(struct.pack("=hHH", 9999, 12, 31)) == "9999-12-31 00:00:00"
+    assert decode_date(b"2024-02-29") == "2024-02-29 00:00:00"
+    assert decode_date(None) is None
+
+
+def test_decode_rejects_unreadable_values():
+    with pytest.raises(ValueError):
+        decode_date(b"not a date")
+
+
+def test_execute_async_statements_isolates_failures():
+    sf_cnxn = AsyncConnection(fail={"BROKEN": -1}, reject=("INVALID",), polls=2, result=(5,))
+    statements = [
+        ("A", "CREATE TABLE A CLONE X"),
+        ("B", "CREATE TABLE B BROKEN"),
+        ("C", "CREATE TABLE C INVALID"),
+        ("D", "CREATE TABLE D CLONE X"),
+        ("E", "CREATE TABLE E CLONE X"),
+    ]
+
+    results, failures = execute_async_statements(sf_cnxn, statements, concurrency=2, poll_seconds=0)
+
+    assert results == {"A": (5,), "D": (5,), "E": (5,)}
+    assert failures == {"B": "BROKEN failed", "C": "SQL compilation error"}
+    assert sf_cnxn.max_in_flight == 2
+
+
+def test_session_pool_never_shares_a_session_between_threads():
+    caller = ClosingConnection()
+    pool = SnowflakeSessionPool(caller, ClosingConnection, 3)
+    borrowed = []
+    all_borrowed = threading.Barrier(3, timeout=5)
+
+    def work():
+        with pool.session() as sf_cnxn:
+            borrowed.append(sf_cnxn)
+            all_borrowed.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    opened = list(pool.opened)
+    # a session borrowed alone afterwards is reused, not opened
+    with pool.session():
+        assert len(pool.opened) == 2
+    pool.close()
+
+    assert len(set(map(id, borrowed))) == 3 and caller in borrowed
+    assert len(opened) == 2
+    assert all(sf_cnxn.statements("USE WAREHOUSE WH") and sf_cnxn.closed for sf_cnxn in opened)
+    assert not caller.closed and pool.opened == []
+
+
+def test_session_pool_reports_a_session_it_cannot_open():
+    pool = SnowflakeSessionPool(WarehouseConnection(), lambda: -1, 2)
+
+    with pool.session():
+        with pytest.raises(ConnectionError):
+            with pool.session():
+                pass
@@ -0,0 +1,86 @@
+from configparser import ConfigParser
+import pytest
+import daemon
+from fakes import FakeSnowflakeConnection
+from tables import getNetsuiteTables
+
+
+class DeadConnection(FakeSnowflakeConnection):
+    def __init__(self):
+        super().__init__()
+        self.closed = False
+
+    def respond(self, query, params):
+        raise ConnectionError("connection reset")
+
+    def close(self):
+        self.closed = True
+
+
+def make_config(text):
+    config = ConfigParser()
+    config.read_string(text)
+    return config
+
+
+@pytest.fixture
+def warm(monkeypatch):
+    monkeypatch.setattr(daemon, "read_config", lambda: make_config("[snowflake]\nuser = etl\n"))
+    connections = daemon.WarmConnections()
+    opened = []
+
+    def connect(section):
+        opened.append(section)
+        return connect.next()
+
+    connect.next = FakeSnowflakeConnection
+    return connections, connect, opened
+
+
+def test_jobs_follow_the_configured_intervals():
+    table = getNetsuiteTables()[0]
+    jobs = daemon.get_jobs(
+        make_config(f"[netsuite]\nhost = ns\n[daemon]\nphase_1_interval = 600\nphase_1.{table} = 0\nphase_3_interval = 0\n")
+    )
+
+    phase_1 = [job for job in jobs if job["PHASE"] == 1]
+    assert [job["TABLE"] for job in phase_1] == getNetsuiteTables()[1:]
+    assert {job["INTERVAL"] for job in phase_1} == {600}
+    assert phase_1[0]["NAME"] == f"1:{phase_1[0]['TABLE']}" and phase_1[0]["ACCOUNT"] is None
+    assert [(job["NAME"], job["INTERVAL"]) for job in jobs if job["PHASE"] != 1] == [("2", daemon.DEFAULT_INTERVALS[2])]
+
+
+def test_phase_1_runs_one_job_per_account_and_table():
+    jobs = daemon.get_jobs(make_config("[netsuite]\nhost = ns\n[netsuite:prod]\n[netsuite:sandbox]\n"))
+
+    phase_1 = [job for job in jobs if job["PHASE"] == 1]
+    assert len(phase_1) == 2 * len(getNetsuiteTables())
+    assert {job["ACCOUNT"] for job in phase_1} == {"PROD", "SANDBOX"}
+    assert phase_1[0]["NAME"] == f"1:PROD:{getNetsuiteTables()[0]}"
+
+
+def test_warm_connection_is_reused_and_health_checked_when_invalidated(warm):
+    connections, connect, opened = warm
+
+    sf_cnxn = connections.ensure("snowflake", None, daemon.SF_HEALTH_QUERY, connect)
+    assert connections.ensure("snowflake", sf_cnxn, daemon.SF_HEALTH_QUERY, connect) is sf_cnxn
+    assert sf_cnxn.executed == []
+
+    connections.invalidate()
+    assert connections.ensure("snowflake", sf_cnxn, daemon.SF_HEALTH_QUERY, connect) is sf_cnxn
+    assert sf_cnxn.statements(daemon.SF_HEALTH_QUERY)
+    assert len(opened) == 1 and connections.reconnects["snowflake"] == 1
+
+
+def test_failed_health_check_reconnects_with_a_fresh_config(warm):
+    connections, connect, opened = warm
+    dead = DeadConnection()
+    connections.sf_cnxn = dead
+
+    fresh = connections.ensure("snowflake", dead, daemon.SF_HEALTH_QUERY, connect)
+
+    assert fresh is not dead and dead.closed
+    assert opened == [make_config("[snowflake]\nuser = etl\n")["snowflake"]]
+    connect.next = lambda: -1
+    connections.invalidate()
+    assert connections.ensure("snowflake", -1, daemon.SF_HEALTH_QUERY, connect) == -1
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("snowflake.connector")
+
+import delete_sync
+from fakes import FakeSnowflakeConnection
+
+PROPS = {"LANDING_DB": "LANDING", "LANDING_SCHEMA": "FINANCE", "RUN_ID": "R1"}
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    state = {"calls": [], "deleted": {}}
+
+    def fetch_keys_sf(sf_cnxn, landing_table, pk_col):
+        state["calls"].append("landing")
+        return np.unique(np.array(state["landing"], dtype=np.int64))
+
+    def fetch_keys_ns(ns_cnxn, table, pk_col):
+        state["calls"].append("netsuite")
+        return np.unique(np.array(state["netsuite"], dtype=np.int64))
+
+    def apply_deletes(sf_cnxn, table, pk_col, deleted_keys, props):
+        state["deleted"][table] = deleted_keys.tolist()
+        return len(deleted_keys)
+
+    monkeypatch.setattr(delete_sync, "fetch_keys_sf", fetch_keys_sf)
+    monkeypatch.setattr(delete_sync, "fetch_keys_ns", fetch_keys_ns)
+    monkeypatch.setattr(delete_sync, "apply_deletes", apply_deletes)
+    return state
+
+
+def test_landing_keys_missing_in_netsuite_are_deleted(keys):
+    keys["landing"] = [1, 2, 3, 4, 5, 6]
+    # 7 was created after the landing snapshot, it is not a deletion in either direction
+    keys["netsuite"] = [1, 3, 4, 5, 6, 7]
+
+    delete_sync.delete_sync(None, FakeSnowflakeConnection(), ["ACCOUNTS"], {"ACCOUNTS": "ID"}, PROPS)
+
+    assert keys["deleted"] == {"ACCOUNTS": [2]}
+    assert keys["calls"] == ["landing", "netsuite"]
+
+
+def test_nothing_is_deleted_when_the_key_sets_match(keys):
+    keys["landing"] = keys["netsuite"] = [1, 2, 3]
+    delete_sync.delete_sync(None, FakeSnowflakeConnection(), ["ACCOUNTS"], {"ACCOUNTS": "ID"}, PROPS)
+    assert keys["deleted"] == {}
+
+
+def test_max_ratio_guards_against_a_truncated_netsuite_key_set(keys):
+    keys["landing"] = list(range(10))
+    keys["netsuite"] = [0, 1, 2, 3]
+
+    delete_sync.delete_sync(None, FakeSnowflakeConnection(), ["ACCOUNTS"], {"ACCOUNTS": "ID"}, PROPS)
+    assert keys["deleted"] == {}
+
+    delete_sync.delete_sync(
+        None, FakeSnowflakeConnection(), ["ACCOUNTS"], {"ACCOUNTS": "ID"}, {**PROPS, "DELETE_SYNC_MAX_RATIO": 0.6}
+    )
+    assert keys["deleted"] == {"ACCOUNTS": [4, 5, 6, 7, 8, 9]}
+
+
+def test_tables_without_a_single_primary_key_are_skipped(keys):
+    keys["landing"], keys["netsuite"] = [1], []
+    delete_sync.delete_sync(
+        None, FakeSnowflakeConnection(), ["ACCOUNTS", "LINES"], {"LINES": ["TRANSACTION_ID", "LINE_ID"]}, PROPS
+    )
+    assert keys["calls"] == [] and keys["deleted"] == {}
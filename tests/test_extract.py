@@ -0,0 +1,33 @@
+import decimal
+import pyarrow as pa
+from extract import to_dataframe, to_record_batch
+
+SCHEMA = pa.schema(
+    [
+        pa.field("ID", pa.int64()),
+        pa.field("DATE_LAST_MODIFIED", pa.timestamp("s")),
+        pa.field("AMOUNT", pa.decimal128(18, 2)),
+        pa.field("PARENT_ID", pa.int64()),
+    ]
+)
+
+
+def test_sentinel_dates_outside_the_pandas_range_keep_their_value():
+    rows = [
+        (1, "0001-01-01 00:00:00", decimal.Decimal("1.50"), 7),
+        (2, "9999-12-31 23:59:59", decimal.Decimal("-2.25"), None),
+        (3, None, None, 8),
+    ]
+
+    df = to_dataframe([to_record_batch(rows, SCHEMA)])
+
+    assert df["DATE_LAST_MODIFIED"].tolist() == ["0001-01-01 00:00:00", "9999-12-31 23:59:59", "1970-01-01 00:00:00"]
+    assert df["AMOUNT"].tolist() == [decimal.Decimal("1.50"), decimal.Decimal("-2.25"), None]
+    # NULLs stay NULL instead of becoming 0
+    assert df["PARENT_ID"].tolist() == [7, None, 8]
+    assert df["ID"].tolist() == [1, 2, 3]
+
+
+def test_empty_extract_keeps_the_columns():
+    df = to_dataframe([to_record_batch([], SCHEMA)])
+    assert list(df.columns) == ["ID", "DATE_LAST_MODIFIED", "AMOUNT", "PARENT_ID"] and len(df) == 0
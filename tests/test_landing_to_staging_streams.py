@@ -0,0 +1,94 @@
+import pytest
+
+pytest.importorskip("snowflake.connector")
+
+from fakes import StreamConnection
+from landing_to_staging import (
+    ensure_stream,
+    get_stream_name,
+    get_stream_states,
+    insert_stream_changes,
+    stream_has_data,
+)
+
+PROPS = {
+    "RUN_ID": "R1",
+    "PHASE": 2,
+    "LANDING_DB": "LANDING",
+    "LANDING_SCHEMA": "FINANCE",
+    "STAGING_DB": "STAGING",
+    "STAGING_SCHEMA": "FINANCE_STG",
+}
+TABLE = ("ACCOUNTS", "STG_ACCOUNTS")
+SOURCE = "LANDING.FINANCE.ACCOUNTS"
+STAGING_TABLE = "STAGING.FINANCE_STG.STG_ACCOUNTS"
+STREAM = get_stream_name(TABLE, PROPS)
+
+
+@pytest.fixture
+def sf_conn():
+    sf_conn = StreamConnection("LANDING.FINANCE")
+    sf_conn.change(SOURCE, 1, {"ACCOUNT_ID": 1, "NAME": "Cash"})
+    sf_conn.change(SOURCE, 2, {"ACCOUNT_ID": 2, "NAME": "Bank"})
+    return sf_conn
+
+
+def bootstrap(sf_conn):
+    return ensure_stream(sf_conn, TABLE, "ACCOUNTS", PROPS, get_stream_states(sf_conn, PROPS))
+
+
+def test_bootstrap_creates_the_stream_once_and_recreates_it_when_stale(sf_conn):
+    # a new stream has no history, so the caller falls back to the INSERT_DT scan
+    assert bootstrap(sf_conn) is False
+    assert sf_conn.statements("CREATE OR REPLACE STREAM") == [
+        f"CREATE OR REPLACE STREAM {STREAM} ON TABLE {SOURCE}"
+    ]
+    assert bootstrap(sf_conn) is True
+    assert len(sf_conn.statements("CREATE OR REPLACE STREAM")) == 1
+
+    sf_conn.make_stale(STREAM)
+    assert bootstrap(sf_conn) is False
+    assert len(sf_conn.statements("CREATE OR REPLACE STREAM")) == 2
+
+
+def test_stream_starts_empty_at_creation(sf_conn):
+    bootstrap(sf_conn)
+    assert stream_has_data(sf_conn, STREAM) is False
+
+
+def test_consume_loads_new_images_and_advances_the_offset(sf_conn):
+    bootstrap(sf_conn)
+    sf_conn.change(SOURCE, 2, {"ACCOUNT_ID": 2, "NAME": "Bank EUR"})
+    sf_conn.change(SOURCE, 3, {"ACCOUNT_ID": 3, "NAME": "Payables"})
+    sf_conn.change(SOURCE, 1, None)
+    assert stream_has_data(sf_conn, STREAM) is True
+
+    assert insert_stream_changes(sf_conn, TABLE, STREAM, PROPS, "ACCOUNTS") == 2
+    assert sf_conn.staging[STAGING_TABLE] == [
+        {"ACCOUNT_ID": 2, "NAME": "Bank EUR"},
+        {"ACCOUNT_ID": 3, "NAME": "Payables"},
+    ]
+    assert stream_has_data(sf_conn, STREAM) is False
+
+    # the next batch replaces the previous one
+    sf_conn.change(SOURCE, 3, {"ACCOUNT_ID": 3, "NAME": "Payables USD"})
+    assert insert_stream_changes(sf_conn, TABLE, STREAM, PROPS, "ACCOUNTS") == 1
+    assert sf_conn.staging[STAGING_TABLE] == [{"ACCOUNT_ID": 3, "NAME": "Payables USD"}]
+
+
+def test_failed_insert_rolls_back_and_keeps_the_offset(sf_conn):
+    bootstrap(sf_conn)
+    sf_conn.change(SOURCE, 2, {"ACCOUNT_ID": 2, "NAME": "Bank EUR"})
+    insert_stream_changes(sf_conn, TABLE, STREAM, PROPS, "ACCOUNTS")
+    sf_conn.change(SOURCE, 4, {"ACCOUNT_ID": 4, "NAME": "Receivables"})
+
+    sf_conn.fail_on = f"INSERT INTO {STAGING_TABLE}"
+    with pytest.raises(RuntimeError):
+        insert_stream_changes(sf_conn, TABLE, STREAM, PROPS, "ACCOUNTS")
+    assert sf_conn.executed[-1][0] == "ROLLBACK"
+    # the truncate was rolled back with the insert and the changes are still in the stream
+    assert sf_conn.staging[STAGING_TABLE] == [{"ACCOUNT_ID": 2, "NAME": "Bank EUR"}]
+    assert stream_has_data(sf_conn, STREAM) is True
+
+    assert insert_stream_changes(sf_conn, TABLE, STREAM, PROPS, "ACCOUNTS") == 1
+    assert sf_conn.staging[STAGING_TABLE] == [{"ACCOUNT_ID": 4, "NAME": "Receivables"}]
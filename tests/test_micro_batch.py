@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("snowflake.connector")
+
+from micro_batch import MicroBatchState
+
+
+def test_take_due_flushes_old_or_large_tables_only():
+    state = MicroBatchState()
+    state.add("ACCOUNTS", "a1.parquet", 10, 100, ["ID"], "T1")
+    state.add("VENDORS", "v1.parquet", 10, 5000, ["ID"], "T1")
+    state.add("ITEMS", "i1.parquet", 10, 100, ["ID"], "T1")
+    state.pending["ITEMS"]["oldest"] -= 120
+
+    due = state.take_due(flush_seconds=60, flush_bytes=1000)
+
+    assert sorted(due) == ["ITEMS", "VENDORS"]
+    assert list(state.pending) == ["ACCOUNTS"]
+    assert list(state.take_due(60, 1000, flush_all=True)) == ["ACCOUNTS"]
+    assert state.pending == {}
+
+
+def test_put_back_keeps_the_failed_files_ahead_of_newer_ones():
+    state = MicroBatchState()
+    state.add("ACCOUNTS", "a1.parquet", 10, 100, ["ID"], "T1")
+    state.add("ACCOUNTS", "a2.parquet", 5, 50, ["ID"], "T2")
+    failed = state.take_due(0, 0)["ACCOUNTS"]
+
+    # the poll loop stages another file while the flush fails
+    state.add("ACCOUNTS", "a3.parquet", 1, 10, ["ID"], "T3")
+    state.put_back("ACCOUNTS", failed)
+
+    batch = state.pending["ACCOUNTS"]
+    assert batch["files"] == ["a1.parquet", "a2.parquet", "a3.parquet"]
+    assert (batch["rows"], batch["bytes"], batch["until"]) == (16, 160, "T3")
+
+
+def test_mark_polled_only_advances_tables_with_pending_files():
+    state = MicroBatchState()
+    state.add("ACCOUNTS", "a1.parquet", 10, 100, ["ID"], "T1")
+    state.mark_polled("ACCOUNTS", "T2")
+    state.mark_polled("VENDORS", "T2")
+    assert state.pending["ACCOUNTS"]["until"] == "T2" and "VENDORS" not in state.pending
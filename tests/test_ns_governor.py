@@ -0,0 +1,101 @@
+import pytest
+import ns_governor
+from fakes import FakeClock, odbc_error
+from ns_governor import NetSuiteGovernor, TokenBucket, get_sqlstate, is_retryable
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ns_governor, "time", clock)
+    return clock
+
+
+def failing(*errors, result="rows"):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    fn.calls = calls
+    return fn
+
+
+def test_retry_rules():
+    assert get_sqlstate(odbc_error("HYT00", "Timeout expired")) == "HYT00"
+    assert get_sqlstate(ValueError("HYT00")) == ""
+    assert is_retryable(odbc_error("HYT00"))
+    assert is_retryable(odbc_error("HY000", "Too many concurrent requests"))
+    assert not is_retryable(odbc_error("42000", "Syntax error"))
+    # a dead connection is only worth retrying while opening a new one
+    assert not is_retryable(odbc_error("08S01", "Communication link failure"))
+    assert is_retryable(odbc_error("08S01", "Communication link failure"), connecting=True)
+    assert not is_retryable(RuntimeError("rate limit"))
+
+
+def test_token_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(rate=2.0, burst=2)
+    assert [bucket.acquire() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    # idle time refills up to the burst only
+    assert [bucket.acquire() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_retryable_errors_are_retried_with_backoff(clock):
+    governor = NetSuiteGovernor(rate=1000, burst=1000, base_delay=1.0)
+    fn = failing(odbc_error("HYT00"), odbc_error("40001"))
+
+    assert governor.run("ACCOUNTS", fn) == "rows"
+    assert len(fn.calls) == 3
+    assert governor.metrics["ACCOUNTS"] == {"queries": 3, "retries": 2, "failures": 0, "queue_wait_seconds": 0.0}
+    assert 0 <= clock.sleeps[0] <= 1.0 and 0 <= clock.sleeps[1] <= 2.0
+
+
+def test_non_retryable_and_exhausted_errors_are_raised(clock):
+    governor = NetSuiteGovernor(rate=1000, burst=1000, max_retries=2)
+    fn = failing(odbc_error("42000", "Syntax error"))
+    with pytest.raises(Exception, match="Syntax error"):
+        governor.run("ACCOUNTS", fn)
+    assert len(fn.calls) == 1
+
+    fn = failing(*[odbc_error("HYT00")] * 5)
+    with pytest.raises(Exception, match="HYT00"):
+        governor.run("VENDORS", fn)
+    assert len(fn.calls) == 3
+    assert governor.metrics["VENDORS"]["failures"] == 1
+
+
+def test_connect_retries_refused_logins(clock):
+    governor = NetSuiteGovernor(rate=1000, burst=1000)
+    fn = failing(odbc_error("08001", "Too many connections"), result="cnxn")
+    assert governor.connect(fn) == "cnxn"
+    assert len(fn.calls) == 2
+
+
+def test_hold_keeps_the_slot_until_the_block_ends(clock):
+    governor = NetSuiteGovernor(max_concurrent=1, rate=1000, burst=1000)
+
+    with governor.hold("ACCOUNTS", failing(odbc_error("HYT00"), result="cursor")) as cursor:
+        assert cursor == "cursor"
+        # the fetch still runs against NetSuite, so the only slot is taken
+        assert not governor.slots.acquire(blocking=False)
+    assert governor.slots.acquire(blocking=False)
+    governor.slots.release()
+
+
+def test_errors_in_the_held_block_are_not_retried(clock):
+    governor = NetSuiteGovernor(max_concurrent=1, rate=1000, burst=1000)
+    fn = failing()
+
+    with pytest.raises(Exception, match="HYT00"):
+        with governor.hold("ACCOUNTS", fn):
+            raise odbc_error("HYT00", "fetch timed out")
+
+    # the query is not rerun for a failed fetch, and the slot is released
+    assert len(fn.calls) == 1
+    assert governor.slots.acquire(blocking=False)
@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("snowflake.connector")
+
+from fakes import FakeSnowflakeConnection, ModifiedRowsConnection
+from planner import format_plan, get_credits_per_hour, plan_landing, plan_table
+
+MODIFIED = ["2024-01-01 00:00:00", "2024-01-02 00:00:00", "2024-01-03 00:00:00", "2024-01-04 00:00:00", "2024-01-05 00:00:00"]
+PROPS = {"LANDING_DB": "LANDING", "LANDING_SCHEMA": "FINANCE"}
+POLICY = {"ENABLED": True, "SIZE": "SMALL", "LARGE_SIZE": "LARGE", "LARGE_ROWS": 4}
+
+pytestmark = pytest.mark.usefixtures("unthrottled_governor")
+
+
+class LandingSizesConnection(FakeSnowflakeConnection):
+    """Answers the INFORMATION_SCHEMA.TABLES size query."""
+
+    def __init__(self, sizes):
+        super().__init__()
+        self.sizes = sizes
+
+    def respond(self, query, params):
+        if "INFORMATION_SCHEMA.TABLES" in query:
+            return [("TABLE_NAME",), ("ROW_COUNT",), ("BYTES",)], [(table, *size) for table, size in self.sizes.items()]
+        return [], []
+
+
+def test_credits_double_with_each_size():
+    assert [get_credits_per_hour(size) for size in ("XSMALL", "SMALL", "LARGE")] == [1, 2, 8]
+    assert get_credits_per_hour("HUGE") is None
+
+
+def test_incremental_plan_counts_the_watermark_window():
+    ns_cnxn = ModifiedRowsConnection(MODIFIED)
+    entry = plan_table(ns_cnxn, "ACCOUNTS", "2024-01-02 00:00:00", 1, (100, 4000), (1.5, 200.0, 9.0), {"WAREHOUSE_POLICY": POLICY})
+
+    assert ns_cnxn.statements("DATE_LAST_MODIFIED > '2024-01-02 00:00:00'")
+    assert entry["ROWS"] == 3 and entry["BYTES"] == 600.0 and entry["SECONDS"] == 2.0
+    assert entry["WAREHOUSE_SIZE"] == "SMALL (default)"
+    assert entry["CREDITS"] == pytest.approx(2.0 / 3600 * 2)
+    assert format_plan(entry).startswith("ACCOUNTS: incremental since 2024-01-02 00:00:00, 3 rows")
+
+
+def test_catch_up_plan_shows_windows_and_the_large_size():
+    props = {"WAREHOUSE_POLICY": POLICY, "WINDOW_MAX_ROWS": 2}
+    entry = plan_table(ModifiedRowsConnection(MODIFIED), "ACCOUNTS", "2023-12-01 00:00:00", 1, None, None, props)
+
+    assert entry["STRATEGY"] == "incremental, 3 window(s)"
+    assert entry["WAREHOUSE_SIZE"] == "LARGE (large)"
+    # no history and no landing table: rows are counted, the rest is unknown
+    assert entry["SECONDS"] is None and entry["BYTES"] is None and entry["CREDITS"] is None
+    assert "no landing table; no history" in format_plan(entry)
+
+
+def test_disabled_policy_and_bulk_phase():
+    entry = plan_table(ModifiedRowsConnection(MODIFIED), "ACCOUNTS", "2024-01-04 00:00:00", 0, (10, 1000), None, {"WAREHOUSE_POLICY": {**POLICY, "ENABLED": False}})
+
+    assert entry["STRATEGY"] == "bulk" and entry["SINCE"] is None
+    assert entry["ROWS"] == 5 and entry["BYTES"] == 500.0
+    assert entry["WAREHOUSE_SIZE"] is None
+
+
+def test_plan_is_read_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sf_cnxn = LandingSizesConnection({"ACCOUNTS": (10, 1000)})
+
+    plan = plan_landing(ModifiedRowsConnection(MODIFIED), sf_cnxn, ["ACCOUNTS", "VENDORS"], PROPS, 0)
+
+    assert [(entry["TABLE"], entry["LANDING_ROWS"]) for entry in plan] == [("ACCOUNTS", 10), ("VENDORS", None)]
+    assert all(query.startswith("SELECT") for query, _ in sf_cnxn.executed) and sf_cnxn.commits == 0
+    assert list(tmp_path.iterdir()) == []
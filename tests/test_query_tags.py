@@ -0,0 +1,68 @@
+import json
+from fakes import FakeSnowflakeConnection, QueryHistoryConnection
+from query_tags import build_cost_report, fetch_query_history, get_query_tag, harvest_costs, tag_session
+
+HISTORY = [
+    {"run": "R1", "table": "ACCOUNTS", "stage": "merge", "elapsed_ms": 1500, "queued_ms": 500, "bytes_scanned": 2048, "rows_produced": 10, "warehouse": "WH"},
+    {"run": "R1", "table": "ACCOUNTS", "stage": "merge", "elapsed_ms": 500, "queued_ms": None, "bytes_scanned": 1024, "rows_produced": 5, "warehouse": "WH"},
+    {"run": "R1", "table": "ACCOUNTS", "stage": "copy", "elapsed_ms": 4000, "queued_ms": 0, "bytes_scanned": 0, "rows_produced": 15, "warehouse": "WH"},
+    {"run": "R1", "table": None, "stage": "select", "elapsed_ms": 100, "queued_ms": 0, "bytes_scanned": None, "rows_produced": 1, "warehouse": "WH"},
+    {"run": "R2", "table": "ACCOUNTS", "stage": "merge", "elapsed_ms": 9999, "queued_ms": 0, "bytes_scanned": 1, "rows_produced": 1, "warehouse": "WH"},
+]
+
+
+def test_query_tag_drops_unset_fields():
+    tag = json.loads(get_query_tag({"RUN_ID": "R1", "PHASE": 1}, "ACCOUNTS"))
+    assert tag == {"app": "netsuite-snowflake-elt", "run": "R1", "phase": 1, "table": "ACCOUNTS"}
+
+
+def test_session_is_tagged_once_per_table():
+    sf_cnxn = FakeSnowflakeConnection()
+    props = {"RUN_ID": "R1", "PHASE": 1}
+    for table in (None, "ACCOUNTS", "ACCOUNTS", "ACCOUNTS", "VENDORS", None, None):
+        tag_session(sf_cnxn, props, table)
+
+    tags = [json.loads(params[0]).get("table") for _, params in sf_cnxn.executed]
+    assert tags == [None, "ACCOUNTS", "VENDORS", None]
+
+
+def test_fetch_query_history_reads_the_run_from_a_qualified_information_schema():
+    sf_cnxn = QueryHistoryConnection(HISTORY)
+    history = fetch_query_history(sf_cnxn, "R1", 1700000000, "LANDING")
+
+    assert len(history) == 4
+    assert history[0]["TABLE"] == "ACCOUNTS" and history[0]["ELAPSED_MS"] == 1500
+    [query] = sf_cnxn.statements("QUERY_HISTORY")
+    assert "TABLE(LANDING.INFORMATION_SCHEMA.QUERY_HISTORY(" in query
+    assert "TO_TIMESTAMP_LTZ(1700000000)" in query
+    # the harvest itself must not be attributed to the run
+    assert sf_cnxn.executed[0][0] == "ALTER SESSION UNSET QUERY_TAG"
+
+
+def test_build_cost_report_aggregates_per_table_and_stage():
+    history = fetch_query_history(QueryHistoryConnection(HISTORY), "R1", 0, "LANDING")
+    report = build_cost_report(history, {"ACCOUNTS": {"seconds": 7.5}})
+
+    assert [(entry["TABLE"], entry["STAGE"]) for entry in report] == [
+        ("ACCOUNTS", "copy"),
+        ("ACCOUNTS", "merge"),
+        ("-", "select"),
+    ]
+    merge = report[1]
+    assert merge["QUERIES"] == 2
+    assert merge["ELAPSED_S"] == 2.0
+    assert merge["QUEUED_S"] == 0.5
+    assert merge["BYTES_SCANNED"] == 3072
+    assert merge["ROWS_PRODUCED"] == 15
+    assert merge["LOCAL_SECONDS"] == 7.5
+    assert report[2]["LOCAL_SECONDS"] is None
+
+
+def test_harvest_costs_uses_the_staging_database_without_a_landing_one(tmp_path):
+    sf_cnxn = QueryHistoryConnection(HISTORY)
+    path = tmp_path / "costs.csv"
+    report = harvest_costs(sf_cnxn, {"RUN_ID": "R2", "STAGING_DB": "STAGING"}, 0, -1, str(path))
+
+    assert [entry["ELAPSED_S"] for entry in report] == [9.999]
+    assert "STAGING.INFORMATION_SCHEMA.QUERY_HISTORY" in sf_cnxn.statements("QUERY_HISTORY")[0]
+    assert path.read_text().splitlines()[0].startswith("TABLE,STAGE,QUERIES")
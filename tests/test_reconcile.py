@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("snowflake.connector")
+
+import reconcile
+from fakes import FakeSnowflakeConnection, KeyRangeConnection
+from reconcile import find_drifted_ranges, merge_ranges
+
+pytestmark = pytest.mark.usefixtures("unthrottled_governor")
+
+
+@pytest.fixture
+def small_leaves(monkeypatch):
+    monkeypatch.setattr(reconcile, "LEAF_ROWS", 10)
+
+
+def test_matching_tables_have_no_drift():
+    rows = {key: 20240101000000 + key for key in range(1000)}
+    assert find_drifted_ranges(KeyRangeConnection(rows), KeyRangeConnection(dict(rows)), "T", "L.S.T", "ID", 0, 1000) == []
+
+
+def test_recursion_narrows_down_to_the_drifted_leaf(small_leaves):
+    ns_rows = {key: 20240101000000 for key in range(1000)}
+    sf_rows = dict(ns_rows)
+    sf_rows[517] = 20230101000000
+    ns_cnxn, sf_cnxn = KeyRangeConnection(ns_rows), KeyRangeConnection(sf_rows)
+
+    ranges = find_drifted_ranges(ns_cnxn, sf_cnxn, "T", "L.S.T", "ID", 0, 1000, buckets=4)
+
+    # buckets 250, 63, 16 and 4 keys wide, each level only splitting the mismatching bucket
+    assert ranges == [(516, 520)]
+    assert len(ns_cnxn.statements("GROUP BY")) == 4
+
+
+def test_missing_keys_on_either_side_are_found(small_leaves):
+    ns_rows = {key: 1 for key in range(100) if key != 10}
+    sf_rows = {key: 1 for key in range(100) if key != 90}
+
+    ranges = find_drifted_ranges(KeyRangeConnection(ns_rows), KeyRangeConnection(sf_rows), "T", "L.S.T", "ID", 0, 100, buckets=4)
+
+    assert [lo <= 10 < hi for lo, hi in ranges].count(True) == 1
+    assert [lo <= 90 < hi for lo, hi in ranges].count(True) == 1
+    assert all(hi - lo <= 7 for lo, hi in ranges)
+
+
+def test_adjacent_ranges_are_merged():
+    assert merge_ranges([(10, 20), (0, 5), (5, 8), (15, 30), (40, 41)]) == [(0, 8), (10, 30), (40, 41)]
+
+
+def test_repair_deletes_are_chunked(monkeypatch):
+    monkeypatch.setattr(reconcile, "DELETE_RANGES_PER_STATEMENT", 2)
+    monkeypatch.setattr(reconcile, "create_run_table", lambda sf_cnxn, table, props: "L.TMP.RUN_T")
+    monkeypatch.setattr(reconcile, "drop_run_table", lambda sf_cnxn, table: None)
+    monkeypatch.setattr(reconcile, "fetch_ranges_ns", lambda *args: ([], []))
+    monkeypatch.setattr(reconcile, "get_table_columns", lambda *args: None)
+    sf_cnxn = FakeSnowflakeConnection()
+
+    ranges = [(0, 5), (5, 8), (10, 12), (20, 22), (30, 32)]
+    reconcile.repair_ranges(None, sf_cnxn, "T", "ID", ranges, {"T": "ID"}, {"LANDING_DB": "L", "LANDING_SCHEMA": "S"})
+
+    deletes = sf_cnxn.statements("DELETE FROM L.S.T")
+    assert len(deletes) == 2
+    assert "(TGT.ID >= 0 AND TGT.ID < 8) OR (TGT.ID >= 10 AND TGT.ID < 12)" in deletes[0]
+    assert deletes[1].count("TGT.ID >=") == 2
+    assert sf_cnxn.commits == 1
@@ -0,0 +1,34 @@
+import os
+from run_stats import estimate_eta, get_expected_seconds, order_longest_first, plan_run, record_stats
+
+
+def test_longest_tables_start_first_and_unknown_ones_before_them():
+    expected = {"SMALL": 10.0, "BIG": 300.0, "MEDIUM": 60.0}
+    assert order_longest_first(["SMALL", "NEW", "BIG", "MEDIUM"], expected) == ["NEW", "BIG", "MEDIUM", "SMALL"]
+
+
+def test_eta_simulates_the_workers():
+    expected = {"A": 100.0, "B": 60.0, "C": 50.0, "D": 10.0}
+    ordered = order_longest_first(list(expected), expected)
+
+    assert estimate_eta(ordered, expected) == 220.0
+    # A runs 0-100 and D 100-110 on one worker, B 0-60 and C 60-110 on the other
+    assert estimate_eta(ordered, expected, workers=2) == 110.0
+    assert estimate_eta(ordered, expected, workers=8) == 100.0
+    # tables without history count as the average table
+    assert estimate_eta(["A", "NEW"], expected) == 155.0
+    assert estimate_eta(["NEW"], {}) == 0.0
+
+
+def test_expected_seconds_average_the_recent_runs(tmp_path):
+    path = str(tmp_path / "run_stats.db")
+    assert get_expected_seconds(1, path=path) == {}
+    assert not os.path.exists(path)
+
+    for run, seconds in enumerate([100, 10, 20, 30]):
+        record_stats(f"R{run}", 1, {"ACCOUNTS": {"started": run, "seconds": seconds}}, path)
+    record_stats("R9", 2, {"ACCOUNTS": {"started": 9, "seconds": 999}}, path)
+
+    assert get_expected_seconds(1, path=path, history=3) == {"ACCOUNTS": 20.0}
+    assert get_expected_seconds(1, ["VENDORS"], path=path) == {}
+    assert plan_run(1, ["VENDORS", "ACCOUNTS"], path=path) == ["VENDORS", "ACCOUNTS"]
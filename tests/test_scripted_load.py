@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("snowflake.connector")
+
+import incremental_load_transient
+from fakes import FakeSnowflakeConnection
+from incremental_load_transient import get_post_upload_script, store_watermark
+
+PRIMARY_KEY_TABLES = {"ACCOUNTS": "ACCOUNT_ID"}
+PROPS = {
+    "ENV": "LANDING",
+    "CONTROL_TABLE": "LANDING.PUBLIC.NETSUITE_CT",
+    "LANDING_DB": "LANDING",
+    "LANDING_SCHEMA": "FINANCE",
+    "TRANSIENT_SCHEMA": "FINANCE_TRANSIENT",
+    "RUN_ID": "RUN1",
+    "PHASE": 1,
+}
+
+
+class CountingConnection(FakeSnowflakeConnection):
+    """A session exposing the connector's request sequence counter."""
+
+    def __init__(self):
+        super().__init__()
+        self.sequence_counter = 0
+
+    def respond(self, query, params):
+        self.sequence_counter += 1
+        return [], [(1, 0)]
+
+    def commit(self):
+        super().commit()
+        self.sequence_counter += 1
+
+
+@pytest.fixture
+def sf_cnxn(monkeypatch):
+    def write_pandas(conn, df, table_name, **kwargs):
+        # write_pandas creates a stage, PUTs and COPYs: three statements
+        for statement in ("CREATE TEMPORARY STAGE", "PUT", f"COPY INTO {table_name}"):
+            conn.cursor().execute(statement)
+
+    monkeypatch.setattr(incremental_load_transient, "write_pandas", write_pandas)
+    return CountingConnection()
+
+
+def batch():
+    return pd.DataFrame({"ACCOUNT_ID": [1, 2], "DATE_LAST_MODIFIED": ["2024-01-01 00:00:00"] * 2})
+
+
+def test_post_upload_script_commits_merge_and_watermark_together():
+    script = get_post_upload_script("MERGE INTO T USING S ON 1 = 1 ", "MERGE INTO CT USING X ON 1 = 1", "RUN_T")
+
+    assert script.startswith("EXECUTE IMMEDIATE $$") and script.endswith("$$")
+    steps = [line.strip() for line in script.splitlines()]
+    assert steps.index("BEGIN TRANSACTION;") < steps.index("MERGE INTO T USING S ON 1 = 1;") < steps.index("merged := SQLROWCOUNT;")
+    assert steps.index("MERGE INTO CT USING X ON 1 = 1;") < steps.index("COMMIT;") < steps.index("DROP TABLE IF EXISTS RUN_T;")
+    assert "ROLLBACK;" in steps and "RAISE;" in steps
+
+
+def test_scripted_load_stores_the_watermark_in_one_round_trip(sf_cnxn):
+    statements = store_watermark(sf_cnxn, "ACCOUNTS", batch(), "2024-01-02 00:00:00", PRIMARY_KEY_TABLES, {**PROPS, "SCRIPTED_LOAD": True})
+
+    scripts = sf_cnxn.statements("EXECUTE IMMEDIATE")
+    assert len(scripts) == 1 and "NETSUITE_CT" in scripts[0] and "'2024-01-02 00:00:00'" in scripts[0]
+    assert not [query for query, _ in sf_cnxn.executed if query.startswith(("DROP", "MERGE"))]
+    assert sf_cnxn.commits == 0
+    # tag, run table, three write_pandas statements and the script
+    assert statements == sf_cnxn.sequence_counter == 6
+
+
+def test_unscripted_load_counts_every_statement(sf_cnxn):
+    statements = store_watermark(sf_cnxn, "ACCOUNTS", batch(), "2024-01-02 00:00:00", PRIMARY_KEY_TABLES, PROPS)
+
+    assert not sf_cnxn.statements("EXECUTE IMMEDIATE")
+    assert len(sf_cnxn.statements("DROP TABLE IF EXISTS")) == 1 and len(sf_cnxn.statements("MERGE INTO")) == 2
+    assert sf_cnxn.commits == 2
+    assert statements == sf_cnxn.sequence_counter == len(sf_cnxn.executed) + sf_cnxn.commits
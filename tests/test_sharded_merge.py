@@ -0,0 +1,59 @@
+import decimal
+import pytest
+import conn_util
+import sharded_merge
+from fakes import AsyncConnection
+from sharded_merge import get_range_predicate, get_shard_ranges, run_shards, to_sql_literal
+
+
+@pytest.fixture
+def shard_log(monkeypatch):
+    log = []
+    monkeypatch.setattr(sharded_merge, "record_merge_shard", lambda *args, **kwargs: log.append(args))
+    # run_shards polls the asynchronous queries at the default interval
+    monkeypatch.setattr(conn_util.time, "sleep", lambda seconds: None)
+    return log
+
+
+def test_shard_ranges_are_open_at_both_ends():
+    assert get_shard_ranges([10, 20, 30]) == [(None, 10), (10, 20), (20, None)]
+    # a single bound (or none) leaves one range over the whole table
+    assert get_shard_ranges([10]) == [(None, None)]
+    assert get_shard_ranges([]) == [(None, None)]
+
+
+def test_range_predicates_take_null_keys_into_the_first_range():
+    assert get_range_predicate("TGT.ID", None, 10) == "TGT.ID <= 10 OR TGT.ID IS NULL"
+    assert get_range_predicate("TGT.ID", 10, 20) == "TGT.ID > 10 AND TGT.ID <= 20"
+    assert get_range_predicate("TGT.ID", 20, None) == "TGT.ID > 20"
+    assert get_range_predicate("TGT.ID", None, None) is None
+
+
+def test_range_predicates_quote_text_keys():
+    assert to_sql_literal(decimal.Decimal("12.50")) == "12.50"
+    assert to_sql_literal("O'Brien") == "'O''Brien'"
+    assert get_range_predicate("ID", "A", "M") == "ID > 'A' AND ID <= 'M'"
+
+
+def shards(count):
+    return [(f"MERGE SHARD {shard}", lower, upper) for shard, (lower, upper) in enumerate(get_shard_ranges(list(range(count))), 1)]
+
+
+def test_failed_shards_are_retried_on_their_own(shard_log):
+    sf_cnxn = AsyncConnection(fail={"SHARD 2": 1}, result=(3, 4))
+
+    merged, statements = run_shards(sf_cnxn, "T", shards(3), {"MERGE_SHARDS": {"CONCURRENCY": 2, "RETRIES": 2}})
+
+    assert (merged, statements) == (21, 4)
+    assert [query for query, _ in sf_cnxn.executed].count("MERGE SHARD 2") == 2
+    assert [(entry[2], entry[6], entry[7]) for entry in shard_log if entry[6] == "failed"] == [(2, "failed", 1)]
+
+
+def test_shards_failing_every_retry_raise(shard_log):
+    sf_cnxn = AsyncConnection(fail={"SHARD 3": -1})
+
+    with pytest.raises(RuntimeError, match=r"1 of 3 MERGE shard\(s\) failed: \[3\]"):
+        run_shards(sf_cnxn, "T", shards(3), {"MERGE_SHARDS": {"RETRIES": 1}})
+
+    assert [query for query, _ in sf_cnxn.executed].count("MERGE SHARD 3") == 2
+    assert sum(entry[6] == "merged" for entry in shard_log) == 2
@@ -0,0 +1,37 @@
+from fakes import FakeSnowflakeConnection
+from transient_landing_tables import create_run_table, drop_run_table, get_run_table_name, new_run_id
+
+PROPS = {"LANDING_DB": "LANDING", "LANDING_SCHEMA": "FINANCE", "TRANSIENT_SCHEMA": "FINANCE_TRANSIENT"}
+
+
+class FailingConnection(FakeSnowflakeConnection):
+    def respond(self, query, params):
+        raise RuntimeError("session closed")
+
+
+def test_overlapping_runs_get_their_own_staging_table():
+    first, second = new_run_id(), new_run_id()
+
+    assert first != second and first.isalnum() and first.isupper()
+    assert get_run_table_name("ACCOUNTS", {**PROPS, "RUN_ID": first}) == f"LANDING.FINANCE_TRANSIENT.ACCOUNTS_{first}"
+    assert get_run_table_name("ACCOUNTS", {**PROPS, "RUN_ID": first}) != get_run_table_name(
+        "ACCOUNTS", {**PROPS, "RUN_ID": second}
+    )
+
+
+def test_run_table_is_a_session_temporary_copy_of_the_landing_table():
+    sf_cnxn = FakeSnowflakeConnection()
+    run_table = create_run_table(sf_cnxn, "ACCOUNTS", {**PROPS, "RUN_ID": "ABC"})
+    drop_run_table(sf_cnxn, run_table)
+
+    assert [query for query, _ in sf_cnxn.executed] == [
+        "CREATE TEMPORARY TABLE LANDING.FINANCE_TRANSIENT.ACCOUNTS_ABC LIKE LANDING.FINANCE.ACCOUNTS",
+        "DROP TABLE IF EXISTS LANDING.FINANCE_TRANSIENT.ACCOUNTS_ABC",
+    ]
+    assert not sf_cnxn.statements("TRUNCATE")
+
+
+def test_failed_drop_is_reported_not_raised(capsys):
+    drop_run_table(FailingConnection(), "LANDING.FINANCE_TRANSIENT.ACCOUNTS_ABC")
+
+    assert "session closed" in capsys.readouterr().out
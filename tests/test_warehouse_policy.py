@@ -0,0 +1,44 @@
+import pytest
+import warehouse_policy
+from fakes import WarehouseConnection
+from warehouse_policy import warehouse_for
+
+POLICY = {"ENABLED": True, "SIZE": "LARGE", "AUTO_SUSPEND": 60}
+
+
+@pytest.fixture(autouse=True)
+def no_decision_log(monkeypatch):
+    monkeypatch.setattr(warehouse_policy, "record_warehouse_decision", lambda *args: None)
+
+
+def test_disabled_policy_leaves_the_warehouse_alone():
+    sf_cnxn = WarehouseConnection()
+    with warehouse_for(sf_cnxn, {"WAREHOUSE_POLICY": {**POLICY, "ENABLED": False}}):
+        pass
+    with warehouse_for(sf_cnxn, {"WAREHOUSE_POLICY": {"SIZE": "LARGE"}}):
+        pass
+    assert sf_cnxn.executed == []
+
+
+def test_policy_resizes_and_restores_the_original_size():
+    sf_cnxn = WarehouseConnection()
+    with warehouse_for(sf_cnxn, {"WAREHOUSE_POLICY": POLICY}):
+        assert (sf_cnxn.size, sf_cnxn.auto_suspend) == ("LARGE", 60)
+    assert (sf_cnxn.size, sf_cnxn.auto_suspend) == ("XSMALL", 600)
+    assert warehouse_policy.ACTIVE == {}
+
+
+def test_restore_is_skipped_when_the_warehouse_was_resized_elsewhere():
+    sf_cnxn = WarehouseConnection()
+    with warehouse_for(sf_cnxn, {"WAREHOUSE_POLICY": POLICY}):
+        # another process sets its own size, and will restore ours when it is done
+        sf_cnxn.size = "MEDIUM"
+    assert sf_cnxn.size == "MEDIUM"
+    assert len(sf_cnxn.statements("ALTER WAREHOUSE")) == 1
+
+
+def test_restore_goes_to_the_baseline_size():
+    sf_cnxn = WarehouseConnection(size="Medium")
+    with warehouse_for(sf_cnxn, {"WAREHOUSE_POLICY": {**POLICY, "BASELINE_SIZE": "X-Small"}}):
+        sf_cnxn.size = "XLARGE"
+    assert (sf_cnxn.size, sf_cnxn.auto_suspend) == ("XSMALL", 600)
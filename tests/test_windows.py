@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("snowflake.connector")
+
+from fakes import ModifiedRowsConnection
+from incremental_load_transient import plan_windows, should_window
+
+SINCE, UNTIL = "2024-01-01 00:00:00", "2024-01-09 00:00:00"
+
+pytestmark = pytest.mark.usefixtures("unthrottled_governor")
+
+
+def test_windowing_is_opt_in_and_only_for_catch_ups():
+    assert not should_window({}, SINCE, UNTIL)
+    assert should_window({"WINDOW_MAX_ROWS": 10}, SINCE, UNTIL)
+    assert not should_window({"WINDOW_MAX_ROWS": 10}, "2024-01-08 12:00:00", UNTIL)
+    assert should_window({"WINDOW_MAX_ROWS": 10, "WINDOW_MIN_GAP_HOURS": 1}, "2024-01-08 12:00:00", UNTIL)
+    assert not should_window({"WINDOW_MAX_ROWS": 10}, None, UNTIL)
+
+
+def test_plan_windows_bisects_bursts_and_keeps_quiet_stretches_wide():
+    # a burst of 8 rows on Jan 2 and 2 rows on Jan 7
+    burst = [f"2024-01-02 0{hour}:00:00" for hour in range(8)]
+    ns_cnxn = ModifiedRowsConnection(burst + ["2024-01-07 10:00:00", "2024-01-07 11:00:00"])
+
+    windows = plan_windows(ns_cnxn, "TRANSACTIONS", SINCE, UNTIL, 3)
+
+    # contiguous from the watermark to the run's watermark
+    assert windows[0][0] == SINCE and windows[-1][1] == UNTIL
+    assert all(prev[1] == nxt[0] for prev, nxt in zip(windows, windows[1:]))
+    counts = [len([v for v in ns_cnxn.modified if lo < v <= hi]) for lo, hi in windows]
+    assert max(counts) <= 3 and sum(counts) == 10
+    # the burst is split, the quiet days around it are not
+    assert len(windows) < 10
+
+
+def test_plan_windows_keeps_one_window_when_the_range_fits():
+    ns_cnxn = ModifiedRowsConnection(["2024-01-03 00:00:00"])
+    assert plan_windows(ns_cnxn, "TRANSACTIONS", SINCE, UNTIL, 3) == [(SINCE, UNTIL)]
+    assert len(ns_cnxn.statements("COUNT(*)")) == 1
+
+
+def test_plan_windows_stops_bisecting_at_one_second():
+    ns_cnxn = ModifiedRowsConnection(["2024-01-03 00:00:00"] * 5)
+    windows = plan_windows(ns_cnxn, "TRANSACTIONS", SINCE, UNTIL, 3)
+    # the burst overflows max_rows even in one second, which is where bisection stops;
+    # being the last non-empty window, it is widened to the run's watermark
+    assert windows[-1] == ("2024-01-02 23:59:59", UNTIL)
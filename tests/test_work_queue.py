@@ -0,0 +1,109 @@
+import time
+import pytest
+from work_queue import LeaseLost, LeaseQueue, check_lease, connect_sqlite
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    path = str(tmp_path / "queue.db")
+
+    def make(lease_seconds=60, max_attempts=3, connect=None):
+        queue = LeaseQueue(connect or (lambda: connect_sqlite(path)), "ELT_QUEUE", "RUN1", lease_seconds, max_attempts)
+        queue.create()
+        return queue
+
+    return make
+
+
+def expire(queue, task):
+    queue.execute(
+        f"UPDATE {queue.queue_table} SET LEASE_EXPIRES = {{p}} WHERE TASK_ID = {{p}}",
+        (time.time() - 1, task["TASK_ID"]),
+    )
+
+
+def test_claim_takes_tasks_in_priority_order_once(make_queue):
+    queue = make_queue()
+    assert queue.enqueue(1, ["ACCOUNTS", "VENDORS"]) == 2
+    assert queue.enqueue(1, ["ACCOUNTS"]) == 0
+
+    first = queue.claim("w1")
+    second = make_queue().claim("w2")
+
+    assert (first["TABLE_NAME"], second["TABLE_NAME"]) == ("ACCOUNTS", "VENDORS")
+    assert first["ATTEMPTS"] == 1 and first["LEASE_TOKEN"] != second["LEASE_TOKEN"]
+    assert queue.claim("w3") is None
+    assert queue.remaining() == 2
+
+
+def test_finish_is_checked_against_the_lease_token(make_queue):
+    queue = make_queue()
+    queue.enqueue(1, ["ACCOUNTS"])
+    task = queue.claim("w1")
+
+    assert not queue.finish({**task, "LEASE_TOKEN": "stolen"})
+    assert queue.finish(task)
+    assert queue.remaining() == 0
+    # the token is cleared, so a second finish is refused as well
+    assert not queue.finish(task)
+
+
+def test_expired_lease_is_reclaimed_and_the_old_owner_is_locked_out(make_queue):
+    queue = make_queue()
+    queue.enqueue(1, ["ACCOUNTS"])
+    task = queue.claim("w1")
+    assert make_queue().claim("w2") is None
+
+    expire(queue, task)
+    retaken = make_queue().claim("w2")
+
+    assert retaken["TASK_ID"] == task["TASK_ID"] and retaken["ATTEMPTS"] == 2
+    assert not queue.heartbeat(task)
+    assert not queue.finish(task)
+    assert queue.finish(retaken)
+
+
+def test_failed_task_is_retried_until_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.enqueue(1, ["ACCOUNTS"])
+
+    assert queue.finish(queue.claim("w1"), "boom")
+    task = queue.claim("w1")
+    assert task["ATTEMPTS"] == 2
+    assert queue.finish(task, "boom")
+
+    assert queue.claim("w1") is None
+    assert queue.remaining() == 0
+
+
+def test_heartbeat_reports_a_lease_taken_over(make_queue):
+    queue = make_queue(lease_seconds=0.3)
+    queue.enqueue(1, ["ACCOUNTS"])
+    task = queue.claim("w1")
+    expire(queue, task)
+    make_queue().claim("w2")
+
+    stop, lost = queue.start_heartbeat(task)
+    try:
+        assert lost.wait(2)
+    finally:
+        stop.set()
+    with pytest.raises(LeaseLost):
+        check_lease({"LEASE_LOST": lost}, "ACCOUNTS")
+
+
+def test_heartbeat_failing_for_a_whole_lease_counts_as_lost(make_queue):
+    queue = make_queue(lease_seconds=0.3)
+    queue.enqueue(1, ["ACCOUNTS"])
+    task = queue.claim("w1")
+
+    def unreachable():
+        raise ConnectionError("lease table unreachable")
+
+    queue.connect = unreachable
+    stop, lost = queue.start_heartbeat(task)
+    try:
+        assert not lost.wait(0.15)
+        assert lost.wait(2)
+    finally:
+        stop.set()
@@ -1,20 +1,104 @@
+import uuid
+from conn_util import execute_async_statements, print_statement_summary
+
+
 def transient_landing_tables(sf_cnxn, PRIMARY_KEY_TABLES, props):
+    """
+    Clone every landing table into the transient schema.
+
+    The CREATE OR REPLACE TRANSIENT TABLE ... CLONE statements are submitted asynchronously,
+    at most DDL_CONCURRENCY (a props value, default 8) at a time, and failures are printed
+    in one summary.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        PRIMARY_KEY_TABLES (dict): A dictionary containing primary key information for each table.
+        props (dict): A dictionary of properties containing LANDING_DB, LANDING_SCHEMA and TRANSIENT_SCHEMA.
+
+    Returns:
+        dict: A dictionary mapping the names of failed tables to their error messages.
+    """
     LANDING_DB = props["LANDING_DB"]
     LANDING_SCHEMA = props["LANDING_SCHEMA"]
     TRANSIENT_SCHEMA = props["TRANSIENT_SCHEMA"]
 
-    for table_name in PRIMARY_KEY_TABLES.keys():
-        try:
-            # CREATE TRANSIENT TABLE landing_transient.transient_table_name
-            # CLONE landing.table_name;
-            transient_ddl_query = f"""
-                    CREATE OR REPLACE TRANSIENT TABLE {LANDING_DB}.{TRANSIENT_SCHEMA}.{table_name}
-                    CLONE {LANDING_DB}.{LANDING_SCHEMA}.{table_name};
-                    """
-            with sf_cnxn.cursor() as sf_cur:
-                sf_cur.execute(transient_ddl_query)
-                print(sf_cur.fetchone()[0])
-
-        except Exception as e:
-            print(table_name, ":", e)
-            continue
+    # CREATE TRANSIENT TABLE landing_transient.transient_table_name
+    # CLONE landing.table_name;
+    statements = [
+        (
+            table_name,
+            f"CREATE OR REPLACE TRANSIENT TABLE {LANDING_DB}.{TRANSIENT_SCHEMA}.{table_name} "
+            f"CLONE {LANDING_DB}.{LANDING_SCHEMA}.{table_name}",
+        )
+        for table_name in PRIMARY_KEY_TABLES.keys()
+    ]
+    cloned, failures = execute_async_statements(sf_cnxn, statements, int(props.get("DDL_CONCURRENCY", 8)))
+    print_statement_summary("Cloned", cloned, failures)
+    return failures
+
+
+def new_run_id():
+    """
+    Generate an identifier for a single pipeline run.
+
+    Returns:
+        str: A short upper-case hex string, safe to use in Snowflake identifiers.
+    """
+    return uuid.uuid4().hex[:12].upper()
+
+
+def get_run_table_name(table, props):
+    """
+    Build the fully qualified name of the run-scoped staging table for a table.
+
+    Args:
+        table (str): The name of the landing table.
+        props (dict): A dictionary of properties containing LANDING_DB, TRANSIENT_SCHEMA and RUN_ID.
+
+    Returns:
+        str: The fully qualified run-scoped table name.
+    """
+    return f"{props['LANDING_DB']}.{props['TRANSIENT_SCHEMA']}.{table}_{props['RUN_ID']}"
+
+
+def create_run_table(sf_cnxn, table, props):
+    """
+    Create a session TEMPORARY table with the landing table's definition for the current run.
+
+    The table only exists in the current Snowflake session and carries the run ID in its
+    name, so overlapping runs and parallel workers never share (or truncate) the same table.
+    Snowflake drops it automatically when the session ends.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        table (str): The name of the landing table.
+        props (dict): A dictionary of properties containing LANDING_DB, LANDING_SCHEMA,
+            TRANSIENT_SCHEMA and RUN_ID.
+
+    Returns:
+        str: The fully qualified run-scoped table name.
+    """
+    run_table = get_run_table_name(table, props)
+    with sf_cnxn.cursor() as sf_cur:
+        sf_cur.execute(
+            f"CREATE TEMPORARY TABLE {run_table} LIKE {props['LANDING_DB']}.{props['LANDING_SCHEMA']}.{table}"
+        )
+    return run_table
+
+
+def drop_run_table(sf_cnxn, run_table):
+    """
+    Drop a run-scoped staging table once it is no longer needed.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        run_table (str): The fully qualified run-scoped table name.
+
+    Returns:
+        None
+    """
+    try:
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute(f"DROP TABLE IF EXISTS {run_table}")
+    except Exception as e:
+        print(run_table, ":", e)
@@ -0,0 +1,217 @@
+import threading
+import time
+from contextlib import contextmanager
+from run_stats import record_warehouse_decision
+
+WAREHOUSE_SIZES = ["XSMALL", "SMALL", "MEDIUM", "LARGE", "XLARGE", "XXLARGE", "XXXLARGE", "X4LARGE", "X5LARGE", "X6LARGE"]
+SIZE_ALIASES = {"2XLARGE": "XXLARGE", "3XLARGE": "XXXLARGE", "4XLARGE": "X4LARGE", "5XLARGE": "X5LARGE", "6XLARGE": "X6LARGE"}
+
+# Warehouses resized by this process: name -> original settings, the sizes currently
+# requested and the size last set, so concurrent tables (accounts, threads) share one
+# resize and the original size is only restored once the last of them finishes. Other
+# processes have their own registry, see apply_largest for how restores stay safe.
+ACTIVE_LOCK = threading.Lock()
+ACTIVE = {}
+
+
+def normalize_size(size):
+    """
+    Normalise a warehouse size as written in SHOW WAREHOUSES or a policy, e.g. "X-Small".
+
+    Args:
+        size (str): The warehouse size.
+
+    Returns:
+        str: The size as in WAREHOUSE_SIZES.
+    """
+    size = str(size).upper().replace("-", "").replace("_", "")
+    return SIZE_ALIASES.get(size, size)
+
+
+def get_active_policy(props):
+    """
+    Read a phase's WAREHOUSE_POLICY if it is switched on.
+
+    Resizing is opt-in: a policy only applies with "ENABLED": true, since it needs MODIFY
+    on the warehouse and changes its size for everything else running on it.
+
+    Args:
+        props (dict): The phase props.
+
+    Returns:
+        dict: The policy, or None if there is none or it is disabled.
+    """
+    policy = props.get("WAREHOUSE_POLICY")
+    return policy if policy and policy.get("ENABLED") is True else None
+
+
+def get_policy_size(policy, rows=None):
+    """
+    Pick the warehouse size for a stage from a phase's policy and the batch's size class.
+
+    Args:
+        policy (dict): The phase's WAREHOUSE_POLICY: SIZE, and optionally LARGE_SIZE for
+            batches of at least LARGE_ROWS rows.
+        rows (int, optional): The number of rows the stage processes, if known.
+
+    Returns:
+        tuple: The size (or None to leave the warehouse as is) and the size class.
+    """
+    if rows is not None and policy.get("LARGE_SIZE") and rows >= int(policy.get("LARGE_ROWS", 1000000)):
+        return normalize_size(policy["LARGE_SIZE"]), "large"
+    size = policy.get("SIZE")
+    return (normalize_size(size) if size else None), "default"
+
+
+def get_warehouse_settings(sf_cnxn, warehouse):
+    """
+    Read a warehouse's size and auto-suspend setting.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        warehouse (str): The warehouse name.
+
+    Returns:
+        tuple: The normalised size and the auto-suspend seconds.
+    """
+    with sf_cnxn.cursor() as sf_cur:
+        sf_cur.execute(f"SHOW WAREHOUSES LIKE '{warehouse}'")
+        row = sf_cur.fetchone()
+        columns = [col[0].lower() for col in sf_cur.description]
+    return normalize_size(row[columns.index("size")]), row[columns.index("auto_suspend")]
+
+
+def alter_warehouse(sf_cnxn, warehouse, size, auto_suspend=None):
+    """
+    Resize a warehouse, waiting until the new size is provisioned.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        warehouse (str): The warehouse name.
+        size (str): The new size.
+        auto_suspend (int, optional): The new auto-suspend seconds.
+
+    Returns:
+        None
+    """
+    query = f"ALTER WAREHOUSE {warehouse} SET WAREHOUSE_SIZE = '{size}' WAIT_FOR_COMPLETION = TRUE"
+    if auto_suspend is not None:
+        query += f" AUTO_SUSPEND = {int(auto_suspend)}"
+    with sf_cnxn.cursor() as sf_cur:
+        sf_cur.execute(query)
+
+
+def apply_largest(sf_cnxn, warehouse, state):
+    """
+    Size a shared warehouse for the largest request in flight, or restore it when none is left.
+
+    The restore goes to the policy's BASELINE_SIZE if it has one. Otherwise it goes back to
+    the size read before the first resize, but only if the warehouse still has the size this
+    process set: another process (or a person) resizing it in the meantime read our size as
+    its original, so restoring ours would undo theirs, and it restores in turn.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        warehouse (str): The warehouse name.
+        state (dict): The warehouse's ACTIVE entry.
+
+    Returns:
+        None
+    """
+    if state["requests"]:
+        target = (max(state["requests"], key=WAREHOUSE_SIZES.index), state["auto_suspend"])
+    elif state["baseline"]:
+        target = (state["baseline"], state["original"][1])
+    else:
+        target = state["original"]
+        if target != state["current"]:
+            size = get_warehouse_settings(sf_cnxn, warehouse)[0]
+            if size != state["current"][0]:
+                print(f"Warehouse {warehouse} resized to {size} elsewhere, {target[0]} not restored")
+                return
+    if target != state["current"]:
+        alter_warehouse(sf_cnxn, warehouse, *target)
+        state["current"] = target
+
+
+@contextmanager
+def warehouse_for(sf_cnxn, props, table=None, stage=None, rows=None, large_only=False):
+    """
+    Run a phase or a heavy stage on the warehouse size its phase policy asks for, restoring it afterwards.
+
+    The policy is the phase's WAREHOUSE_POLICY prop, applied only with ENABLED true (see
+    get_active_policy): SIZE, LARGE_SIZE and LARGE_ROWS as in get_policy_size, an optional
+    AUTO_SUSPEND (seconds) while resized, an optional BASELINE_SIZE to restore to, and an
+    optional WAREHOUSE to switch the session to instead of resizing the connected one. The
+    original size (or warehouse) is restored even if the stage fails, see apply_largest. Policy errors, e.g. a role
+    without MODIFY on the warehouse, are printed and the stage runs unchanged.
+
+    Args:
+        sf_cnxn: The Snowflake database connection.
+        props (dict): The phase props.
+        table (str, optional): The table, for the decision log.
+        stage (str, optional): The stage, for the decision log.
+        rows (int, optional): The rows the stage processes, for the size class.
+        large_only (bool): Only act for large batches. Used around single stages inside a phase
+            that already runs under the policy's default size, so small tables never resize.
+
+    Yields:
+        None
+    """
+    policy = get_active_policy(props)
+    size, size_class = get_policy_size(policy or {}, rows)
+    if not policy or (large_only and size_class != "large"):
+        yield
+        return
+
+    started = time.time()
+    warehouse = previous_warehouse = state = None
+    decision = "unchanged"
+    try:
+        with sf_cnxn.cursor() as sf_cur:
+            sf_cur.execute("SELECT CURRENT_WAREHOUSE()")
+            previous_warehouse = sf_cur.fetchone()[0]
+            warehouse = policy.get("WAREHOUSE") or previous_warehouse
+            if warehouse != previous_warehouse:
+                sf_cur.execute(f"USE WAREHOUSE {warehouse}")
+                decision = f"switched from {previous_warehouse}"
+
+        if size:
+            with ACTIVE_LOCK:
+                state = ACTIVE.get(warehouse)
+                if state is None:
+                    original = get_warehouse_settings(sf_cnxn, warehouse)
+                    state = ACTIVE[warehouse] = {
+                        "original": original,
+                        "current": original,
+                        "auto_suspend": policy.get("AUTO_SUSPEND", original[1]),
+                        "baseline": normalize_size(policy["BASELINE_SIZE"]) if policy.get("BASELINE_SIZE") else None,
+                        "requests": [],
+                    }
+                state["requests"].append(size)
+                from_size = state["current"][0]
+                apply_largest(sf_cnxn, warehouse, state)
+                if state["current"][0] != from_size:
+                    decision = f"resized {from_size} -> {state['current'][0]}"
+    except Exception as e:
+        print(f"{table or ''}: Warehouse policy not applied - {e}")
+    print(f"{table or '-'} [{stage}]: Warehouse {warehouse} {size or ''} ({size_class}, {decision})")
+
+    try:
+        yield
+    finally:
+        try:
+            if state is not None:
+                with ACTIVE_LOCK:
+                    state["requests"].remove(size)
+                    apply_largest(sf_cnxn, warehouse, state)
+                    if not state["requests"]:
+                        del ACTIVE[warehouse]
+            if previous_warehouse and warehouse != previous_warehouse:
+                with sf_cnxn.cursor() as sf_cur:
+                    sf_cur.execute(f"USE WAREHOUSE {previous_warehouse}")
+        except Exception as e:
+            print(f"{table or ''}: Warehouse {warehouse} not restored - {e}")
+        record_warehouse_decision(
+            props.get("RUN_ID"), props.get("PHASE"), table, stage, warehouse, size, size_class, decision, rows, time.time() - started
+        )
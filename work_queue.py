@@ -0,0 +1,320 @@
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 15
+
+
+class LeaseLost(Exception):
+    """Raised inside a task whose lease was taken over by another worker."""
+
+
+def check_lease(props, table):
+    """
+    Stop a queued load whose lease was lost, before it writes to landing.
+
+    Args:
+        props (dict): The phase props; LEASE_LOST is the task's event from start_heartbeat.
+        table (str): The table being loaded.
+
+    Returns:
+        None
+
+    Raises:
+        LeaseLost: If the lease was lost, so another worker may be loading the same table.
+    """
+    lease_lost = props.get("LEASE_LOST")
+    if lease_lost is not None and lease_lost.is_set():
+        raise LeaseLost(f"{table}: Lease lost to another worker, load stopped")
+
+
+def connect_sqlite(path):
+    """
+    Open a SQLite database as a local stand-in for the Snowflake lease table.
+
+    Args:
+        path (str): The path of the SQLite database file.
+
+    Returns:
+        sqlite3.Connection: An autocommit connection.
+    """
+    return sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+
+
+def get_worker_id():
+    """
+    Build an identifier for this worker process.
+
+    Returns:
+        str: The host name, process-unique suffix included.
+    """
+    return f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+
+class LeaseQueue:
+    """
+    Table/partition task queue stored in a lease table that several worker hosts share.
+
+    Workers claim one task at a time with an expiring lease and keep it alive with heartbeats.
+    A task whose lease expires (for example because its worker crashed) becomes claimable again.
+    Every state change is conditioned on the lease token, so a worker that lost its lease can
+    never complete a task another worker has taken over.
+
+    Args:
+        connect (callable): Returns a new DB-API connection (Snowflake or SQLite) when called.
+        queue_table (str): The (qualified) name of the lease table.
+        queue_name (str): The name of the queue inside the lease table, e.g. one per run.
+        lease_seconds (int): How long a claim stays valid without a heartbeat.
+        max_attempts (int): How many times a failing task is retried before it is marked FAILED.
+    """
+
+    def __init__(self, connect, queue_table, queue_name, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.connect = connect
+        self.cnxn = connect()
+        self.queue_table = queue_table
+        self.queue_name = queue_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.param = "?" if isinstance(self.cnxn, sqlite3.Connection) else "%s"
+
+    def execute(self, query, params=(), cnxn=None):
+        """
+        Execute a statement with the backend's parameter style.
+
+        Args:
+            query (str): The statement, with {p} marking each parameter.
+            params (tuple): The parameters.
+            cnxn: The connection to use. Defaults to the queue's own connection.
+
+        Returns:
+            tuple: The fetched rows (empty for DML) and the affected row count.
+        """
+        cur = (cnxn or self.cnxn).cursor()
+        try:
+            cur.execute(query.format(p=self.param), params)
+            rows = cur.fetchall() if cur.description else []
+            return rows, cur.rowcount
+        finally:
+            cur.close()
+
+    def create(self):
+        """
+        Create the lease table if it does not exist.
+
+        Returns:
+            None
+        """
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.queue_table} ("
+            "QUEUE_NAME VARCHAR, TASK_ID VARCHAR, PHASE INTEGER, TABLE_NAME VARCHAR, PRIORITY INTEGER, "
+            "STATUS VARCHAR, OWNER VARCHAR, LEASE_TOKEN VARCHAR, LEASE_EXPIRES FLOAT, ATTEMPTS INTEGER, "
+            "ERROR VARCHAR, UPDATED_AT FLOAT)"
+        )
+
+    def enqueue(self, phase, tables):
+        """
+        Add one task per table, skipping tables already queued under this queue name.
+
+        Args:
+            phase (int): The phase the tasks run.
+            tables (list): The table names, in priority order.
+
+        Returns:
+            int: The number of tasks added.
+        """
+        existing, _ = self.execute(
+            f"SELECT TASK_ID FROM {self.queue_table} WHERE QUEUE_NAME = {{p}}", (self.queue_name,)
+        )
+        existing = {row[0] for row in existing}
+        added = 0
+        for priority, table in enumerate(tables):
+            task_id = f"{phase}:{table}"
+            if task_id in existing:
+                continue
+            self.execute(
+                f"INSERT INTO {self.queue_table} (QUEUE_NAME, TASK_ID, PHASE, TABLE_NAME, PRIORITY, STATUS, ATTEMPTS, UPDATED_AT) "
+                "VALUES ({p}, {p}, {p}, {p}, {p}, 'PENDING', 0, {p})",
+                (self.queue_name, task_id, phase, table, priority, time.time()),
+            )
+            added += 1
+        return added
+
+    def claim(self, worker_id):
+        """
+        Claim the next pending task, or one whose lease has expired.
+
+        Args:
+            worker_id (str): The identifier of the claiming worker.
+
+        Returns:
+            dict: The claimed task (TASK_ID, PHASE, TABLE_NAME, LEASE_TOKEN), or None.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        claimable = "(STATUS = 'PENDING' OR (STATUS = 'RUNNING' AND LEASE_EXPIRES < {p}))"
+        self.execute(
+            f"UPDATE {self.queue_table} SET STATUS = 'RUNNING', OWNER = {{p}}, LEASE_TOKEN = {{p}}, "
+            f"LEASE_EXPIRES = {{p}}, ATTEMPTS = ATTEMPTS + 1, UPDATED_AT = {{p}} "
+            f"WHERE QUEUE_NAME = {{p}} AND {claimable} AND TASK_ID = ("
+            f"SELECT TASK_ID FROM {self.queue_table} WHERE QUEUE_NAME = {{p}} AND {claimable} "
+            f"ORDER BY PRIORITY, TASK_ID LIMIT 1)",
+            (worker_id, token, now + self.lease_seconds, now, self.queue_name, now, self.queue_name, now),
+        )
+        # only the worker whose token landed owns the task
+        rows, _ = self.execute(
+            f"SELECT TASK_ID, PHASE, TABLE_NAME, ATTEMPTS FROM {self.queue_table} "
+            f"WHERE QUEUE_NAME = {{p}} AND LEASE_TOKEN = {{p}} AND STATUS = 'RUNNING'",
+            (self.queue_name, token),
+        )
+        if not rows:
+            return None
+        task_id, phase, table_name, attempts = rows[0]
+        return {"TASK_ID": task_id, "PHASE": int(phase), "TABLE_NAME": table_name, "ATTEMPTS": int(attempts), "LEASE_TOKEN": token}
+
+    def heartbeat(self, task, cnxn=None):
+        """
+        Extend the lease of a claimed task.
+
+        Args:
+            task (dict): The claimed task.
+            cnxn: The connection to use, e.g. the heartbeat thread's own connection.
+
+        Returns:
+            bool: False if the lease was lost to another worker.
+        """
+        now = time.time()
+        _, rowcount = self.execute(
+            f"UPDATE {self.queue_table} SET LEASE_EXPIRES = {{p}}, UPDATED_AT = {{p}} "
+            "WHERE QUEUE_NAME = {p} AND TASK_ID = {p} AND LEASE_TOKEN = {p} AND STATUS = 'RUNNING'",
+            (now + self.lease_seconds, now, self.queue_name, task["TASK_ID"], task["LEASE_TOKEN"]),
+            cnxn,
+        )
+        return rowcount != 0
+
+    def finish(self, task, error=None):
+        """
+        Mark a claimed task DONE, or release it for a retry (FAILED after max_attempts).
+
+        Args:
+            task (dict): The claimed task.
+            error (str, optional): The error message if the task failed.
+
+        Returns:
+            bool: False if the lease had already been lost.
+        """
+        if error is None:
+            status = "DONE"
+        elif task["ATTEMPTS"] < self.max_attempts:
+            status = "PENDING"
+        else:
+            status = "FAILED"
+        _, rowcount = self.execute(
+            f"UPDATE {self.queue_table} SET STATUS = {{p}}, LEASE_TOKEN = NULL, LEASE_EXPIRES = NULL, "
+            "ERROR = {p}, UPDATED_AT = {p} WHERE QUEUE_NAME = {p} AND TASK_ID = {p} AND LEASE_TOKEN = {p}",
+            (status, error, time.time(), self.queue_name, task["TASK_ID"], task["LEASE_TOKEN"]),
+        )
+        return rowcount != 0
+
+    def remaining(self):
+        """
+        Count tasks that are not finished yet.
+
+        Returns:
+            int: The number of PENDING or RUNNING tasks.
+        """
+        rows, _ = self.execute(
+            f"SELECT COUNT(*) FROM {self.queue_table} WHERE QUEUE_NAME = {{p}} AND STATUS IN ('PENDING', 'RUNNING')",
+            (self.queue_name,),
+        )
+        return int(rows[0][0])
+
+    def start_heartbeat(self, task):
+        """
+        Start a daemon thread that renews the task's lease on its own connection.
+
+        A renewal that raises is retried on the next beat, but once lease_seconds have
+        passed since the last successful renewal the lease may have expired and been
+        claimed by another worker, so the lease counts as lost.
+
+        Args:
+            task (dict): The claimed task.
+
+        Returns:
+            tuple: A threading.Event to set to stop the heartbeat, and one the heartbeat
+                sets when the lease is lost.
+        """
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def beat():
+            renewed = time.monotonic()
+            cnxn = None
+            try:
+                while not stop.wait(self.lease_seconds / 3):
+                    try:
+                        cnxn = cnxn or self.connect()
+                        if not self.heartbeat(task, cnxn):
+                            print(f"{task['TABLE_NAME']}: Lease lost to another worker, stopping the load")
+                            lost.set()
+                            return
+                        renewed = time.monotonic()
+                    except Exception as e:
+                        print(f"{task['TABLE_NAME']}: Heartbeat failed - {e}")
+                        if time.monotonic() - renewed >= self.lease_seconds:
+                            print(f"{task['TABLE_NAME']}: Lease not renewed for {self.lease_seconds}s, stopping the load")
+                            lost.set()
+                            return
+            finally:
+                if cnxn is not None:
+                    cnxn.close()
+
+        threading.Thread(target=beat, daemon=True).start()
+        return stop, lost
+
+
+def run_worker(queue, run_task, worker_id=None):
+    """
+    Claim and run tasks until the queue is drained.
+
+    Args:
+        queue (LeaseQueue): The shared queue.
+        run_task (callable): Called with (phase, table_name, lease_lost); raising marks the
+            attempt failed. lease_lost is an Event set when the lease is lost, which the load
+            must check (see check_lease) before writing.
+        worker_id (str, optional): The worker identifier. Defaults to host name plus a suffix.
+
+    Returns:
+        int: The number of tasks this worker completed.
+    """
+    worker_id = worker_id or get_worker_id()
+    completed = 0
+
+    while True:
+        task = queue.claim(worker_id)
+        if task is None:
+            if queue.remaining() == 0:
+                break
+            # other workers still hold leases; wait in case one of them expires
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+
+        print(f"{worker_id}: Claimed {task['TASK_ID']} (attempt {task['ATTEMPTS']})")
+        stop, lost = queue.start_heartbeat(task)
+        try:
+            run_task(task["PHASE"], task["TABLE_NAME"], lost)
+            error = None
+        except Exception as e:
+            error = str(e)[:1000]
+            print(f"{worker_id}: {task['TASK_ID']} failed - {e}")
+        finally:
+            stop.set()
+
+        if queue.finish(task, error) and error is None:
+            completed += 1
+
+    print(f"{worker_id}: Queue {queue.queue_name} drained, {completed} task(s) completed")
+    return completed